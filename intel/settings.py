@@ -50,19 +50,30 @@ INSTALLED_APPS = [
     'django_select2',
 ]
 
-# CACHES = {
-#     # … default cache config and others
-#     "select2": {
-#         "BACKEND": "django_redis.cache.RedisCache",
-#         "LOCATION": "redis://127.0.0.1:6379/2",
-#         "OPTIONS": {
-#             "CLIENT_CLASS": "django_redis.client.DefaultClient",
-#         }
-#     }
-# }
-#
-# # Tell select2 which cache configuration to use:
-# SELECT2_CACHE_BACKEND = "select2"
+# The default cache carries the version stamps that tell every process to drop its cached AdminInfo and price
+# catalog, the anonymous page cache and the autocomplete rate limits, so the web and worker processes must
+# share it: set REDIS_URL in production. Without it each process has its own LocMemCache, which is enough for
+# a single process (runserver, tests), but then a change only reaches the other processes when their
+# ADMIN_INFO_CACHE_TTL / PRICE_CATALOG_CACHE_TTL / PAGE_CACHE_TTL runs out.
+REDIS_URL = config('REDIS_URL', default='')
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': REDIS_URL,
+            'OPTIONS': {
+                'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+                # A Redis outage degrades to cache misses (and TTL-only staleness) instead of failing requests.
+                'IGNORE_EXCEPTIONS': True,
+            },
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
 
 JAZZMIN_SETTINGS = {
     # title of the window (Will default to current_admin_site.site_title if absent or None)
@@ -76,11 +87,16 @@ JAZZMIN_SETTINGS = {
     "welcome_sign": "Welcome to the DCS Admin",
     "custom_css": 'css/admin.css',
     "user_avatar": 'user',
+    "topmenu_links": [
+        {"name": "Sales report", "url": "admin:intel_app_dailysales_changelist",
+         "permissions": ["intel_app.view_dailysales"]},
+    ],
 }
 
 MIDDLEWARE = [
+    'intel_app.middleware.RequestMetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'intel_app.middleware.AsyncWhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -178,3 +194,108 @@ STATICFILES_DIRS = [BASE_DIR / 'intel_app/static']
 AUTH_USER_MODEL = 'intel_app.CustomUser'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# Seconds a worker may serve its cached AdminInfo before re-reading it (intel_app/site_config.py).
+ADMIN_INFO_CACHE_TTL = 30
+
+# Seconds a worker may serve its in-memory bundle price catalog (intel_app/catalog.py).
+PRICE_CATALOG_CACHE_TTL = 60
+
+# Seconds anonymous visitors are served the cached home and services pages (intel_app/page_cache.py);
+# 0 turns the page cache off. With the shared cache (REDIS_URL), `manage.py clear_page_cache` drops the
+# cached pages after a deploy; without it, pages expire only by this TTL or a worker restart.
+PAGE_CACHE_TTL = config('PAGE_CACHE_TTL', default=300, cast=int)
+
+# Seconds a rendered bundle offer list is kept. The cache key carries the price catalog's version, so a
+# price change shows on the next page load; this only bounds how long stale lists linger in the cache.
+OFFER_FRAGMENT_CACHE_TTL = 3600
+
+# Staff user search behind the credit form and the admin user filter (views.user_autocomplete): results
+# per page, and requests one staff member may make per AUTOCOMPLETE_RATE_WINDOW seconds.
+AUTOCOMPLETE_PAGE_SIZE = 20
+AUTOCOMPLETE_RATE_LIMIT = 30
+AUTOCOMPLETE_RATE_WINDOW = 10
+
+# Seconds an order may still be placed at a bundle's previous price after a new one takes effect.
+PRICE_GRACE_PERIOD = 300
+
+# Request metrics (intel_app/metrics.py), served at /metrics to staff or to a scraper sending
+# "Authorization: Bearer <METRICS_TOKEN>". Each process keeps its own histograms; with METRICS_DIR set
+# they are written there every METRICS_FLUSH_INTERVAL seconds and the endpoint sums all processes.
+# Clear the directory on deploy, as the files are keyed by process id.
+METRICS_DIR = config('METRICS_DIR', default='')
+METRICS_FLUSH_INTERVAL = 10
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+# Upstream HTTP providers. Each gets its own keep-alive connection pool (intel_app/upstream.py).
+# Timeouts are in seconds; deadline caps the whole request including reading the response body.
+UPSTREAM_PROVIDERS = {
+    'bestpay': {
+        'base_url': config('BESTPAY_URL', default='https://console.bestpaygh.com'),
+        'connect_timeout': 3.05, 'read_timeout': 20, 'deadline': 30, 'pool_size': 10,
+    },
+    'value4moni': {
+        'base_url': config('VALUE4MONI_URL', default='https://www.value4moni.com'),
+        'connect_timeout': 3.05, 'read_timeout': 20, 'deadline': 30, 'pool_size': 10,
+    },
+    'paystack': {
+        'base_url': config('PAYSTACK_URL', default='https://api.paystack.co'),
+        'connect_timeout': 3.05, 'read_timeout': 10, 'deadline': 15, 'pool_size': 10,
+    },
+    'arkesel': {
+        'base_url': config('ARKESEL_URL', default='https://sms.arkesel.com'),
+        'connect_timeout': 3.05, 'read_timeout': 10, 'deadline': 15, 'pool_size': 10,
+    },
+}
+
+# Order fulfillment worker (python manage.py process_orders)
+# Maximum number of orders sent to each iShare provider at the same time.
+FULFILLMENT_CONCURRENCY = {
+    'Gyasi': config('GYASI_CONCURRENCY', default=4, cast=int),
+    'Value4Moni': config('VALUE4MONI_CONCURRENCY', default=4, cast=int),
+}
+FULFILLMENT_BATCH_SIZE = 50
+# A delivery that got a 5xx answer or could not open a connection is retried after DELIVERY_RETRY_BACKOFF
+# seconds, doubled after every attempt up to DELIVERY_RETRY_MAX_BACKOFF and randomly shortened by up to half.
+# After DELIVERY_MAX_ATTEMPTS the order is refunded; a rejected order is refunded right away.
+DELIVERY_MAX_ATTEMPTS = 4
+DELIVERY_RETRY_BACKOFF = 30
+DELIVERY_RETRY_MAX_BACKOFF = 600
+
+# Reconciliation worker (python manage.py reconcile_orders). Orders a provider has held in Processing
+# for RECONCILE_MIN_AGE seconds are checked against its transaction status every RECONCILE_INTERVAL seconds.
+# The status endpoints in helper.py are unconfirmed and a "failed" answer refunds the order, so the worker
+# refuses to run until RECONCILE_ENABLED is set once the providers have confirmed them.
+RECONCILE_ENABLED = config('RECONCILE_ENABLED', default=False, cast=bool)
+RECONCILE_MIN_AGE = 600
+RECONCILE_INTERVAL = 300
+RECONCILE_BATCH_SIZE = 100
+
+# Circuit breaker for the iShare providers (intel_app/routing.py). A provider's breaker opens when, among
+# at least min_calls calls in the last `window` seconds, the share that failed reaches error_rate or the share
+# taking slow_call_seconds or more reaches slow_call_rate. Orders then go to the other provider; after
+# `cooldown` seconds a single trial order decides whether the breaker closes again.
+PROVIDER_BREAKER = {
+    'window': 120,
+    'min_calls': 10,
+    'error_rate': 0.5,
+    'slow_call_seconds': 15,
+    'slow_call_rate': 0.5,
+    'cooldown': 60,
+    'stats_interval': 15,  # seconds between each worker's updates of the stats shown in the admin
+}
+FULFILLMENT_POLL_INTERVAL = 2
+
+# SMS outbox worker (python manage.py send_sms)
+ARKESEL_API_KEY = config('ARKESEL_API_KEY')
+SMS_SENDER_ID = 'DCS.COM'
+SMS_BATCH_SIZE = 100
+SMS_RATE_LIMIT = config('SMS_RATE_LIMIT', default=10, cast=int)  # messages per second
+SMS_MAX_ATTEMPTS = 5
+SMS_RETRY_BACKOFF = 30  # seconds, doubled after every failed attempt
+SMS_POLL_INTERVAL = 2
+
+# Paystack webhook inbox worker (python manage.py process_paystack_events)
+PAYSTACK_EVENT_BATCH_SIZE = 100
+PAYSTACK_EVENT_POLL_INTERVAL = 1
+PAYSTACK_EVENT_MAX_ATTEMPTS = 5
+PAYSTACK_EVENT_RETRY_BACKOFF = 30  # seconds, doubled after every failed attempt
@@ -0,0 +1,6 @@
+from uvicorn_worker import UvicornWorker as BaseUvicornWorker
+
+
+class UvicornWorker(BaseUvicornWorker):
+    """Gunicorn worker serving intel.asgi; Django's ASGI handler does not speak the lifespan protocol."""
+    CONFIG_KWARGS = {**BaseUvicornWorker.CONFIG_KWARGS, "lifespan": "off"}
@@ -1,20 +1,62 @@
 import re
-from datetime import datetime
+import time
+from datetime import datetime, timedelta
 
 from django.contrib import admin, messages
 from django.contrib.auth.admin import UserAdmin
 from django.db import transaction
+from django.db.models import Sum
 from django.shortcuts import get_object_or_404, redirect
+from django.template.response import TemplateResponse
 from django.urls import path
+from django.utils import timezone
 from django.utils.html import format_html
 from import_export import resources, fields
 
-from . import models
+from . import exports, models, wallet
 from import_export.admin import ExportActionMixin
 
 from .models import TopUpRequest
 
 
+def refund_selected(queryset, use):
+    """Refund every selected order that is not refunded yet and return how many were refunded.
+
+    Rows are locked and read in one query, their status flipped with one UPDATE, and the wallets
+    credited with a single set-based update plus one bulk ledger insert.
+    """
+    with transaction.atomic():
+        refunds = list(
+            queryset.exclude(transaction_status='Canceled and Refunded')
+            .select_for_update(of=('self',)).order_by('id').values_list('id', 'user_id', 'amount')
+        )
+        queryset.model.objects.filter(id__in=[pk for pk, _, _ in refunds]).update(
+            transaction_status='Canceled and Refunded'
+        )
+        wallet.credit_many([(user_id, amount, use) for _, user_id, amount in refunds])
+    return len(refunds)
+
+
+class UserAutocompleteFilter(admin.SimpleListFilter):
+    """Filter by user through a search box backed by views.user_autocomplete, instead of listing every user."""
+    title = 'user'
+    parameter_name = 'user'
+    template = 'admin/user_autocomplete_filter.html'
+
+    def has_output(self):
+        return True
+
+    def lookups(self, request, model_admin):
+        if not (self.value() or '').isdigit():
+            return []
+        return models.CustomUser.objects.filter(id=self.value()).values_list('id', 'username')
+
+    def queryset(self, request, queryset):
+        if (self.value() or '').isdigit():
+            return queryset.filter(user_id=self.value())
+        return queryset
+
+
 # Register your models here.
 class CustomUserAdmin(ExportActionMixin, UserAdmin):
     list_display = ['first_name', 'last_name', 'username', 'email', 'wallet', 'phone', 'status']
@@ -42,9 +84,9 @@ class TransactionAdmin(ExportActionMixin, admin.ModelAdmin):
     list_display = ['user', 'bundle_number', 'offer', 'amount', 'reference', 'transaction_status', 'transaction_date',
                     'action_buttons']
     search_fields = ['reference', 'bundle_number', 'user__username']
-    list_filter = ['transaction_status', 'user']
+    list_filter = ['transaction_status', UserAutocompleteFilter]
     actions = ['mark_selected_as_completed', 'mark_selected_as_pending', 'mark_selected_as_processing',
-               'mark_selected_as_failed', 'refund_selected_transactions']
+               'mark_selected_as_failed', 'refund_selected_transactions', 'stream_csv_export', 'stream_xlsx_export']
 
     def action_buttons(self, obj):
         buttons = []
@@ -140,18 +182,12 @@ class TransactionAdmin(ExportActionMixin, admin.ModelAdmin):
         amount = transaction_obj.amount
         try:
             with transaction.atomic():
-                user.wallet += amount
-                user.save()
-                transaction_obj.transaction_status = 'Canceled and Refunded'
-                transaction_obj.save()
-
-                models.WalletTransactionn.objects.create(
-                    user=user,
-                    transaction_type='Credit',
-                    transaction_amount=amount,
-                    transaction_use='Refund',
-                    new_balance=user.wallet,
-                )
+                refunded = self.model.objects.filter(pk=transaction_obj.pk).exclude(
+                    transaction_status='Canceled and Refunded').update(transaction_status='Canceled and Refunded')
+                if not refunded:
+                    self.message_user(request, "This transaction has already been refunded.", level=messages.WARNING)
+                    return redirect('..')
+                wallet.credit(user, amount, 'Refund')
                 self.message_user(request,
                                   f"Transaction refunded and GHS{amount} credited back to {user.username}'s wallet.",
                                   level=messages.SUCCESS)
@@ -168,18 +204,12 @@ class TransactionAdmin(ExportActionMixin, admin.ModelAdmin):
         amount = transaction_obj.amount
         try:
             with transaction.atomic():
-                user.wallet += amount
-                user.save()
-                transaction_obj.transaction_status = 'Canceled and Refunded'
-                transaction_obj.save()
-
-                models.WalletTransactionn.objects.create(
-                    user=user,
-                    transaction_type='Credit',
-                    transaction_amount=amount,
-                    transaction_use='Refund',
-                    new_balance=user.wallet,
-                )
+                refunded = self.model.objects.filter(pk=transaction_obj.pk).exclude(
+                    transaction_status='Canceled and Refunded').update(transaction_status='Canceled and Refunded')
+                if not refunded:
+                    self.message_user(request, "This transaction has already been refunded.", level=messages.WARNING)
+                    return redirect('..')
+                wallet.credit(user, amount, 'Refund')
                 self.message_user(request, f"Transaction refunded and GHS{amount} credited back to {user.username}'s wallet.", level=messages.SUCCESS)
         except Exception as e:
             self.message_user(request, f"An error occurred: {str(e)}", level=messages.ERROR)
@@ -192,25 +222,11 @@ class TransactionAdmin(ExportActionMixin, admin.ModelAdmin):
     mark_selected_as_completed.short_description = "Mark selected transactions as completed"
 
     def refund_selected_transactions(self, request, queryset):
-        not_refunded = queryset.exclude(transaction_status='Canceled and Refunded')
+        started = time.monotonic()
         try:
-            with transaction.atomic():
-                for transaction_obj in not_refunded:
-                    user = transaction_obj.user
-                    amount = transaction_obj.amount
-                    user.wallet += amount
-                    user.save()
-                    transaction_obj.transaction_status = 'Canceled and Refunded'
-                    transaction_obj.save()
-
-                    models.WalletTransactionn.objects.create(
-                        user=user,
-                        transaction_type='Credit',
-                        transaction_amount=amount,
-                        transaction_use='Transaction Refund',
-                        new_balance=user.wallet,
-                    )
-                self.message_user(request, f"Refunded {not_refunded.count()} transactions and credited amounts back to users' wallets.", level=messages.SUCCESS)
+            refunded = refund_selected(queryset, 'Transaction Refund')
+            self.message_user(request, f"Refunded {refunded} transactions and credited amounts back to users' wallets "
+                                       f"in {time.monotonic() - started:.2f}s.", level=messages.SUCCESS)
         except Exception as e:
             self.message_user(request, f"An error occurred: {str(e)}", level=messages.ERROR)
     refund_selected_transactions.short_description = "Refund selected transactions"
@@ -273,10 +289,54 @@ class TransactionAdmin(ExportActionMixin, admin.ModelAdmin):
 
         return TxnResource
 
+    # Streaming exports for large selections; same columns as the import_export download.
+    def stream_csv_export(self, request, queryset):
+        resource = self.get_export_resource_class()()
+        return exports.csv_response(request, resource, queryset.select_related('user').order_by('id'))
+
+    stream_csv_export.short_description = "Export selected as CSV (streaming)"
+
+    def stream_xlsx_export(self, request, queryset):
+        resource = self.get_export_resource_class()()
+        return exports.xlsx_response(request, resource, queryset.select_related('user').order_by('id'))
+
+    stream_xlsx_export.short_description = "Export selected as XLSX (streaming)"
+
+
+class DeliveryAttemptInline(admin.TabularInline):
+    model = models.DeliveryAttempt
+    fields = ['number', 'provider', 'outcome', 'status_code', 'response', 'error', 'started_at', 'duration']
+    readonly_fields = fields
+    extra = 0
+    can_delete = False
+
+    def has_add_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(models.BundleOrder)
+class BundleOrderAdmin(TransactionAdmin):
+    list_display = ['network'] + TransactionAdmin.list_display
+    list_filter = ['network', 'transaction_status']
+    inlines = [DeliveryAttemptInline]
+
 
 @admin.register(models.IShareBundleTransaction)
 class IShareBundleTransactionAdmin(TransactionAdmin):
-    pass
+    list_display = TransactionAdmin.list_display[:-1] + ['attempts', 'next_attempt_at', 'action_buttons']
+    inlines = [DeliveryAttemptInline]
+
+
+@admin.register(models.DeliveryAttempt)
+class DeliveryAttemptAdmin(admin.ModelAdmin):
+    list_display = ['order', 'number', 'provider', 'outcome', 'status_code', 'error', 'started_at', 'duration']
+    list_filter = ['outcome', 'provider']
+    search_fields = ['order__reference']
+    list_select_related = ['order__user']
+    date_hierarchy = 'started_at'
+
+    def has_add_permission(self, request):
+        return False
 
 
 @admin.register(models.MTNTransaction)
@@ -321,21 +381,12 @@ class TopUpRequestAdmin(admin.ModelAdmin):
         try:
             with transaction.atomic():
                 user = topup_request.user
-                user.wallet += topup_request.amount
-                user.save()
-
-                topup_request.status = True
-                topup_request.credited_at = datetime.now()
-                topup_request.payment_channel = "Manual"
-                topup_request.save()
-
-                models.WalletTransactionn.objects.create(
-                    user=user,
-                    transaction_type='Credit',
-                    transaction_amount=topup_request.amount,
-                    transaction_use='Wallet Topup (Admin)',
-                    new_balance=user.wallet,
-                )
+                credited = TopUpRequest.objects.filter(pk=topup_request.pk, status=False).update(
+                    status=True, credited_at=datetime.now())
+                if not credited:
+                    self.message_user(request, "This transaction has already been credited.", level=messages.WARNING)
+                    return redirect('..')
+                wallet.credit(user, topup_request.amount, 'Wallet Topup (Admin)')
                 # response = requests.request('POST', url=sms_url, params=sms_body, headers=sms_headers)
                 # print(response.text)
                 self.message_user(request, f"Successfully credited {topup_request.amount} to {user.username}.",
@@ -346,43 +397,24 @@ class TopUpRequestAdmin(admin.ModelAdmin):
         return redirect('..')
 
     def credit_selected_users(self, request, queryset):
-        pending_requests = queryset.filter(status=False)
-        if not pending_requests.exists():
-            self.message_user(request, "No pending transactions selected.", level=messages.WARNING)
-            return
-
+        started = time.monotonic()
         try:
             with transaction.atomic():
-                # Group pending requests by user to optimize wallet updates
-                user_requests = {}
-                for request_obj in pending_requests:
-                    user = request_obj.user
-                    if user in user_requests:
-                        user_requests[user].append(request_obj)
-                    else:
-                        user_requests[user] = [request_obj]
-
-                for user, requests_list in user_requests.items():
-                    total_amount = sum(req.amount for req in requests_list)
-                    user.wallet += total_amount
-                    user.save()
-
-                    for req in requests_list:
-                        req.status = True
-                        req.credited_at = datetime.now()
-                        req.payment_channel = "Manual"
-                        req.save()
-
-                    models.WalletTransactionn.objects.create(
-                        user=user,
-                        transaction_type='Credit',
-                        transaction_amount=total_amount,
-                        transaction_use='Wallet Topup (Admin)',
-                        new_balance=user.wallet,
-                    )
-
-                self.message_user(request, f"Successfully credited {pending_requests.count()} transactions.",
-                                  level=messages.SUCCESS)
+                pending_ids = list(
+                    queryset.filter(status=False).select_for_update().order_by('id').values_list('id', flat=True)
+                )
+                if not pending_ids:
+                    self.message_user(request, "No pending transactions selected.", level=messages.WARNING)
+                    return
+                pending_requests = TopUpRequest.objects.filter(id__in=pending_ids)
+                # One ledger entry per user for the sum of their selected requests
+                totals = pending_requests.values('user_id').annotate(total=Sum('amount')).order_by('user_id')
+                credits = [(row['user_id'], row['total'], 'Wallet Topup (Admin)') for row in totals]
+                pending_requests.update(status=True, credited_at=datetime.now())
+                wallet.credit_many(credits)
+
+            self.message_user(request, f"Successfully credited {len(pending_ids)} transactions "
+                                       f"in {time.monotonic() - started:.2f}s.", level=messages.SUCCESS)
         except Exception as e:
             self.message_user(request, f"An error occurred: {str(e)}", level=messages.ERROR)
 
@@ -436,18 +468,12 @@ class AFARegistrationAdmin(ExportActionMixin, admin.ModelAdmin):
         amount = afa_registration.amount
         try:
             with transaction.atomic():
-                user.wallet += amount
-                user.save()
-                afa_registration.transaction_status = 'Canceled and Refunded'
-                afa_registration.save()
-
-                models.WalletTransactionn.objects.create(
-                    user=user,
-                    transaction_type='Credit',
-                    transaction_amount=amount,
-                    transaction_use='Afa Transaction Refund',
-                    new_balance=user.wallet,
-                )
+                refunded = models.AFARegistration.objects.filter(pk=afa_registration.pk).exclude(
+                    transaction_status='Canceled and Refunded').update(transaction_status='Canceled and Refunded')
+                if not refunded:
+                    self.message_user(request, "This transaction has already been refunded.", level=messages.WARNING)
+                    return redirect('..')
+                wallet.credit(user, amount, 'Afa Transaction Refund')
                 self.message_user(
                     request,
                     f"Transaction refunded and GHS{amount} credited back to {user.username}'s wallet.",
@@ -464,29 +490,15 @@ class AFARegistrationAdmin(ExportActionMixin, admin.ModelAdmin):
     mark_selected_as_completed.short_description = "Mark selected transactions as completed"
 
     def refund_selected_transactions(self, request, queryset):
-        not_refunded = queryset.exclude(transaction_status='Canceled and Refunded')
+        started = time.monotonic()
         try:
-            with transaction.atomic():
-                for afa_registration in not_refunded:
-                    user = afa_registration.user
-                    amount = afa_registration.amount
-                    user.wallet += amount
-                    user.save()
-                    afa_registration.transaction_status = 'Canceled and Refunded'
-                    afa_registration.save()
-
-                    models.WalletTransactionn.objects.create(
-                        user=user,
-                        transaction_type='Credit',
-                        transaction_amount=amount,
-                        transaction_use='Afa Transaction Refund',
-                        new_balance=user.wallet,
-                    )
-                self.message_user(
-                    request,
-                    f"Refunded {not_refunded.count()} transactions and credited amounts back to users' wallets.",
-                    level=messages.SUCCESS
-                )
+            refunded = refund_selected(queryset, 'Afa Transaction Refund')
+            self.message_user(
+                request,
+                f"Refunded {refunded} transactions and credited amounts back to users' wallets "
+                f"in {time.monotonic() - started:.2f}s.",
+                level=messages.SUCCESS
+            )
         except Exception as e:
             self.message_user(request, f"An error occurred: {str(e)}", level=messages.ERROR)
     refund_selected_transactions.short_description = "Refund selected transactions"
@@ -497,23 +509,150 @@ class TelecelTransactionAdmin(TransactionAdmin):
     pass
 
 
+@admin.register(models.SMSOutbox)
+class SMSOutboxAdmin(admin.ModelAdmin):
+    list_display = ['recipient', 'status', 'attempts', 'created_at', 'sent_at', 'last_error']
+    list_filter = ['status']
+    search_fields = ['recipient', 'dedupe_key']
+
+
+@admin.register(models.PaystackEvent)
+class PaystackEventAdmin(admin.ModelAdmin):
+    list_display = ['event', 'reference', 'status', 'attempts', 'next_attempt_at', 'received_at', 'processed_at',
+                    'last_error']
+    list_filter = ['status', 'event']
+    search_fields = ['reference']
+
+
+@admin.register(models.BundlePrice)
+class BundlePriceAdmin(admin.ModelAdmin):
+    list_display = ['network', 'tier', 'volume_mb', 'price', 'purchase_price', 'effective_from', 'active']
+    list_filter = ['network', 'tier', 'active']
+    ordering = ['network', 'tier', 'volume_mb', '-effective_from']
+
+    def get_readonly_fields(self, request, obj=None):
+        # A version belongs to one bundle; a different bundle is added as a new price.
+        if obj is not None:
+            return ['network', 'tier', 'volume_mb']
+        return []
+
+    def has_change_permission(self, request, obj=None):
+        # Versions replaced by a newer one in effect are history and can only be viewed.
+        if obj is not None and models.BundlePrice.objects.filter(
+                network=obj.network, tier=obj.tier, volume_mb=obj.volume_mb,
+                effective_from__gt=obj.effective_from, effective_from__lte=timezone.now()).exists():
+            return False
+        return super().has_change_permission(request, obj)
+
+    def save_model(self, request, obj, form, change):
+        # The price in effect is history too: editing it saves a new version instead.
+        now = timezone.now()
+        if change and models.BundlePrice.objects.filter(pk=obj.pk, effective_from__lte=now).exists():
+            obj.pk = None
+            if obj.effective_from <= now:
+                obj.effective_from = now
+        super().save_model(request, obj, form, change)
+
+
+@admin.register(models.ProviderHealth)
+class ProviderHealthAdmin(admin.ModelAdmin):
+    list_display = ['provider', 'state', 'changed_at', 'reason', 'calls', 'error_rate', 'slow_rate', 'avg_latency',
+                    'updated_at']
+    readonly_fields = ['provider', 'changed_at', 'reason', 'calls', 'error_rate', 'slow_rate', 'avg_latency',
+                       'updated_at']
+
+    def has_add_permission(self, request):
+        return False
+
+    def save_model(self, request, obj, form, change):
+        # Staff may force a breaker open or closed; the change is logged like the automatic ones.
+        if 'state' in form.changed_data:
+            obj.changed_at = timezone.now()
+            obj.reason = f"Set to {obj.state} by {request.user}"
+            models.ProviderStateChange.objects.create(
+                provider=obj.provider, from_state=form.initial['state'], to_state=obj.state, reason=obj.reason,
+                changed_at=obj.changed_at,
+            )
+        super().save_model(request, obj, form, change)
+
+
+@admin.register(models.ProviderStateChange)
+class ProviderStateChangeAdmin(admin.ModelAdmin):
+    list_display = ['provider', 'from_state', 'to_state', 'reason', 'changed_at']
+    list_filter = ['provider', 'to_state']
+    date_hierarchy = 'changed_at'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(models.DailySales)
+class SalesReportAdmin(admin.ModelAdmin):
+    """Sales dashboard rendered from the hourly and daily rollups instead of the orders table."""
+    report_days = (7, 30, 90)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def changelist_view(self, request, extra_context=None):
+        try:
+            days = int(request.GET.get('days', 30))
+        except ValueError:
+            days = 30
+        days = days if days in self.report_days else 30
+        today = timezone.localdate()
+        start = today - timedelta(days=days - 1)
+        networks = dict(models.BundleOrder.networks)
+
+        daily = models.DailySales.objects.filter(bucket__gte=start, status='Completed')
+        by_day = {}
+        for entry in daily.values('bucket', 'network').annotate(revenue=Sum('revenue')):
+            by_day.setdefault(entry['bucket'], {})[entry['network']] = entry['revenue']
+        day_rows = [
+            (day, [by_day.get(day, {}).get(network, 0) for network in networks], sum(by_day.get(day, {}).values()))
+            for day in (today - timedelta(days=offset) for offset in range(days))
+        ]
+        summary = daily.values('network').annotate(
+            orders=Sum('orders'), volume_mb=Sum('volume_mb'), revenue=Sum('revenue'), cost=Sum('cost'),
+            costed_orders=Sum('costed_orders'),
+        ).order_by('network')
+        statuses = models.DailySales.objects.filter(bucket__gte=start).values('status').annotate(
+            orders=Sum('orders'), revenue=Sum('revenue')
+        ).order_by('-orders')
+        hourly = models.HourlySales.objects.filter(
+            bucket__gte=timezone.now() - timedelta(hours=24), status='Completed'
+        ).values('bucket').annotate(orders=Sum('orders'), revenue=Sum('revenue')).order_by('-bucket')
+
+        context = {
+            **self.admin_site.each_context(request),
+            'title': "Sales report",
+            'opts': self.model._meta,
+            'days': days,
+            'report_days': self.report_days,
+            'networks': [networks[network] for network in networks],
+            'day_rows': day_rows,
+            'summary': [dict(row, network=networks.get(row['network'], row['network'])) for row in summary],
+            'statuses': statuses,
+            'hourly': hourly,
+            **(extra_context or {}),
+        }
+        return TemplateResponse(request, "admin/intel_app/sales_report.html", context)
+
+
 admin.site.register(models.CustomUser, CustomUserAdmin)
-admin.site.register(models.IshareBundlePrice)
-admin.site.register(models.MTNBundlePrice)
 admin.site.register(models.Payment, PaymentAdmin)
 admin.site.register(models.AdminInfo)
 admin.site.register(models.TopUpRequest, TopUpRequestAdmin)
-admin.site.register(models.AgentIshareBundlePrice)
-admin.site.register(models.AgentMTNBundlePrice)
-admin.site.register(models.SuperAgentBigTimeBundlePrice)
-admin.site.register(models.SuperAgentMTNBundlePrice)
-admin.site.register(models.SuperAgentIshareBundlePrice)
 admin.site.register(models.BigTimeTransaction)
-admin.site.register(models.BigTimeBundlePrice)
-admin.site.register(models.AgentBigTimeBundlePrice)
-admin.site.register(models.AgentVodaBundlePrice)
-admin.site.register(models.SuperAgentVodaBundlePrice)
-admin.site.register(models.VodaBundlePrice)
 admin.site.register(models.WalletTransactionn)
 
 
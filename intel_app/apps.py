@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class IntelAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'intel_app'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,145 @@
+"""Micro-benchmarks for the helpers that run on every request or every rendered row, behind `manage.py benchmark`."""
+import gc
+import platform
+import statistics
+import sys
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import AnonymousUser
+from django.template.loader import render_to_string
+from django.test import RequestFactory
+from django.utils import timezone
+
+from . import catalog, forms, helper, models, site_config, views
+from .admin import TransactionAdmin
+from .templatetags.bundle_filters import format_bundle
+
+# The offer strings the filters see in practice: plain MB, GB-sized, spaced, decimal and legacy free text.
+OFFERS = ["500MB", "1000MB", "1500 MB", "2.5GB", "10000MB", "750.5MB", "Unlimited"]
+VOLUMES = [500, 1000, 1500, 2000, 3000, 5000, 10000, 15000, 20000, 50000]
+NETWORKS = ("ishare", "mtn", "voda")
+
+
+def seed_catalog():
+    """A full price list for every network and tier, as the bundle pages see it."""
+    models.BundlePrice.objects.all().delete()
+    models.BundlePrice.objects.bulk_create([
+        models.BundlePrice(network=network, tier=tier, volume_mb=volume, price=volume / 200 + offset,
+                           purchase_price=volume / 220)
+        for network, _ in models.BundleOrder.networks
+        for offset, (tier, _) in enumerate(models.BundlePrice.tiers)
+        for volume in VOLUMES
+    ])
+    catalog.invalidate()
+    site_config.invalidate()
+
+
+def history_rows(count):
+    """Rows shaped like the .values() history_data pages through, newest first."""
+    now = timezone.now()
+    return [
+        {'id': index, 'transaction_date': now - timedelta(minutes=index), 'bundle_number': 240000000 + index,
+         'offer': OFFERS[index % len(OFFERS)], 'reference': f"{index:06d}ABCD", 'transaction_status': "Completed"}
+        for index in range(count)
+    ]
+
+
+def cases(rows):
+    """{name: zero-argument callable} for every benchmarked path; `rows` sizes the history cases."""
+    factory = RequestFactory()
+    user = models.CustomUser(id=1, username="benchmark", status="User", wallet=100)
+    page_request = factory.get('/history')
+    page_request.user = user
+    data_request = factory.get('/history_data/mtn', {'draw': '1', 'start': '0'})
+    data_request.user = user
+    anonymous = factory.get('/')
+    anonymous.user = AnonymousUser()
+    template_rows = history_rows(rows)
+
+    def format_offers():
+        for offer in OFFERS:
+            format_bundle(offer)
+
+    def format_offers_for_export():
+        for offer in OFFERS:
+            TransactionAdmin._format_offer_for_export(offer)
+
+    def history_page():
+        render_to_string("layouts/history.html", {"header": "MTN Transactions", "net": "mtn"}, page_request)
+
+    def history_data_rows():
+        page = [dict(row) for row in template_rows]
+        for row in page:
+            views._format_row(row)
+            del row['id']
+        views._table_page(data_request, page, "next")
+
+    benchmarks = {
+        'helper.ref_generator': helper.ref_generator,
+        f'format_bundle x{len(OFFERS)}': format_offers,
+        f'_format_offer_for_export x{len(OFFERS)}': format_offers_for_export,
+    }
+    for form_class in (forms.IShareBundleForm, forms.MTNForm, forms.VodaBundleForm):
+        benchmarks[f'{form_class.__name__}()'] = lambda form_class=form_class: form_class("User")
+        # Rendering the offers <select> is what the bundle pages pay for on every visit.
+        benchmarks[f'{form_class.__name__} offers render'] = (
+            lambda form_class=form_class: str(form_class("Agent")['offers'])
+        )
+    benchmarks['layouts/history.html render'] = history_page
+    benchmarks[f'history_data x{rows} rows'] = history_data_rows
+    return benchmarks
+
+
+def measure(function, repeat=7, warmup=1, min_time=0.2):
+    """
+    Time `function` like timeit: the loop count is calibrated so one run takes at least `min_time` seconds,
+    `warmup` runs are thrown away, and the garbage collector is off while timing. Returns seconds per call for
+    each of the `repeat` runs.
+    """
+    loops = 1
+    while True:
+        elapsed = _run(function, loops)
+        if elapsed >= min_time:
+            break
+        loops = max(loops * 2, int(loops * min_time / elapsed * 1.2)) if elapsed else loops * 10
+    for _ in range(warmup):
+        _run(function, loops)
+    return [_run(function, loops) / loops for _ in range(repeat)]
+
+
+def _run(function, loops):
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        start = time.perf_counter()
+        for _ in range(loops):
+            function()
+        return time.perf_counter() - start
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def summarize(timings):
+    """Per-call times in microseconds. `best` is the least noisy figure and the one baselines compare."""
+    return {
+        'best_us': round(min(timings) * 1e6, 3),
+        'median_us': round(statistics.median(timings) * 1e6, 3),
+        'stdev_percent': round(statistics.stdev(timings) / statistics.mean(timings) * 100, 2)
+        if len(timings) > 1 else 0.0,
+    }
+
+
+def environment():
+    return {'python': sys.version.split()[0], 'machine': platform.machine(), 'platform': platform.platform()}
+
+
+def regressions(results, baseline, threshold):
+    """(name, baseline_us, now_us) for every benchmark more than `threshold` (0.2 = 20%) slower than the baseline."""
+    slower = []
+    for name, stats in results.items():
+        before = baseline.get('results', {}).get(name)
+        if before and stats['best_us'] > before['best_us'] * (1 + threshold):
+            slower.append((name, before['best_us'], stats['best_us']))
+    return slower
@@ -0,0 +1,118 @@
+import hashlib
+from collections import namedtuple
+from datetime import timedelta
+from itertools import groupby
+from types import MappingProxyType
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import models
+from .process_cache import ProcessCache
+
+TIERS = ("User", "Agent", "Super Agent")
+
+Offer = namedtuple('Offer', ['network', 'tier', 'price', 'volume', 'purchase_price', 'label'])
+
+
+def tier_for(status):
+    return status if status in TIERS else "User"
+
+
+class Catalog:
+    """Immutable index of every bundle offer, keyed by (network, tier, price) and (network, tier, volume).
+
+    Versions superseded less than PRICE_GRACE_PERIOD seconds ago are kept in a separate index so an order
+    placed from a page rendered before a price change can still be matched; they are never listed.
+    """
+
+    def __init__(self, offers, superseded=(), next_change=None):
+        listing = {}
+        for offer in offers:
+            listing.setdefault((offer.network, offer.tier), []).append(offer)
+        self._listing = MappingProxyType({key: tuple(value) for key, value in listing.items()})
+        self._by_price = MappingProxyType({(o.network, o.tier, o.price): o for o in offers})
+        self._by_volume = MappingProxyType({(o.network, o.tier, o.volume): o for o in offers})
+        self._superseded = MappingProxyType({(o.network, o.tier, o.price): (o, until) for o, until in superseded})
+        self.next_change = next_change
+        # Changes whenever a listed offer does, in every process alike; keys the cached offer lists.
+        self.version = hashlib.sha1(repr(sorted(self._listing.items())).encode()).hexdigest()[:12]
+
+    def offers(self, network, status):
+        return self._listing.get((network, tier_for(status)), ())
+
+    def choices(self, network, status):
+        return [(str(offer.price), offer.label) for offer in self.offers(network, status)]
+
+    def get_offer(self, network, status, price):
+        try:
+            key = (network, tier_for(status), float(price))
+        except (TypeError, ValueError):
+            return None
+        offer = self._by_price.get(key)
+        if offer is None and key in self._superseded:
+            offer, until = self._superseded[key]
+            if timezone.now() >= until:
+                return None
+        return offer
+
+    def get_offer_by_volume(self, network, status, volume):
+        try:
+            return self._by_volume.get((network, tier_for(status), float(volume)))
+        except (TypeError, ValueError):
+            return None
+
+
+def _offer(price):
+    return Offer(
+        network=price.network,
+        tier=price.tier,
+        price=price.price,
+        volume=price.volume_mb,
+        purchase_price=price.purchase_price,
+        label=str(price),
+    )
+
+
+def build_catalog():
+    now = timezone.now()
+    grace = timedelta(seconds=settings.PRICE_GRACE_PERIOD)
+    offers, superseded = [], []
+    # One pass over the (network, tier, volume_mb, -effective_from) index: the first version of each
+    # bundle is the one in effect, the ones after it are older.
+    versions = models.BundlePrice.objects.filter(effective_from__lte=now).order_by(
+        'network', 'tier', 'volume_mb', '-effective_from'
+    )
+    for _, group in groupby(versions, key=lambda p: (p.network, p.tier, p.volume_mb)):
+        replaced_at = None
+        for price in group:
+            if replaced_at is None:
+                if price.active:
+                    offers.append(_offer(price))
+            elif replaced_at + grace > now:
+                if price.active:
+                    superseded.append((_offer(price), replaced_at + grace))
+            else:
+                break
+            replaced_at = price.effective_from
+    offers.sort(key=lambda o: (o.network, o.tier, o.volume))
+    next_change = models.BundlePrice.objects.filter(effective_from__gt=now).order_by('effective_from').values_list(
+        'effective_from', flat=True
+    ).first()
+    return Catalog(offers, superseded, next_change)
+
+
+_catalog = ProcessCache('price_catalog', loader=build_catalog, ttl=lambda: settings.PRICE_CATALOG_CACHE_TTL)
+
+
+def get_catalog():
+    current = _catalog.get()
+    if current.next_change is not None and timezone.now() >= current.next_change:
+        # A scheduled price has taken effect since the snapshot was built.
+        _catalog.invalidate()
+        current = _catalog.get()
+    return current
+
+
+def invalidate():
+    _catalog.invalidate()
@@ -1,8 +1,9 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from .models import CustomUser
-from . import models
+from . import catalog, models
 from django.contrib.admin.widgets import FilteredSelectMultiple
+from django.urls import reverse_lazy
 
 class CustomUserForm(UserCreationForm):
     first_name = forms.CharField(widget=forms.TextInput(attrs={'class': 'form-control'}))
@@ -20,39 +21,54 @@ class CustomUserForm(UserCreationForm):
 
 class IShareBundleForm(forms.Form):
     phone_number = forms.IntegerField(widget=forms.NumberInput(attrs={'class': 'form-control phone', 'placeholder': '0270000000'}))
-    offers = forms.ModelChoiceField(queryset=None, to_field_name='price', empty_label=None,
-                                    widget=forms.Select(attrs={'class': 'form-control airtime-input'}))
+    offers = forms.ChoiceField(widget=forms.Select(attrs={'class': 'form-control airtime-input'}))
 
     def __init__(self, status, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        if status == "User":
-            self.fields['offers'].queryset = models.IshareBundlePrice.objects.all()
-        elif status == "Agent":
-            self.fields['offers'].queryset = models.AgentIshareBundlePrice.objects.all()
-        elif status == "Super Agent":
-            self.fields['offers'].queryset = models.SuperAgentIshareBundlePrice.objects.all()
-        # self.fields['size'].queryset = models.Size.objects.filter(domain=domain)
-            
+        self.fields['offers'].choices = catalog.get_catalog().choices('ishare', status)
+
 
 class MTNForm(forms.Form):
     phone_number = forms.IntegerField(widget=forms.NumberInput(attrs={'class': 'form-control mtn-phone', 'placeholder': '0200000000'}))
-    offers = forms.ModelChoiceField(queryset=None, to_field_name='price', empty_label=None,
-                               widget=forms.Select(attrs={'class': 'form-control mtn-offer'}))
+    offers = forms.ChoiceField(widget=forms.Select(attrs={'class': 'form-control mtn-offer'}))
 
     def __init__(self, status, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        if status == "User":
-            self.fields['offers'].queryset = models.MTNBundlePrice.objects.all()
-        elif status == "Agent":
-            self.fields['offers'].queryset = models.AgentMTNBundlePrice.objects.all()
-        elif status == "Super Agent":
-            self.fields['offers'].queryset = models.SuperAgentMTNBundlePrice.objects.all()
-        # self.fields['size'].queryset = models.Size.objects.filter(domain=domain)
+        self.fields['offers'].choices = catalog.get_catalog().choices('mtn', status)
+
+
+class UserAutocompleteSelect(forms.Select):
+    """
+    A user <select> that select2 fills from the user-autocomplete endpoint as staff type. Only the chosen user
+    is rendered as an option, so the page does not grow with the number of accounts.
+    """
+
+    def __init__(self, attrs=None):
+        super().__init__({
+            'data-ajax--url': reverse_lazy('user-autocomplete'),
+            'data-ajax--delay': 250,
+            'data-minimum-input-length': 2,
+            'data-placeholder': "Search by username or phone",
+            **(attrs or {}),
+        })
+
+    def optgroups(self, name, value, attrs=None):
+        field = self.choices.field
+        selected = [item for item in value if item not in (None, '')]
+        users = self.choices.queryset.filter(**{f"{field.to_field_name or 'pk'}__in": selected}) if selected else []
+        options = [self.create_option(name, '', '', False, 0)]
+        options += [self.create_option(name, field.prepare_value(user), field.label_from_instance(user), True, index,
+                                       attrs=attrs) for index, user in enumerate(users, 1)]
+        return [(None, options, 0)]
+
+    def use_required_attribute(self, initial):
+        # Select's check reads the first choice, which would load the user table.
+        return False
 
 
 class CreditUserForm(forms.Form):
-    user = forms.ModelChoiceField(queryset=models.CustomUser.objects.all().order_by('username'), to_field_name='username', empty_label=None,
-                                  widget=forms.Select(attrs={'class': 'form-control airtime-input', 'id': 'user_select'}))
+    user = forms.ModelChoiceField(queryset=models.CustomUser.objects.all(), empty_label=None,
+                                  widget=UserAutocompleteSelect(attrs={'class': 'form-control airtime-input', 'id': 'user_select'}))
     amount = forms.FloatField(widget=forms.NumberInput(attrs={'class': 'form-control', 'placeholder': 'GHS 100'}))
 
 
@@ -73,18 +89,11 @@ class AFARegistrationForm(forms.ModelForm):
 
 class BigTimeBundleForm(forms.Form):
     phone_number = forms.IntegerField(widget=forms.NumberInput(attrs={'class': 'form-control phone', 'placeholder': '0270000000'}))
-    offers = forms.ModelChoiceField(queryset=models.BigTimeBundlePrice.objects.all().order_by('price'), to_field_name='price', empty_label=None,
-                                    widget=forms.Select(attrs={'class': 'form-control airtime-input'}))
+    offers = forms.ChoiceField(widget=forms.Select(attrs={'class': 'form-control airtime-input'}))
 
     def __init__(self, status, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        if status == "User":
-            self.fields['offers'].queryset = models.BigTimeBundlePrice.objects.all()
-        elif status == "Agent":
-            self.fields['offers'].queryset = models.AgentBigTimeBundlePrice.objects.all()
-        elif status == "Super Agent":
-            self.fields['offers'].queryset = models.SuperAgentBigTimeBundlePrice.objects.all()
-        # self.fields['size'].queryset = models.Size.objects.filter(domain=domain)
+        self.fields['offers'].choices = catalog.get_catalog().choices('bigtime', status)
 
 
 class UploadFileForm(forms.Form):
@@ -93,14 +102,8 @@ class UploadFileForm(forms.Form):
 
 class VodaBundleForm(forms.Form):
     phone_number = forms.IntegerField(widget=forms.NumberInput(attrs={'class': 'form-control phone', 'placeholder': '0200000000'}))
-    offers = forms.ModelChoiceField(queryset=models.VodaBundlePrice.objects.all().order_by('price'), to_field_name='price', empty_label=None,
-                                    widget=forms.Select(attrs={'class': 'form-control airtime-input'}))
+    offers = forms.ChoiceField(widget=forms.Select(attrs={'class': 'form-control airtime-input'}))
 
     def __init__(self, status, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        if status == "User":
-            self.fields['offers'].queryset = models.VodaBundlePrice.objects.all()
-        elif status == "Agent":
-            self.fields['offers'].queryset = models.AgentVodaBundlePrice.objects.all()
-        elif status == "Super Agent":
-            self.fields['offers'].queryset = models.SuperAgentVodaBundlePrice.objects.all()
\ No newline at end of file
+        self.fields['offers'].choices = catalog.get_catalog().choices('voda', status)
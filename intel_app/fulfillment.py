@@ -0,0 +1,227 @@
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.db import transaction, close_old_connections
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, Min, Q
+from django.utils import timezone
+from urllib3.exceptions import NewConnectionError
+
+from . import helper, models, notifier, routing, wallet
+
+# dispatch_order's result for an order that failed and was put back in the queue for a later attempt.
+RETRY = "retry"
+
+
+def provider_concurrency(provider):
+    return settings.FULFILLMENT_CONCURRENCY.get(provider, 1)
+
+
+def queued_orders():
+    return models.IShareBundleTransaction.objects.filter(
+        Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=timezone.now()),
+        transaction_status="Pending", queued_at__isnull=False, claimed_at__isnull=True,
+    )
+
+
+def claim_orders(limit):
+    # Claimed orders move to Processing inside the locking transaction, so two workers never
+    # dispatch the same order. Rows locked by another worker are skipped rather than waited on.
+    with transaction.atomic():
+        orders = list(
+            queued_orders()
+            .select_for_update(skip_locked=True, of=('self',))
+            .select_related('user')
+            .order_by('id')[:limit]
+        )
+        if not orders:
+            return []
+        provider, trial_limit = routing.router.choose()
+        if provider is None:
+            return []
+        orders = orders[:trial_limit or limit]
+        now = timezone.now()
+        models.IShareBundleTransaction.objects.filter(id__in=[order.id for order in orders]).update(
+            transaction_status="Processing", provider=provider, claimed_at=now
+        )
+    for order in orders:
+        order.transaction_status = "Processing"
+        order.provider = provider
+        order.claimed_at = now
+    return orders
+
+
+def _send(order):
+    volume = float(order.offer.replace("MB", ""))
+    if order.provider == "Gyasi":
+        response = helper.send_bundle(order.user, f"0{order.bundle_number}", volume, order.reference)
+        success_code = "0000"
+    else:
+        response = helper.value_for_moni_send_bundle(order.user, f"0{order.bundle_number}", volume, order.reference)
+        success_code = "200"
+    try:
+        data = response.json()
+    except ValueError:
+        data = {'body': response.text[:500]}
+    return response.status_code == 200 and str(data.get("code")) == success_code, data, response.status_code
+
+
+def _claimed(order):
+    # Staff can refund or complete an order while its provider call is in flight, so every update after
+    # the call only applies to the order as this worker claimed it.
+    return models.IShareBundleTransaction.objects.filter(
+        id=order.id, transaction_status="Processing", claimed_at=order.claimed_at
+    )
+
+
+def _complete(order):
+    with transaction.atomic():
+        completed = _claimed(order).update(transaction_status="Completed", completed_at=timezone.now())
+    if completed:
+        notifier.send_many(completion_messages(order))
+    return completed
+
+
+def completion_messages(order):
+    """The receiver's and the buyer's SMS for a delivered order, as (recipient, message, dedupe_key)."""
+    user = order.user
+    receiver_message = f"Your bundle purchase has been completed successfully. {order.offer} has been credited to you by {user.phone}.\nReference: {order.reference}\n"
+    sms_message = f"Hello @{user.username}. Your bundle purchase has been completed successfully. {order.offer} has been credited to 0{order.bundle_number}.\nReference: {order.reference}\nCurrent Wallet Balance: {user.wallet}\nThank you for using DCS.\n\n"
+    return [
+        (order.bundle_number, receiver_message, f"order-receiver:{order.id}"),
+        (user.phone, sms_message, f"order-buyer:{order.id}"),
+    ]
+
+
+def _refund(order, reason):
+    # The wallet was debited when the order was queued, so a rejected order is credited back.
+    with transaction.atomic():
+        refunded = _claimed(order).update(
+            transaction_status="Canceled and Refunded", completed_at=timezone.now(), description=reason[:500]
+        )
+        if refunded:
+            wallet.credit(order.user, order.amount, 'AT Bundle Refund')
+    return refunded
+
+
+def _never_sent(error):
+    # Only failures to connect are certain not to have reached the provider; anything later
+    # (a read timeout, a dropped connection) may have delivered the bundle already.
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(error, requests.ConnectionError) and isinstance(reason, NewConnectionError)
+
+
+def _record_attempt(order, started_at, duration, outcome, status_code=None, response=None, error=None):
+    order.attempts += 1
+    models.DeliveryAttempt.objects.create(
+        order_id=order.id, number=order.attempts, provider=order.provider, outcome=outcome, status_code=status_code,
+        response=response, error=error[:500] if error else None, started_at=started_at, duration=duration,
+    )
+    models.IShareBundleTransaction.objects.filter(id=order.id).update(attempts=order.attempts)
+
+
+def _retry_or_refund(order, reason):
+    if order.attempts >= settings.DELIVERY_MAX_ATTEMPTS:
+        return False if _refund(order, f"{reason} (gave up after {order.attempts} attempts)") else None
+    backoff = min(settings.DELIVERY_RETRY_BACKOFF * 2 ** (order.attempts - 1), settings.DELIVERY_RETRY_MAX_BACKOFF)
+    # Jitter keeps orders that failed together (say, in a provider outage) from all retrying at once.
+    delay = backoff * random.uniform(0.5, 1)
+    requeued = _claimed(order).update(
+        transaction_status="Pending", claimed_at=None, next_attempt_at=timezone.now() + timedelta(seconds=delay),
+        description=reason[:500],
+    )
+    return RETRY if requeued else None
+
+
+def dispatch_order(order):
+    """
+    Send one claimed order: True once delivered, False once refunded, RETRY if requeued, None if unknown
+    or already resolved by staff while the provider call was in flight.
+
+    Only transient failures are retried: a 5xx answer or a connection that never opened. Any other answer
+    is a rejection and is refunded at once.
+    """
+    started_at = timezone.now()
+    started = time.monotonic()
+    try:
+        try:
+            delivered, data, status_code = _send(order)
+        except requests.RequestException as e:
+            elapsed = time.monotonic() - started
+            routing.router.record(order.provider, elapsed, ok=False, error=str(e))
+            if _never_sent(e):
+                _record_attempt(order, started_at, elapsed, "Error", error=str(e))
+                return _retry_or_refund(order, f"{order.provider}: {e}")
+            # The provider may or may not have received the order, so it stays in Processing
+            # for staff to check instead of being retried or refunded.
+            _record_attempt(order, started_at, elapsed, "Unknown", error=str(e))
+            models.IShareBundleTransaction.objects.filter(id=order.id).update(description=str(e)[:500])
+            return None
+        elapsed = time.monotonic() - started
+        # A rejected order is the provider answering; only server errors count against its health.
+        routing.router.record(order.provider, elapsed, ok=status_code < 500, error=f"HTTP {status_code}")
+        outcome = "Delivered" if delivered else "Error" if status_code >= 500 else "Rejected"
+        _record_attempt(order, started_at, elapsed, outcome, status_code, data)
+        if delivered:
+            return True if _complete(order) else None
+        if status_code >= 500:
+            return _retry_or_refund(order, f"{order.provider}: HTTP {status_code} {data}")
+        return False if _refund(order, f"Rejected by {order.provider}: {data}") else None
+    finally:
+        close_old_connections()
+
+
+def dispatch_orders(orders):
+    by_provider = {}
+    for order in orders:
+        by_provider.setdefault(order.provider, []).append(order)
+
+    executors = [
+        (ThreadPoolExecutor(max_workers=provider_concurrency(provider)), provider_orders)
+        for provider, provider_orders in by_provider.items()
+    ]
+    futures = [executor.submit(dispatch_order, order) for executor, provider_orders in executors
+               for order in provider_orders]
+    for executor, _ in executors:
+        executor.shutdown(wait=True)
+    return [future.result() for future in futures]
+
+
+def queue_stats(window=timedelta(hours=1)):
+    now = timezone.now()
+    pending = queued_orders().aggregate(depth=Count('id'), oldest=Min('transaction_date'))
+    awaiting_retry = models.IShareBundleTransaction.objects.filter(
+        transaction_status="Pending", claimed_at__isnull=True, next_attempt_at__gt=now
+    ).count()
+    in_flight = models.IShareBundleTransaction.objects.filter(
+        transaction_status="Processing", claimed_at__isnull=False
+    ).values('provider').annotate(count=Count('id'))
+    finished = models.IShareBundleTransaction.objects.filter(
+        completed_at__gte=now - window, claimed_at__isnull=False
+    ).values('provider', 'transaction_status').annotate(
+        count=Count('id'),
+        wait=Avg(ExpressionWrapper(F('claimed_at') - F('transaction_date'), output_field=DurationField())),
+        service=Avg(ExpressionWrapper(F('completed_at') - F('claimed_at'), output_field=DurationField())),
+    )
+    return {
+        'providers': {row.provider: row.state for row in routing.router.health().values()},
+        'queue_depth': pending['depth'],
+        'oldest_pending_seconds': (now - pending['oldest']).total_seconds() if pending['oldest'] else 0,
+        'awaiting_retry': awaiting_retry,
+        'in_flight': {row['provider']: row['count'] for row in in_flight},
+        'finished': [
+            {
+                'provider': row['provider'],
+                'status': row['transaction_status'],
+                'count': row['count'],
+                'avg_wait_seconds': row['wait'].total_seconds() if row['wait'] else 0,
+                'avg_service_seconds': row['service'].total_seconds() if row['service'] else 0,
+            }
+            for row in finished
+        ],
+    }
@@ -0,0 +1,319 @@
+"""Local stand-ins for the upstream providers and the load-test driver behind `manage.py load_test`."""
+import asyncio
+import json
+import random
+import socket
+import threading
+import time
+import uuid
+
+import httpx
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections
+from django.db.models import Q, Sum
+
+from . import fulfillment, metrics, models, notifier, upstream
+
+HOST = '127.0.0.1'
+
+# What each provider answers on success, whatever the path: enough for sending bundles, checking
+# transaction status, verifying Paystack payments and sending SMS.
+STUB_RESPONSES = {
+    'bestpay': {"code": "0000", "status": "Delivered"},
+    'value4moni': {"code": "200", "status": "Delivered"},
+    'paystack': {"status": True, "data": {"status": "success", "amount": 1000, "reference": "LOADTEST",
+                                          "paid_at": "2024-01-01T00:00:00Z"}},
+    'arkesel': {"code": "ok"},
+}
+
+PURCHASES = {
+    'ishare': '/pay_with_wallet/',
+    'mtn': '/mtn_pay_with_wallet/',
+    'bigtime': '/big_time_pay_with_wallet/',
+    'voda': '/voda_pay_with_wallet/',
+}
+
+
+class ProviderStub:
+    """
+    HTTP/1.1 stand-in for one provider on localhost. Every request is answered after `latency` seconds;
+    `error_rate` of them get a 503 instead of the provider's success response.
+    """
+
+    def __init__(self, name, latency=0.0, error_rate=0.0, seed=None):
+        self.name = name
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.body = json.dumps(STUB_RESPONSES.get(name, {})).encode()
+        self.requests = self.errors = self.in_flight = self.peak = 0
+        self.loop = asyncio.new_event_loop()
+        started = threading.Event()
+        threading.Thread(target=self._serve, args=(started,), daemon=True, name=f"stub-{name}").start()
+        started.wait()
+
+    @property
+    def url(self):
+        return f"http://{HOST}:{self.port}"
+
+    def _serve(self, started):
+        asyncio.set_event_loop(self.loop)
+        self.server = self.loop.run_until_complete(asyncio.start_server(self._handle, HOST, 0))
+        self.port = self.server.sockets[0].getsockname()[1]
+        started.set()
+        self.loop.run_forever()
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.split(b"\r\n"):
+                    name, _, value = line.partition(b":")
+                    if name.strip().lower() == b"content-length":
+                        length = int(value)
+                if length:
+                    await reader.readexactly(length)
+                self.requests += 1
+                self.in_flight += 1
+                self.peak = max(self.peak, self.in_flight)
+                await asyncio.sleep(self.latency)
+                self.in_flight -= 1
+                if self.random.random() < self.error_rate:
+                    self.errors += 1
+                    status, body = b"503 Service Unavailable", b'{"message": "stub error"}'
+                else:
+                    status, body = b"200 OK", self.body
+                writer.write(b"HTTP/1.1 %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n%s"
+                             % (status, len(body), body))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.CancelledError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def reset(self):
+        self.requests = self.errors = self.peak = 0
+
+    def stats(self):
+        return {'latency': self.latency, 'error_rate': self.error_rate, 'requests': self.requests,
+                'errors': self.errors, 'peak_in_flight': self.peak}
+
+    async def _shutdown(self):
+        self.server.close()
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.loop.stop()
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop)
+
+
+def use_stubs(stubs):
+    """Point the upstream clients of this process at the stubs, by provider name."""
+    settings.UPSTREAM_PROVIDERS = {
+        name: {**config, 'base_url': stubs[name].url} if name in stubs else config
+        for name, config in settings.UPSTREAM_PROVIDERS.items()
+    }
+    for name in stubs:
+        upstream._clients.pop(name, None)
+
+
+class AppServer:
+    """The ASGI app served by uvicorn from a thread of this process, on a free local port."""
+
+    def __init__(self):
+        import uvicorn
+        from django.core.asgi import get_asgi_application
+
+        self.socket = socket.socket()
+        self.socket.bind((HOST, 0))
+        self.url = f"http://{HOST}:{self.socket.getsockname()[1]}"
+        self.server = uvicorn.Server(uvicorn.Config(
+            get_asgi_application(), lifespan='off', log_level='warning', access_log=False,
+        ))
+        self.thread = threading.Thread(target=self.server.run, kwargs={'sockets': [self.socket]}, daemon=True)
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.05)
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join()
+
+
+class Workers:
+    """Fulfillment and SMS workers running in threads, as the worker and sms processes would."""
+
+    def __init__(self, poll_interval=0.2):
+        self.poll_interval = poll_interval
+        self.stopping = threading.Event()
+        self.errors = 0
+        self.last_error = None
+        self.threads = [threading.Thread(target=self._loop, args=(step,), daemon=True)
+                        for step in (self._fulfill, self._send_sms)]
+        self.limiter = notifier.RateLimiter(settings.SMS_RATE_LIMIT)
+        for thread in self.threads:
+            thread.start()
+
+    def _fulfill(self):
+        orders = fulfillment.claim_orders(settings.FULFILLMENT_BATCH_SIZE)
+        if orders:
+            fulfillment.dispatch_orders(orders)
+        return bool(orders)
+
+    def _send_sms(self):
+        batch = notifier.claim_batch(settings.SMS_BATCH_SIZE)
+        if batch:
+            notifier.send_batch(batch, self.limiter)
+        return bool(batch)
+
+    def _loop(self, step):
+        try:
+            while not self.stopping.is_set():
+                try:
+                    busy = step()
+                except DatabaseError as error:
+                    # The process supervisor would restart a crashed worker; here the loop just carries on.
+                    self.errors += 1
+                    self.last_error = str(error)
+                    busy = False
+                if not busy:
+                    self.stopping.wait(self.poll_interval)
+        finally:
+            close_old_connections()
+
+    def stop(self):
+        self.stopping.set()
+        for thread in self.threads:
+            thread.join()
+
+
+class Sample:
+    __slots__ = ('operation', 'seconds', 'outcome')
+
+    def __init__(self, operation, seconds, outcome):
+        self.operation = operation
+        self.seconds = seconds
+        self.outcome = outcome
+
+
+async def _timed(samples, operation, request, judge):
+    start = time.perf_counter()
+    try:
+        response = await request
+    except httpx.HTTPError:
+        samples.append(Sample(operation, time.perf_counter() - start, 'error'))
+        return None
+    samples.append(Sample(operation, time.perf_counter() - start, judge(response)))
+    return response
+
+
+def _purchase_outcome(response):
+    if response.status_code != 200:
+        return 'error'
+    try:
+        data = response.json()
+    except ValueError:
+        return 'error'
+    if data.get('icon') == 'success':
+        return 'ok'
+    return 'declined' if 'balance is low' in data.get('status', '') else 'error'
+
+
+async def virtual_user(base_url, username, password, purchases, networks, amount, samples):
+    """Log in, buy `purchases` bundles cycling through `networks`, then verify a Paystack payment."""
+    async with httpx.AsyncClient(base_url=base_url, timeout=120) as client:
+        await _timed(samples, 'login page', client.get('/login'), lambda r: 'ok' if r.status_code == 200 else 'error')
+        csrf = {'X-CSRFToken': client.cookies.get('csrftoken', '')}
+        response = await _timed(
+            samples, 'login', client.post('/login', data={'username': username, 'pass': password}, headers=csrf),
+            lambda r: 'ok' if r.status_code == 302 and r.headers.get('location') == '/' else 'error',
+        )
+        if response is None or samples[-1].outcome != 'ok':
+            return
+        csrf = {'X-CSRFToken': client.cookies.get('csrftoken', '')}
+        for index in range(purchases):
+            network = networks[index % len(networks)]
+            data = {'phone': f"024{random.randint(0, 9999999):07d}", 'amount': amount,
+                    'reference': uuid.uuid4().hex[:12].upper()}
+            await _timed(samples, network, client.post(PURCHASES[network], data=data, headers=csrf), _purchase_outcome)
+        await _timed(samples, 'verify_transaction', client.get('/verify_transaction/LOADTEST/'),
+                     lambda r: 'ok' if r.status_code == 200 and r.json().get('status') == 'success' else 'error')
+
+
+def percentile(ordered, fraction):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def summarize(samples, elapsed):
+    operations = {}
+    for sample in samples:
+        operations.setdefault(sample.operation, []).append(sample)
+    operations['all'] = list(samples)
+    summary = {}
+    for operation, group in operations.items():
+        latencies = sorted(sample.seconds for sample in group)
+        outcomes = {}
+        for sample in group:
+            outcomes[sample.outcome] = outcomes.get(sample.outcome, 0) + 1
+        summary[operation] = {
+            'requests': len(group),
+            'throughput_per_second': round(len(group) / elapsed, 2) if elapsed else 0,
+            'p50_ms': round(percentile(latencies, 0.50) * 1000, 1),
+            'p95_ms': round(percentile(latencies, 0.95) * 1000, 1),
+            'p99_ms': round(percentile(latencies, 0.99) * 1000, 1),
+            'max_ms': round(latencies[-1] * 1000, 1) if latencies else 0,
+            'outcomes': outcomes,
+        }
+    return summary
+
+
+def query_totals():
+    """{view: [requests, queries]} from this process's request metrics."""
+    totals = {}
+    for labels, series in metrics.registry.dump()['http_request_db_queries']:
+        totals[labels[0]] = [sum(series[:-1]), series[-1]]
+    return totals
+
+
+def queries_per_request(before, after):
+    report = {}
+    for view, (requests, queries) in after.items():
+        old_requests, old_queries = before.get(view, [0, 0])
+        if requests > old_requests:
+            report[view] = round((queries - old_queries) / (requests - old_requests), 2)
+    return report
+
+
+def wallet_violations(user_ids, initial):
+    """
+    Users whose money does not add up. For every user the ledger must explain the balance, the orders not
+    refunded must account for everything spent, and the balance may never go negative.
+    """
+    ledger = {
+        row['user']: row for row in models.WalletTransactionn.objects.filter(user_id__in=user_ids)
+        .values('user').annotate(credits=Sum('transaction_amount', filter=Q(transaction_type='Credit')),
+                                 debits=Sum('transaction_amount', filter=Q(transaction_type='Debit'))).order_by()
+    }
+    held = dict(
+        models.BundleOrder.objects.filter(user_id__in=user_ids).exclude(transaction_status="Canceled and Refunded")
+        .values('user').annotate(total=Sum('amount')).order_by().values_list('user', 'total')
+    )
+    violations = []
+    for user_id, balance in models.CustomUser.objects.filter(id__in=user_ids).values_list('id', 'wallet'):
+        balance = balance or 0
+        row = ledger.get(user_id, {})
+        expected = initial + (row.get('credits') or 0) - (row.get('debits') or 0)
+        if abs(balance - expected) > 1e-6:
+            violations.append({'user_id': user_id, 'check': 'ledger', 'wallet': balance, 'expected': expected})
+        if abs((initial - balance) - (held.get(user_id) or 0)) > 1e-6:
+            violations.append({'user_id': user_id, 'check': 'orders', 'wallet': balance,
+                               'orders_not_refunded': held.get(user_id) or 0})
+        if balance < 0:
+            violations.append({'user_id': user_id, 'check': 'negative', 'wallet': balance})
+    return violations
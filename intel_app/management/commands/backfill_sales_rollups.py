@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from intel_app import reporting
+
+
+class Command(BaseCommand):
+    help = ("Rebuild the hourly and daily sales rollups from every bundle order. Run it once after deploying "
+            "the rollups, or to repair them; it replaces the tables' contents. Order writes are locked out until "
+            "it finishes, so checkouts and the workers stall while it runs: do not run it alongside live traffic, "
+            "stop the web and worker processes or use a maintenance window.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000, help="Orders read per query.")
+
+    def handle(self, *args, **options):
+        def progress(processed, last_id):
+            if options['verbosity'] >= 2:
+                self.stdout.write(f"{processed} orders read (up to id {last_id})")
+
+        processed = reporting.rebuild(options['chunk_size'], progress)
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt sales rollups from {processed} orders"))
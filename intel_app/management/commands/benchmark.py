@@ -0,0 +1,70 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from intel_app import benchmarks
+
+
+class Command(BaseCommand):
+    help = ("Time the per-request helpers, forms and history rendering in a throwaway test database, and "
+            "compare them with a saved baseline.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help="Only run benchmarks whose name contains one of these.")
+        parser.add_argument('--repeat', type=int, default=7, help="Timed runs per benchmark.")
+        parser.add_argument('--warmup', type=int, default=1, help="Untimed runs before the timed ones.")
+        parser.add_argument('--min-time', type=float, default=0.2, help="Minimum seconds one run should take.")
+        parser.add_argument('--rows', type=int, default=100, help="Rows in the history benchmarks.")
+        parser.add_argument('--baseline', default='benchmark-baseline.json')
+        parser.add_argument('--save', action='store_true', help="Write the results as the new baseline.")
+        parser.add_argument('--threshold', type=float, default=0.25,
+                            help="Fail when a benchmark is this much slower than the baseline (0.25 = 25%%).")
+        parser.add_argument('--keepdb', action='store_true', help="Reuse the test database between runs.")
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        try:
+            benchmarks.seed_catalog()
+            results = {}
+            for name, function in benchmarks.cases(options['rows']).items():
+                if options['names'] and not any(part in name for part in options['names']):
+                    continue
+                results[name] = benchmarks.summarize(
+                    benchmarks.measure(function, options['repeat'], options['warmup'], options['min_time'])
+                )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+
+        baseline = {}
+        if os.path.exists(options['baseline']):
+            with open(options['baseline']) as source:
+                baseline = json.load(source)
+
+        self.stdout.write(f"{'benchmark':<40}{'best us':>12}{'median us':>12}{'stdev %':>9}{'baseline':>12}{'change':>9}")
+        for name, stats in results.items():
+            before = baseline.get('results', {}).get(name)
+            change = f"{(stats['best_us'] / before['best_us'] - 1) * 100:+.1f}%" if before else ""
+            self.stdout.write(f"{name:<40}{stats['best_us']:>12}{stats['median_us']:>12}{stats['stdev_percent']:>9}"
+                              f"{before['best_us'] if before else '':>12}{change:>9}")
+        if baseline and baseline.get('environment') != benchmarks.environment():
+            self.stdout.write(self.style.WARNING(
+                f"The baseline was recorded on {json.dumps(baseline.get('environment'))}; timings may not compare."
+            ))
+
+        if options['save']:
+            saved = {'recorded_at': timezone.now().isoformat(), 'environment': benchmarks.environment(),
+                     'results': {**baseline.get('results', {}), **results}}
+            with open(options['baseline'], 'w') as output:
+                json.dump(saved, output, indent=2)
+            self.stdout.write(f"Baseline written to {options['baseline']}")
+            return
+
+        slower = benchmarks.regressions(results, baseline, options['threshold'])
+        if slower:
+            raise CommandError("Slower than the baseline: " + ", ".join(
+                f"{name} {before}us -> {now}us" for name, before, now in slower
+            ))
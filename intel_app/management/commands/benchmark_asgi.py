@@ -0,0 +1,189 @@
+import asyncio
+import io
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.contrib.auth import BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.urls import reverse
+from django.utils.crypto import get_random_string
+
+from intel_app import catalog, loadtest, models, site_config, views
+from intel_app.loadtest import HOST
+
+
+class _Request:
+    def __init__(self, method, path, body=b'', headers=()):
+        self.method = method
+        self.path = path
+        self.body = body
+        self.headers = list(headers)
+
+
+async def _asgi_request(application, request):
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': request.method,
+        'scheme': 'http', 'path': request.path, 'raw_path': request.path.encode(), 'query_string': b'',
+        'root_path': '', 'headers': [(b'host', HOST.encode())] + [
+            (name.lower().encode(), value.encode()) for name, value in request.headers
+        ], 'client': (HOST, 0), 'server': (HOST, 80),
+    }
+    messages = [{'type': 'http.request', 'body': request.body, 'more_body': False}]
+    disconnected = asyncio.Event()
+    status = []
+
+    async def receive():
+        if messages:
+            return messages.pop()
+        await disconnected.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        if message['type'] == 'http.response.start':
+            status.append(message['status'])
+
+    await application(scope, receive, send)
+    disconnected.set()
+    return status[0]
+
+
+def _wsgi_request(application, request):
+    environ = {
+        'REQUEST_METHOD': request.method, 'PATH_INFO': request.path, 'SCRIPT_NAME': '', 'QUERY_STRING': '',
+        'SERVER_NAME': HOST, 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1', 'HTTP_HOST': HOST,
+        'CONTENT_LENGTH': str(len(request.body)), 'wsgi.input': io.BytesIO(request.body),
+        'wsgi.errors': sys.stderr, 'wsgi.url_scheme': 'http',
+    }
+    for name, value in request.headers:
+        key = name.upper().replace('-', '_')
+        environ[key if key == 'CONTENT_TYPE' else f'HTTP_{key}'] = value
+    status = []
+    response = application(environ, lambda line, headers: status.append(int(line.split()[0])))
+    b''.join(response)
+    response.close()
+    return status[0]
+
+
+class _InFlight:
+    """Wraps func to count how many calls of it run at once, like ProviderStub does for upstream requests."""
+
+    def __init__(self, func):
+        self.func = func
+        self.lock = threading.Lock()
+        self.current = self.peak = 0
+
+    def __call__(self, *args, **kwargs):
+        with self.lock:
+            self.current += 1
+            self.peak = max(self.peak, self.current)
+        try:
+            return self.func(*args, **kwargs)
+        finally:
+            with self.lock:
+                self.current -= 1
+
+    def reset(self):
+        self.peak = 0
+
+
+def _purchase_request():
+    """A logged-in iShare purchase from a customer with a wallet large enough for every run."""
+    user = models.CustomUser.objects.create_user(username='benchmark', password=get_random_string(20),
+                                                 wallet=10 ** 9, phone=240000000)
+    models.AdminInfo.objects.create(name="Benchmark", phone_number=240000001, payment_channel="MTN Mobile Money")
+    models.BundlePrice.objects.create(network="ishare", tier="User", volume_mb=1000, price=1, purchase_price=1)
+    site_config.invalidate()
+    catalog.invalidate()
+
+    session = SessionStore()
+    session[SESSION_KEY] = str(user.pk)
+    session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+    session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    session.create()
+    csrf = get_random_string(32)
+    return _Request('POST', reverse('pay_with_wallet'), urlencode({
+        'phone': '0270000000', 'amount': '1', 'reference': 'BENCHMARK',
+    }).encode(), [
+        ('Content-Type', 'application/x-www-form-urlencoded'),
+        ('Cookie', f"{settings.SESSION_COOKIE_NAME}={session.session_key}; {settings.CSRF_COOKIE_NAME}={csrf}"),
+        ('X-CSRFToken', csrf),
+    ])
+
+
+class Command(BaseCommand):
+    help = ("Compare how many requests one process keeps in flight under the ASGI handler (uvicorn workers) and "
+            "under the WSGI handler (gunicorn sync or gthread workers): verify_transaction against a slow "
+            "Paystack, and pay_with_wallet checkouts in a throwaway test database.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help="Requests sent through each handler.")
+        parser.add_argument('--concurrency', type=int, default=100,
+                            help="Requests the ASGI run keeps open at once, like clients of one uvicorn worker.")
+        parser.add_argument('--wsgi-threads', type=int, default=1,
+                            help="Threads per WSGI worker; 1 is gunicorn's default sync worker.")
+        parser.add_argument('--delay', type=float, default=0.2, help="Seconds the fake Paystack takes to answer.")
+
+    def handle(self, *args, **options):
+        stub = loadtest.ProviderStub('paystack', options['delay'])
+        loadtest.use_stubs({'paystack': stub})
+        results = self.compare("verify", _Request('GET', reverse('verify_transaction', args=['BENCHMARK'])),
+                               stub, options)
+        stub.stop()
+
+        # Purchases debit a wallet and insert an order, so they run in a fresh test database.
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        checkouts = _InFlight(views._buy_ishare)
+        views._buy_ishare = checkouts
+        try:
+            results += self.compare("purchase", _purchase_request(), checkouts, options)
+            placed = models.IShareBundleTransaction.objects.count()
+        finally:
+            views._buy_ishare = checkouts.func
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        total = options['requests']
+        self.stdout.write(f"{total} requests each, upstream answering in {options['delay']}s")
+        self.stdout.write(f"{'endpoint':<10}{'handler':<18}{'seconds':>10}{'req/s':>10}{'peak in flight':>16}"
+                          f"{'non-200':>10}")
+        for endpoint, name, elapsed, peak, statuses in results:
+            self.stdout.write(f"{endpoint:<10}{name:<18}{elapsed:>10.2f}{total / elapsed:>10.1f}{peak:>16}"
+                              f"{sum(status != 200 for status in statuses):>10}")
+        self.stdout.write(f"{placed} of {2 * total} purchases placed an order")
+
+    def compare(self, endpoint, request, counter, options):
+        """Send the request through both handlers; counter.peak is how many ran at once in each."""
+        total = options['requests']
+        asgi = ASGIHandler()
+
+        async def run_asgi():
+            limit = asyncio.Semaphore(options['concurrency'])
+
+            async def one():
+                async with limit:
+                    return await _asgi_request(asgi, request)
+
+            return await asyncio.gather(*(one() for _ in range(total)))
+
+        results = []
+        counter.reset()
+        start = time.perf_counter()
+        statuses = asyncio.run(run_asgi())
+        results.append((endpoint, "ASGI", time.perf_counter() - start, counter.peak, statuses))
+
+        wsgi = WSGIHandler()
+        counter.reset()
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['wsgi_threads']) as executor:
+            statuses = list(executor.map(lambda _: _wsgi_request(wsgi, request), range(total)))
+        results.append((endpoint, f"WSGI ({options['wsgi_threads']} thread)", time.perf_counter() - start,
+                        counter.peak, statuses))
+        return results
@@ -0,0 +1,100 @@
+import re
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count, Min
+from django.utils import timezone
+
+from intel_app import models
+
+ORDER_MODELS = [
+    models.IShareBundleTransaction,
+    models.MTNTransaction,
+    models.BigTimeTransaction,
+    models.VodafoneTransaction,
+    models.AFARegistration,
+]
+
+
+def hot_queries():
+    """(name, queryset, needs_index_order) for every lookup the views, webhook and admin queues run."""
+    queries = []
+    for model in ORDER_MODELS:
+        name = model.__name__
+        queries += [
+            (f"{name} user history", model.objects.filter(user_id=1).order_by('-transaction_date')[:100], True),
+            (f"{name} by reference", model.objects.filter(reference='REF'), False),
+            (f"{name} status queue",
+             model.objects.filter(transaction_status='Pending').order_by('-transaction_date')[:100], True),
+            (f"{name} staff dashboard", model.objects.order_by('-transaction_date', '-id')[:25], False),
+            (f"{name} staff backlog",
+             model.objects.filter(transaction_status='Pending').order_by('transaction_date', 'id')[:25], False),
+        ]
+    queries += [
+        ("BundleOrder user history",
+         models.BundleOrder.objects.filter(user_id=1).order_by('-transaction_date')[:100], True),
+        ("BundleOrder status queue",
+         models.BundleOrder.objects.filter(transaction_status='Pending').order_by('-transaction_date')[:100], True),
+        ("BundleOrder all networks", models.BundleOrder.objects.order_by('-transaction_date')[:100], True),
+        ("WalletTransactionn user history",
+         models.WalletTransactionn.objects.filter(user_id=1).order_by('-transaction_date')[:300], True),
+        ("TopUpRequest by reference", models.TopUpRequest.objects.filter(reference='REF'), False),
+        ("TopUpRequest user history", models.TopUpRequest.objects.filter(user_id=1).order_by('-date')[:100], True),
+        ("TopUpRequest pending queue", models.TopUpRequest.objects.filter(status=False).order_by('-date')[:100], True),
+        ("TopUpRequest list", models.TopUpRequest.objects.order_by('-date')[:100], True),
+        ("Payment by reference", models.Payment.objects.filter(reference='REF'), False),
+        ("BundleOrder unresolved backlog",
+         models.BundleOrder.objects.filter(transaction_status__in=['Pending', 'Processing'])
+         .values('network', 'transaction_status').annotate(Count('id'), Min('transaction_date')).order_by(), False),
+        ("DailySales report", models.DailySales.objects.filter(bucket__gte=timezone.localdate()), False),
+        ("HourlySales report", models.HourlySales.objects.filter(bucket__gte=timezone.now()), False),
+        ("BundlePrice versions in effect",
+         models.BundlePrice.objects.filter(effective_from__lte=timezone.now()).order_by(
+             'network', 'tier', 'volume_mb', '-effective_from'), True),
+        ("CustomUser autocomplete by phone",
+         models.CustomUser.objects.filter(phone__gte=240000000, phone__lt=250000000).values_list('id')[:21], False),
+    ]
+    if connection.vendor == 'postgresql':
+        # The UPPER(username) pattern index behind istartswith only exists on PostgreSQL (migration 0032).
+        queries.append(("CustomUser autocomplete by username",
+                        models.CustomUser.objects.filter(username__istartswith='kof').values_list('id')[:21], False))
+    return queries
+
+
+def plan_problems(plan, needs_index_order):
+    problems = []
+    if connection.vendor == 'postgresql':
+        if 'Seq Scan' in plan:
+            problems.append("sequential scan")
+        if needs_index_order and re.search(r'^\s*(->\s*)?Sort\b', plan, re.M):
+            problems.append("sorts in memory")
+    else:
+        if re.search(r'\bSCAN (TABLE )?\w+\s*$', plan, re.M):
+            problems.append("full table scan")
+        if needs_index_order and 'TEMP B-TREE' in plan:
+            problems.append("sorts in memory")
+    return problems
+
+
+class Command(BaseCommand):
+    help = "EXPLAIN the hot reference, history and queue queries and fail if any of them cannot use an index."
+
+    def handle(self, *args, **options):
+        failures = 0
+        for name, queryset, needs_index_order in hot_queries():
+            with transaction.atomic():
+                if connection.vendor == 'postgresql':
+                    # Small tables are cheaper to scan, so make the planner show whether an index applies.
+                    with connection.cursor() as cursor:
+                        cursor.execute("SET LOCAL enable_seqscan = off")
+                plan = queryset.explain()
+            problems = plan_problems(plan, needs_index_order)
+            if problems:
+                failures += 1
+                self.stdout.write(self.style.ERROR(f"FAIL {name}: {', '.join(problems)}"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"ok   {name}"))
+            if problems or options['verbosity'] >= 2:
+                self.stdout.write(plan)
+        if failures:
+            raise CommandError(f"{failures} queries cannot use an index")
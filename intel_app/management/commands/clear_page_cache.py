@@ -0,0 +1,18 @@
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand, CommandError
+
+from intel_app import page_cache
+
+
+class Command(BaseCommand):
+    help = ("Drop the cached public pages, e.g. after a deploy that changes their templates. Needs the shared "
+            "cache (REDIS_URL); with the per-process fallback cache pages only expire after PAGE_CACHE_TTL.")
+
+    def handle(self, *args, **options):
+        if isinstance(caches['default'], LocMemCache):
+            raise CommandError("The default cache is local to each process (REDIS_URL is not set), so this command "
+                               "cannot reach the web workers. Their cached pages expire after PAGE_CACHE_TTL "
+                               "seconds, or when the workers restart.")
+        page_cache.invalidate()
+        self.stdout.write(self.style.SUCCESS("Page cache cleared"))
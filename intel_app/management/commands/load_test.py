@@ -0,0 +1,185 @@
+import asyncio
+import json
+import os
+import subprocess
+import time
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.utils import timezone
+
+from intel_app import catalog, fulfillment, loadtest, models, site_config
+
+
+def provider_values(value):
+    """Parse "0.2" (every provider) or "bestpay=0.5,arkesel=0.1" into {provider: float}."""
+    if '=' not in value:
+        return {name: float(value) for name in loadtest.STUB_RESPONSES}
+    values = {}
+    for item in value.split(','):
+        name, _, number = item.partition('=')
+        if name not in loadtest.STUB_RESPONSES:
+            raise CommandError(f"Unknown provider {name!r}; expected one of {', '.join(loadtest.STUB_RESPONSES)}")
+        values[name] = float(number)
+    return values
+
+
+class Command(BaseCommand):
+    help = ("Load-test the checkout flow in a throwaway test database, against local stand-ins for bestpay, "
+            "Value4Moni, Paystack and Arkesel, and write a JSON report.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20, help="Virtual users running at the same time.")
+        parser.add_argument('--purchases', type=int, default=10, help="Purchases per user.")
+        parser.add_argument('--networks', default=','.join(loadtest.PURCHASES),
+                            help="Comma-separated networks the purchases cycle through.")
+        parser.add_argument('--wallet', type=float, default=40.0,
+                            help="Starting balance; below purchases x price some purchases are declined.")
+        parser.add_argument('--price', type=float, default=5.0, help="Price of the bundle every purchase buys.")
+        parser.add_argument('--latency', type=provider_values, default={},
+                            help='Stub latency in seconds, e.g. "0.2" or "bestpay=0.5,arkesel=0.05".')
+        parser.add_argument('--error-rate', type=provider_values, default={},
+                            help='Share of stub requests answered with a 503, e.g. "0.05" or "value4moni=0.5".')
+        parser.add_argument('--drain-timeout', type=float, default=60,
+                            help="Seconds to let the workers finish queued orders and SMS after the last request.")
+        parser.add_argument('--seed', type=int, default=0, help="Seed for the stubs' error draws.")
+        parser.add_argument('--output-dir', default='loadtest-reports')
+        parser.add_argument('--keepdb', action='store_true', help="Reuse the test database between runs.")
+
+    def handle(self, *args, **options):
+        networks = [network for network in options['networks'].split(',') if network]
+        unknown = set(networks) - set(loadtest.PURCHASES)
+        if unknown:
+            raise CommandError(f"Unknown networks: {', '.join(sorted(unknown))}")
+
+        # Everything runs in a fresh test database, so the run cannot touch real orders or wallets.
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=options['keepdb'])
+        try:
+            report = self.run(options, networks)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=options['keepdb'])
+
+        os.makedirs(options['output_dir'], exist_ok=True)
+        path = os.path.join(options['output_dir'], f"loadtest-{timezone.now():%Y%m%d-%H%M%S}.json")
+        with open(path, 'w') as output:
+            json.dump(report, output, indent=2)
+        self.print_report(report)
+        self.stdout.write(f"Report written to {path}")
+
+    def run(self, options, networks):
+        password = "loadtest-password"
+        user_ids = self.seed(options, networks, password)
+        stubs = {name: loadtest.ProviderStub(name, options['latency'].get(name, 0.05),
+                                             options['error_rate'].get(name, 0.0), seed=options['seed'])
+                 for name in loadtest.STUB_RESPONSES}
+        loadtest.use_stubs(stubs)
+        workers = loadtest.Workers()
+        server = loadtest.AppServer()
+        try:
+            samples = []
+            before = loadtest.query_totals()
+            users = list(models.CustomUser.objects.filter(id__in=user_ids).values_list('username', flat=True))
+
+            async def drive():
+                await asyncio.gather(*(
+                    loadtest.virtual_user(server.url, username, password, options['purchases'], networks,
+                                          options['price'], samples)
+                    for username in users
+                ))
+
+            start = time.perf_counter()
+            asyncio.run(drive())
+            elapsed = time.perf_counter() - start
+            queries = loadtest.queries_per_request(before, loadtest.query_totals())
+            drained = self.drain(options['drain_timeout'])
+        finally:
+            server.stop()
+            workers.stop()
+            for stub in stubs.values():
+                stub.stop()
+
+        return {
+            'started_at': timezone.now().isoformat(),
+            'commit': self.commit(),
+            'database': connection.vendor,
+            'parameters': {key: options[key] for key in ('users', 'purchases', 'wallet', 'price', 'seed')}
+            | {'networks': networks},
+            'elapsed_seconds': round(elapsed, 3),
+            'operations': loadtest.summarize(samples, elapsed),
+            'db_queries_per_request': queries,
+            'wallet_violations': loadtest.wallet_violations(user_ids, options['wallet']),
+            'drained': drained,
+            'worker_errors': {'count': workers.errors, 'last': workers.last_error},
+            'orders': list(models.BundleOrder.objects.values('network', 'transaction_status')
+                           .annotate(count=Count('id')).order_by('network', 'transaction_status')),
+            'stubs': {name: stub.stats() for name, stub in stubs.items()},
+        }
+
+    def seed(self, options, networks, password):
+        models.AdminInfo.objects.all().delete()
+        models.AdminInfo.objects.create(name="Load test", phone_number=240000000, payment_channel="MTN Mobile Money",
+                                        ishare_source="Value4Moni")
+        models.BundlePrice.objects.filter(tier="User").delete()
+        models.BundlePrice.objects.bulk_create([
+            models.BundlePrice(network=network, tier="User", volume_mb=1000, price=options['price'],
+                               purchase_price=options['price'] * 0.9)
+            for network in networks
+        ])
+        site_config.invalidate()
+        catalog.invalidate()
+
+        models.CustomUser.objects.filter(username__startswith="loadtest-").delete()
+        hashed = make_password(password)
+        models.CustomUser.objects.bulk_create([
+            models.CustomUser(username=f"loadtest-{index}", password=hashed, first_name="Load", last_name="Test",
+                              email=f"loadtest-{index}@example.com", phone=240000000 + index, wallet=options['wallet'])
+            for index in range(options['users'])
+        ])
+        return list(models.CustomUser.objects.filter(username__startswith="loadtest-").values_list('id', flat=True))
+
+    def drain(self, timeout):
+        """Wait for the workers to settle every order they can and send every due SMS."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            busy = (
+                fulfillment.queued_orders().exists()
+                or models.IShareBundleTransaction.objects.filter(transaction_status="Processing",
+                                                                 claimed_at__isnull=False).exists()
+                or models.SMSOutbox.objects.filter(status="Pending", next_attempt_at__lte=timezone.now()).exists()
+            )
+            if not busy:
+                return True
+            time.sleep(0.5)
+        return False
+
+    @staticmethod
+    def commit():
+        try:
+            return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                  cwd=settings.BASE_DIR, timeout=5).stdout.strip() or None
+        except OSError:
+            return None
+
+    def print_report(self, report):
+        self.stdout.write(f"{report['parameters']['users']} users x {report['parameters']['purchases']} purchases "
+                          f"in {report['elapsed_seconds']}s on {report['database']}")
+        self.stdout.write(f"{'operation':<20}{'requests':>9}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+                          f"  outcomes")
+        for operation, stats in report['operations'].items():
+            self.stdout.write(f"{operation:<20}{stats['requests']:>9}{stats['throughput_per_second']:>9}"
+                              f"{stats['p50_ms']:>9}{stats['p95_ms']:>9}{stats['p99_ms']:>9}  "
+                              f"{json.dumps(stats['outcomes'])}")
+        self.stdout.write("DB queries per request: " + json.dumps(report['db_queries_per_request']))
+        if report['worker_errors']['count']:
+            self.stdout.write(self.style.WARNING(f"Worker steps that raised a database error: "
+                                                 f"{report['worker_errors']['count']} "
+                                                 f"(last: {report['worker_errors']['last']})"))
+        if not report['drained']:
+            self.stdout.write(self.style.WARNING("Workers did not finish the queue before --drain-timeout"))
+        violations = report['wallet_violations']
+        style = self.style.ERROR if violations else self.style.SUCCESS
+        self.stdout.write(style(f"Wallet consistency violations: {len(violations)}"))
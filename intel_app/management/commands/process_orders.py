@@ -0,0 +1,39 @@
+import json
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from intel_app import fulfillment, upstream
+
+
+class Command(BaseCommand):
+    help = "Claim queued AirtelTigo orders and dispatch them to the configured iShare provider."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.FULFILLMENT_BATCH_SIZE)
+        parser.add_argument('--interval', type=float, default=settings.FULFILLMENT_POLL_INTERVAL,
+                            help="Seconds to sleep when the queue is empty.")
+        parser.add_argument('--once', action='store_true', help="Drain the queue once and exit.")
+        parser.add_argument('--stats', action='store_true', help="Print queue depth and latency stats and exit.")
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            self.stdout.write(json.dumps(fulfillment.queue_stats(), indent=2))
+            return
+
+        while True:
+            orders = fulfillment.claim_orders(options['batch_size'])
+            if orders:
+                results = fulfillment.dispatch_orders(orders)
+                self.stdout.write(
+                    f"Dispatched {len(orders)} orders: {results.count(True)} completed, "
+                    f"{results.count(fulfillment.RETRY)} to retry, {results.count(False)} refunded, "
+                    f"{results.count(None)} unresolved"
+                )
+                if options['verbosity'] >= 2:
+                    self.stdout.write(json.dumps(upstream.snapshot()))
+                continue
+            if options['once']:
+                return
+            time.sleep(options['interval'])
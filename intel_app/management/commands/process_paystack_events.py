@@ -0,0 +1,26 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from intel_app import payments
+
+
+class Command(BaseCommand):
+    help = "Apply stored Paystack webhook events in batches, crediting wallet top-ups."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.PAYSTACK_EVENT_BATCH_SIZE)
+        parser.add_argument('--interval', type=float, default=settings.PAYSTACK_EVENT_POLL_INTERVAL,
+                            help="Seconds to sleep when the inbox is empty.")
+        parser.add_argument('--once', action='store_true', help="Drain the inbox once and exit.")
+
+    def handle(self, *args, **options):
+        while True:
+            handled, credited, failed = payments.process_batch(options['batch_size'])
+            if handled:
+                self.stdout.write(f"Handled {handled} events: {credited} top-ups credited, {failed} failed")
+                continue
+            if options['once']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,38 @@
+import json
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from intel_app import reconciliation
+
+
+class Command(BaseCommand):
+    help = ("Check iShare orders stuck in Processing against their provider's transaction status, "
+            "completing, refunding or requeueing the ones with a final answer. Refuses to run until "
+            "RECONCILE_ENABLED is set: confirm the BestPay and Value4Moni status endpoints in helper.py with the "
+            "providers first.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.RECONCILE_BATCH_SIZE)
+        parser.add_argument('--interval', type=float, default=settings.RECONCILE_INTERVAL,
+                            help="Seconds to sleep between passes.")
+        parser.add_argument('--once', action='store_true', help="Make one pass and exit.")
+        parser.add_argument('--stats', action='store_true', help="Print the unresolved order backlog and exit.")
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            self.stdout.write(json.dumps(reconciliation.backlog(), indent=2))
+            return
+        if not settings.RECONCILE_ENABLED:
+            raise CommandError("RECONCILE_ENABLED is not set. The provider status endpoints are unconfirmed and "
+                               "a wrong answer would refund or requeue orders; see helper.py.")
+
+        while True:
+            answers, changed = reconciliation.reconcile(options['batch_size'])
+            if answers:
+                self.stdout.write(f"Checked {sum(answers.values())} orders: {json.dumps(answers)}; "
+                                  f"changed {json.dumps(changed)}")
+            if options['once']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,32 @@
+import json
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from intel_app import notifier, upstream
+
+
+class Command(BaseCommand):
+    help = "Drain the SMS outbox in batches, retrying failed messages with backoff."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.SMS_BATCH_SIZE)
+        parser.add_argument('--rate', type=int, default=settings.SMS_RATE_LIMIT, help="Maximum messages per second.")
+        parser.add_argument('--interval', type=float, default=settings.SMS_POLL_INTERVAL,
+                            help="Seconds to sleep when the outbox is empty.")
+        parser.add_argument('--once', action='store_true', help="Drain the outbox once and exit.")
+
+    def handle(self, *args, **options):
+        limiter = notifier.RateLimiter(options['rate'])
+        while True:
+            batch = notifier.claim_batch(options['batch_size'])
+            if batch:
+                sent, failed = notifier.send_batch(batch, limiter)
+                self.stdout.write(f"Sent {sent} messages, {failed} failed")
+                if options['verbosity'] >= 2:
+                    self.stdout.write(json.dumps(upstream.snapshot()))
+                continue
+            if options['once']:
+                return
+            time.sleep(options['interval'])
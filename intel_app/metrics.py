@@ -0,0 +1,169 @@
+import bisect
+import json
+import os
+import threading
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+class Histogram:
+    def __init__(self, name, help_text, label_names, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        # labels -> [count per bucket..., count, sum]; bucket counts are not cumulative until exported.
+        self.series = {}
+
+    def observe(self, labels, value):
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+
+class Registry:
+    """Per-process histograms. Observing takes one lock and a few list updates, so it is cheap enough to leave on."""
+
+    def __init__(self, histograms):
+        self.histograms = {histogram.name: histogram for histogram in histograms}
+        self._lock = threading.Lock()
+        self._flushed_at = 0.0
+
+    def observe(self, name, labels, value):
+        with self._lock:
+            self.histograms[name].observe(labels, value)
+
+    def dump(self):
+        with self._lock:
+            return {name: [[list(labels), list(series)] for labels, series in histogram.series.items()]
+                    for name, histogram in self.histograms.items()}
+
+    def flush(self, force=False):
+        """Write this process's totals to METRICS_DIR so any worker can serve the sum over all of them."""
+        directory = settings.METRICS_DIR
+        now = time.monotonic()
+        if not directory or (not force and now - self._flushed_at < settings.METRICS_FLUSH_INTERVAL):
+            return
+        self._flushed_at = now
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{os.getpid()}.json")
+        temporary = f"{path}.{threading.get_ident()}.tmp"
+        with open(temporary, "w") as output:
+            json.dump(self.dump(), output)
+        os.replace(temporary, path)
+
+    def collect(self):
+        """Sum the series of every process that has flushed (or just this one without METRICS_DIR)."""
+        directory = settings.METRICS_DIR
+        if not directory:
+            dumps = [self.dump()]
+        else:
+            self.flush(force=True)
+            dumps = []
+            for filename in os.listdir(directory):
+                if filename.endswith('.json'):
+                    try:
+                        with open(os.path.join(directory, filename)) as source:
+                            dumps.append(json.load(source))
+                    except (OSError, ValueError):
+                        continue
+        totals = {name: {} for name in self.histograms}
+        for dump in dumps:
+            for name, series_list in dump.items():
+                if name not in totals:
+                    continue
+                for labels, series in series_list:
+                    current = totals[name].setdefault(tuple(labels), [0] * len(series))
+                    for index, value in enumerate(series):
+                        current[index] += value
+        return totals
+
+    def render(self):
+        lines = []
+        for name, series_by_labels in self.collect().items():
+            histogram = self.histograms[name]
+            lines.append(f"# HELP {name} {histogram.help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for labels, series in sorted(series_by_labels.items()):
+                label_text = ','.join(f'{key}="{_escape(value)}"' for key, value in zip(histogram.label_names, labels))
+                prefix = f"{label_text}," if label_text else ""
+                cumulative = 0
+                for bound, count in zip(histogram.buckets + ('+Inf',), series[:-1]):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+                suffix = f"{{{label_text}}}" if label_text else ""
+                lines.append(f"{name}_count{suffix} {cumulative}")
+                lines.append(f"{name}_sum{suffix} {series[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+def render_gauges(name, help_text, label_names, samples):
+    """Prometheus text for a gauge computed at scrape time; samples are (labels, value) pairs."""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+    for labels, value in samples:
+        label_text = ','.join(f'{key}="{_escape(label)}"' for key, label in zip(label_names, labels))
+        lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = Registry([
+    Histogram('http_request_duration_seconds', "Wall time per request.", ('view', 'method', 'status'), DURATION_BUCKETS),
+    Histogram('http_request_db_queries', "Database queries per request.", ('view',), QUERY_BUCKETS),
+    Histogram('http_request_db_seconds', "Time spent in database queries per request.", ('view',), DURATION_BUCKETS),
+    Histogram('http_request_upstream_seconds', "Time spent calling an upstream provider per request.",
+              ('view', 'provider'), DURATION_BUCKETS),
+    Histogram('http_response_size_bytes', "Response body size; streamed responses are not counted.", ('view',),
+              SIZE_BUCKETS),
+    Histogram('upstream_request_seconds', "Latency of each upstream provider call, in requests and workers alike.",
+              ('provider',), DURATION_BUCKETS),
+])
+
+
+class RequestStats:
+    __slots__ = ('db_queries', 'db_seconds', 'upstream_seconds')
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self.upstream_seconds = {}
+
+
+_current = ContextVar('request_stats', default=None)
+
+
+def start_request():
+    stats = RequestStats()
+    return stats, _current.set(stats)
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+def record_query(elapsed):
+    stats = _current.get()
+    if stats is not None:
+        stats.db_queries += 1
+        stats.db_seconds += elapsed
+
+
+def record_upstream(provider, elapsed):
+    registry.observe('upstream_request_seconds', (provider,), elapsed)
+    stats = _current.get()
+    if stats is not None:
+        stats.upstream_seconds[provider] = stats.upstream_seconds.get(provider, 0.0) + elapsed
+    else:
+        # Outside a request (the fulfillment and SMS workers) nothing else would flush.
+        registry.flush()
@@ -0,0 +1,90 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from . import metrics
+
+
+def time_query(execute, sql, params, many, context):
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.record_query(time.perf_counter() - start)
+
+
+class RequestMetricsMiddleware:
+    """Record wall time, database and upstream time and response size per URL name (see intel_app/metrics.py)."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats, token = metrics.start_request()
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        self.observe(request, response, stats, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        stats, token = metrics.start_request()
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        self.observe(request, response, stats, time.perf_counter() - start)
+        return response
+
+    @staticmethod
+    def observe(request, response, stats, elapsed):
+        # The URL name keeps the label set small; raw paths would create a series per order id.
+        view = request.resolver_match.view_name if request.resolver_match else "unresolved"
+        registry = metrics.registry
+        registry.observe('http_request_duration_seconds',
+                         (view, request.method, f"{response.status_code // 100}xx"), elapsed)
+        registry.observe('http_request_db_queries', (view,), stats.db_queries)
+        registry.observe('http_request_db_seconds', (view,), stats.db_seconds)
+        for provider, seconds in stats.upstream_seconds.items():
+            registry.observe('http_request_upstream_seconds', (view, provider), seconds)
+        if not response.streaming:
+            registry.observe('http_response_size_bytes', (view,), len(response.content))
+        registry.flush()
+
+
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoise's middleware is sync only, and one sync middleware makes Django run the rest of the stack,
+    async views included, in a thread per request. This one serves static files the same way in either mode.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve)(static_file, request)
+        return await self.get_response(request)
@@ -11,7 +11,9 @@ class Migration(migrations.Migration):
         ('intel_app', '0010_admininfo'),
     ]
 
-    operations = [
+    # 0001_initial already creates TopUpRequest; databases that ran 0011 before that was folded in keep their
+    # history, while new ones only record the state change.
+    operations = [migrations.SeparateDatabaseAndState(state_operations=[
         migrations.CreateModel(
             name='TopUpRequest',
             fields=[
@@ -27,4 +29,4 @@ class Migration(migrations.Migration):
             name='payment_channel',
             field=models.CharField(blank=True, max_length=100, null=True),
         ),
-    ]
+    ])]
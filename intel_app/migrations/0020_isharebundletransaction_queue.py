@@ -0,0 +1,33 @@
+# Generated by Django 4.2.4 on 2026-10-18 00:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('intel_app', '0019_remove_topuprequest_payment_channel'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='isharebundletransaction',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='isharebundletransaction',
+            name='completed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='isharebundletransaction',
+            name='provider',
+            field=models.CharField(blank=True, max_length=250, null=True),
+        ),
+        migrations.AddField(
+            model_name='isharebundletransaction',
+            name='queued_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,93 @@
+# Generated by Django 4.2.4 on 2026-10-18 00:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('intel_app', '0021_smsoutbox'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='afaregistration',
+            index=models.Index(fields=['user', '-transaction_date'], name='intel_app_a_user_id_b38b56_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='afaregistration',
+            index=models.Index(fields=['transaction_status', '-transaction_date'], name='intel_app_a_transac_a90532_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='afaregistration',
+            index=models.Index(fields=['reference'], name='intel_app_a_referen_c4e4cf_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bigtimetransaction',
+            index=models.Index(fields=['user', '-transaction_date'], name='intel_app_b_user_id_d7d079_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bigtimetransaction',
+            index=models.Index(fields=['transaction_status', '-transaction_date'], name='intel_app_b_transac_0acad4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bigtimetransaction',
+            index=models.Index(fields=['reference'], name='intel_app_b_referen_4b9820_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='isharebundletransaction',
+            index=models.Index(fields=['user', '-transaction_date'], name='intel_app_i_user_id_b38018_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='isharebundletransaction',
+            index=models.Index(fields=['transaction_status', '-transaction_date'], name='intel_app_i_transac_b18f64_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='isharebundletransaction',
+            index=models.Index(fields=['reference'], name='intel_app_i_referen_d84a30_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mtntransaction',
+            index=models.Index(fields=['user', '-transaction_date'], name='intel_app_m_user_id_d904ab_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mtntransaction',
+            index=models.Index(fields=['transaction_status', '-transaction_date'], name='intel_app_m_transac_e8748c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mtntransaction',
+            index=models.Index(fields=['reference'], name='intel_app_m_referen_ff3527_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='payment',
+            index=models.Index(fields=['reference'], name='intel_app_p_referen_6a8b03_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='topuprequest',
+            index=models.Index(fields=['user', '-date'], name='intel_app_t_user_id_fde14a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='topuprequest',
+            index=models.Index(fields=['status', '-date'], name='intel_app_t_status_e0eacf_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='topuprequest',
+            index=models.Index(fields=['-date'], name='intel_app_t_date_ee159d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vodafonetransaction',
+            index=models.Index(fields=['user', '-transaction_date'], name='intel_app_v_user_id_c544a1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vodafonetransaction',
+            index=models.Index(fields=['transaction_status', '-transaction_date'], name='intel_app_v_transac_36395e_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vodafonetransaction',
+            index=models.Index(fields=['reference'], name='intel_app_v_referen_068cab_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='wallettransactionn',
+            index=models.Index(fields=['user', '-transaction_date'], name='intel_app_w_user_id_9cea95_idx'),
+        ),
+    ]
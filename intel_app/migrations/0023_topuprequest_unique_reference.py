@@ -0,0 +1,33 @@
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def rename_duplicate_references(apps, schema_editor):
+    # Older top-up references repeated every day, so keep the first request for each reference
+    # and suffix the later ones with their id before the unique constraint is added.
+    TopUpRequest = apps.get_model('intel_app', 'TopUpRequest')
+    duplicates = list(
+        TopUpRequest.objects.values('reference')
+        .annotate(total=Count('id'))
+        .filter(total__gt=1)
+        .values_list('reference', flat=True)
+    )
+    for reference in duplicates:
+        for topup in TopUpRequest.objects.filter(reference=reference).order_by('id')[1:]:
+            topup.reference = f"{reference}-{topup.id}"
+            topup.save(update_fields=['reference'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('intel_app', '0022_transaction_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(rename_duplicate_references, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='topuprequest',
+            constraint=models.UniqueConstraint(fields=('reference',), name='unique_topup_reference'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.4 on 2026-10-18 00:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('intel_app', '0023_topuprequest_unique_reference'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='afaregistration',
+            index=models.Index(fields=['-transaction_date'], name='intel_app_a_transac_2a167b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bigtimetransaction',
+            index=models.Index(fields=['-transaction_date'], name='intel_app_b_transac_1c2349_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='isharebundletransaction',
+            index=models.Index(fields=['-transaction_date'], name='intel_app_i_transac_5a97f4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='mtntransaction',
+            index=models.Index(fields=['-transaction_date'], name='intel_app_m_transac_4062e4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='vodafonetransaction',
+            index=models.Index(fields=['-transaction_date'], name='intel_app_v_transac_787579_idx'),
+        ),
+    ]
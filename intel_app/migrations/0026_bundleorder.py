@@ -0,0 +1,99 @@
+# Generated by Django 4.2.4 on 2026-10-18 00:58
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+LEGACY_TABLES = [
+    ('ishare', 'intel_app_isharebundletransaction', True),
+    ('mtn', 'intel_app_mtntransaction', False),
+    ('bigtime', 'intel_app_bigtimetransaction', False),
+    ('voda', 'intel_app_vodafonetransaction', False),
+]
+COLUMNS = ['user_id', 'bundle_number', 'offer', 'amount', 'reference', 'transaction_date', 'transaction_status',
+           'description']
+FULFILLMENT_COLUMNS = ['provider', 'queued_at', 'claimed_at', 'completed_at']
+
+
+def _columns(has_fulfillment):
+    return COLUMNS + FULFILLMENT_COLUMNS if has_fulfillment else COLUMNS
+
+
+def copy_orders(apps, schema_editor):
+    # One INSERT ... SELECT per network keeps the copy inside the database and preserves the order dates,
+    # which a model save would overwrite through auto_now_add. Rows get new ids in the shared sequence.
+    for network, table, has_fulfillment in LEGACY_TABLES:
+        columns = ', '.join(_columns(has_fulfillment))
+        schema_editor.execute(
+            f"INSERT INTO intel_app_bundleorder (network, {columns}) "
+            f"SELECT %s, {columns} FROM {table} ORDER BY id",
+            [network],
+        )
+
+
+def restore_orders(apps, schema_editor):
+    for network, table, has_fulfillment in LEGACY_TABLES:
+        columns = ', '.join(_columns(has_fulfillment))
+        schema_editor.execute(
+            f"INSERT INTO {table} ({columns}) "
+            f"SELECT {columns} FROM intel_app_bundleorder WHERE network = %s ORDER BY id",
+            [network],
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('intel_app', '0025_paystackevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BundleOrder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('network', models.CharField(choices=[('ishare', 'AirtelTigo iShare'), ('mtn', 'MTN'), ('bigtime', 'AirtelTigo BigTime'), ('voda', 'Vodafone')], max_length=20)),
+                ('bundle_number', models.BigIntegerField()),
+                ('offer', models.CharField(max_length=250)),
+                ('amount', models.FloatField(default=0.0)),
+                ('reference', models.CharField(blank=True, max_length=20)),
+                ('transaction_date', models.DateTimeField(auto_now_add=True)),
+                ('transaction_status', models.CharField(choices=[('Pending', 'Pending'), ('Processing', 'Processing'), ('Completed', 'Completed'), ('Failed', 'Failed'), ('Canceled and Refunded', 'Canceled and Refunded')], default='Pending', max_length=100)),
+                ('description', models.CharField(blank=True, max_length=500, null=True)),
+                ('provider', models.CharField(blank=True, max_length=250, null=True)),
+                ('queued_at', models.DateTimeField(blank=True, null=True)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.RunPython(copy_orders, restore_orders),
+        migrations.AddIndex(
+            model_name='bundleorder',
+            index=models.Index(fields=['user', '-transaction_date'], name='intel_app_b_user_id_bf820d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bundleorder',
+            index=models.Index(fields=['network', 'user', '-transaction_date'], name='intel_app_b_network_0a1cfc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bundleorder',
+            index=models.Index(fields=['transaction_status', '-transaction_date'], name='intel_app_b_transac_48bcc7_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bundleorder',
+            index=models.Index(fields=['network', 'transaction_status', '-transaction_date'], name='intel_app_b_network_ade85c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bundleorder',
+            index=models.Index(fields=['network', '-transaction_date'], name='intel_app_b_network_6e15d8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bundleorder',
+            index=models.Index(fields=['-transaction_date'], name='intel_app_b_transac_abd60d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='bundleorder',
+            index=models.Index(fields=['reference'], name='intel_app_b_referen_c0bb3c_idx'),
+        ),
+    ]
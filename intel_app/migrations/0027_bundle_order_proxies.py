@@ -0,0 +1,69 @@
+# Generated by Django 4.2.4 on 2026-10-18 00:58
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('intel_app', '0026_bundleorder'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='BigTimeTransaction',
+        ),
+        migrations.DeleteModel(
+            name='IShareBundleTransaction',
+        ),
+        migrations.DeleteModel(
+            name='MTNTransaction',
+        ),
+        migrations.DeleteModel(
+            name='VodafoneTransaction',
+        ),
+        migrations.CreateModel(
+            name='BigTimeTransaction',
+            fields=[
+            ],
+            options={
+                'proxy': True,
+                'indexes': [],
+                'constraints': [],
+            },
+            bases=('intel_app.bundleorder',),
+        ),
+        migrations.CreateModel(
+            name='IShareBundleTransaction',
+            fields=[
+            ],
+            options={
+                'proxy': True,
+                'indexes': [],
+                'constraints': [],
+            },
+            bases=('intel_app.bundleorder',),
+        ),
+        migrations.CreateModel(
+            name='MTNTransaction',
+            fields=[
+            ],
+            options={
+                'proxy': True,
+                'indexes': [],
+                'constraints': [],
+            },
+            bases=('intel_app.bundleorder',),
+        ),
+        migrations.CreateModel(
+            name='VodafoneTransaction',
+            fields=[
+            ],
+            options={
+                'proxy': True,
+                'indexes': [],
+                'constraints': [],
+            },
+            bases=('intel_app.bundleorder',),
+        ),
+    ]
@@ -0,0 +1,126 @@
+# Generated by Django 4.2.4 on 2026-10-18 01:02
+
+from datetime import timedelta
+
+from django.db import migrations, models
+import django.utils.timezone
+
+PRICE_MODELS = [
+    ('ishare', 'User', 'IshareBundlePrice'),
+    ('ishare', 'Agent', 'AgentIshareBundlePrice'),
+    ('ishare', 'Super Agent', 'SuperAgentIshareBundlePrice'),
+    ('mtn', 'User', 'MTNBundlePrice'),
+    ('mtn', 'Agent', 'AgentMTNBundlePrice'),
+    ('mtn', 'Super Agent', 'SuperAgentMTNBundlePrice'),
+    ('bigtime', 'User', 'BigTimeBundlePrice'),
+    ('bigtime', 'Agent', 'AgentBigTimeBundlePrice'),
+    ('bigtime', 'Super Agent', 'SuperAgentBigTimeBundlePrice'),
+    ('voda', 'User', 'VodaBundlePrice'),
+    ('voda', 'Agent', 'AgentVodaBundlePrice'),
+    ('voda', 'Super Agent', 'SuperAgentVodaBundlePrice'),
+]
+
+
+def copy_prices(apps, schema_editor):
+    BundlePrice = apps.get_model('intel_app', 'BundlePrice')
+    start = django.utils.timezone.now()
+    prices = []
+    for network, tier, model_name in PRICE_MODELS:
+        model = apps.get_model('intel_app', model_name)
+        for row in model.objects.order_by('id'):
+            # Each row gets its own instant so duplicate volumes in one table resolve to the newest row.
+            prices.append(BundlePrice(
+                network=network,
+                tier=tier,
+                volume_mb=row.bundle_volume,
+                price=row.price,
+                purchase_price=getattr(row, 'purchase_price', None),
+                effective_from=start + timedelta(microseconds=len(prices)),
+            ))
+    BundlePrice.objects.bulk_create(prices)
+
+
+def restore_prices(apps, schema_editor):
+    BundlePrice = apps.get_model('intel_app', 'BundlePrice')
+    now = django.utils.timezone.now()
+    for network, tier, model_name in PRICE_MODELS:
+        model = apps.get_model('intel_app', model_name)
+        current = {}
+        for price in BundlePrice.objects.filter(network=network, tier=tier, effective_from__lte=now).order_by(
+                'volume_mb', '-effective_from'):
+            current.setdefault(price.volume_mb, price)
+        for price in current.values():
+            if not price.active:
+                continue
+            row = model(price=price.price, bundle_volume=price.volume_mb)
+            if hasattr(row, 'purchase_price'):
+                row.purchase_price = price.purchase_price
+            row.save()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('intel_app', '0027_bundle_order_proxies'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BundlePrice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('network', models.CharField(choices=[('ishare', 'AirtelTigo iShare'), ('mtn', 'MTN'), ('bigtime', 'AirtelTigo BigTime'), ('voda', 'Vodafone')], max_length=20)),
+                ('tier', models.CharField(choices=[('User', 'User'), ('Agent', 'Agent'), ('Super Agent', 'Super Agent')], default='User', max_length=20)),
+                ('volume_mb', models.FloatField()),
+                ('price', models.FloatField()),
+                ('purchase_price', models.FloatField(blank=True, null=True)),
+                ('effective_from', models.DateTimeField(default=django.utils.timezone.now)),
+                ('active', models.BooleanField(default=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='bundleprice',
+            index=models.Index(fields=['network', 'tier', 'volume_mb', '-effective_from'], name='intel_app_b_network_f527b6_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='bundleprice',
+            constraint=models.UniqueConstraint(fields=('network', 'tier', 'volume_mb', 'effective_from'), name='unique_bundle_price_version'),
+        ),
+        migrations.RunPython(copy_prices, restore_prices),
+        migrations.DeleteModel(
+            name='AgentBigTimeBundlePrice',
+        ),
+        migrations.DeleteModel(
+            name='AgentIshareBundlePrice',
+        ),
+        migrations.DeleteModel(
+            name='AgentMTNBundlePrice',
+        ),
+        migrations.DeleteModel(
+            name='AgentVodaBundlePrice',
+        ),
+        migrations.DeleteModel(
+            name='BigTimeBundlePrice',
+        ),
+        migrations.DeleteModel(
+            name='IshareBundlePrice',
+        ),
+        migrations.DeleteModel(
+            name='MTNBundlePrice',
+        ),
+        migrations.DeleteModel(
+            name='SuperAgentBigTimeBundlePrice',
+        ),
+        migrations.DeleteModel(
+            name='SuperAgentIshareBundlePrice',
+        ),
+        migrations.DeleteModel(
+            name='SuperAgentMTNBundlePrice',
+        ),
+        migrations.DeleteModel(
+            name='SuperAgentVodaBundlePrice',
+        ),
+        migrations.DeleteModel(
+            name='VodaBundlePrice',
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 4.2.4 on 2026-10-18 01:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('intel_app', '0028_bundleprice'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('network', models.CharField(choices=[('ishare', 'AirtelTigo iShare'), ('mtn', 'MTN'), ('bigtime', 'AirtelTigo BigTime'), ('voda', 'Vodafone')], max_length=20)),
+                ('tier', models.CharField(blank=True, max_length=20)),
+                ('status', models.CharField(max_length=100)),
+                ('orders', models.IntegerField(default=0)),
+                ('volume_mb', models.FloatField(default=0.0)),
+                ('revenue', models.FloatField(default=0.0)),
+                ('cost', models.FloatField(default=0.0)),
+                ('costed_orders', models.IntegerField(default=0)),
+                ('bucket', models.DateField()),
+            ],
+            options={
+                'verbose_name_plural': 'daily sales',
+            },
+        ),
+        migrations.CreateModel(
+            name='HourlySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('network', models.CharField(choices=[('ishare', 'AirtelTigo iShare'), ('mtn', 'MTN'), ('bigtime', 'AirtelTigo BigTime'), ('voda', 'Vodafone')], max_length=20)),
+                ('tier', models.CharField(blank=True, max_length=20)),
+                ('status', models.CharField(max_length=100)),
+                ('orders', models.IntegerField(default=0)),
+                ('volume_mb', models.FloatField(default=0.0)),
+                ('revenue', models.FloatField(default=0.0)),
+                ('cost', models.FloatField(default=0.0)),
+                ('costed_orders', models.IntegerField(default=0)),
+                ('bucket', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name_plural': 'hourly sales',
+            },
+        ),
+        migrations.AddField(
+            model_name='bundleorder',
+            name='cost',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='bundleorder',
+            name='tier',
+            field=models.CharField(blank=True, max_length=20, null=True),
+        ),
+        migrations.AddField(
+            model_name='bundleorder',
+            name='volume_mb',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='hourlysales',
+            constraint=models.UniqueConstraint(fields=('bucket', 'network', 'tier', 'status'), name='unique_hourly_sales'),
+        ),
+        migrations.AddConstraint(
+            model_name='dailysales',
+            constraint=models.UniqueConstraint(fields=('bucket', 'network', 'tier', 'status'), name='unique_daily_sales'),
+        ),
+    ]
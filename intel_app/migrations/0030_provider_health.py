@@ -0,0 +1,51 @@
+# Generated by Django 4.2.4 on 2026-10-18 01:11
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('intel_app', '0029_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProviderHealth',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('provider', models.CharField(choices=[('Gyasi', 'Gyasi'), ('Value4Moni', 'Value4Moni')], max_length=250, unique=True)),
+                ('state', models.CharField(choices=[('Closed', 'Closed'), ('Open', 'Open'), ('Half-open', 'Half-open')], default='Closed', max_length=20)),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('reason', models.CharField(blank=True, max_length=500, null=True)),
+                ('calls', models.PositiveIntegerField(default=0)),
+                ('error_rate', models.FloatField(default=0)),
+                ('slow_rate', models.FloatField(default=0)),
+                ('avg_latency', models.FloatField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name_plural': 'provider health',
+            },
+        ),
+        migrations.AddField(
+            model_name='admininfo',
+            name='ishare_failover',
+            field=models.BooleanField(default=True, help_text="Send iShare orders to the other provider while the preferred provider's circuit breaker is open. Untick to always use the iShare source above."),
+        ),
+        migrations.CreateModel(
+            name='ProviderStateChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('provider', models.CharField(choices=[('Gyasi', 'Gyasi'), ('Value4Moni', 'Value4Moni')], max_length=250)),
+                ('from_state', models.CharField(choices=[('Closed', 'Closed'), ('Open', 'Open'), ('Half-open', 'Half-open')], max_length=20)),
+                ('to_state', models.CharField(choices=[('Closed', 'Closed'), ('Open', 'Open'), ('Half-open', 'Half-open')], max_length=20)),
+                ('reason', models.CharField(blank=True, max_length=500, null=True)),
+                ('changed_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['provider', '-changed_at'], name='intel_app_p_provide_3cd308_idx')],
+            },
+        ),
+    ]
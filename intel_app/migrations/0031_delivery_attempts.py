@@ -0,0 +1,44 @@
+# Generated by Django 4.2.4 on 2026-10-18 01:14
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('intel_app', '0030_provider_health'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bundleorder',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='bundleorder',
+            name='next_attempt_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='DeliveryAttempt',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField()),
+                ('provider', models.CharField(max_length=250)),
+                ('outcome', models.CharField(choices=[('Delivered', 'Delivered'), ('Rejected', 'Rejected'), ('Error', 'Error'), ('Unknown', 'Unknown')], max_length=20)),
+                ('status_code', models.PositiveIntegerField(blank=True, null=True)),
+                ('response', models.JSONField(blank=True, null=True)),
+                ('error', models.CharField(blank=True, max_length=500, null=True)),
+                ('started_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('duration', models.FloatField(default=0)),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='delivery_attempts', to='intel_app.bundleorder')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='deliveryattempt',
+            constraint=models.UniqueConstraint(fields=('order', 'number'), name='unique_delivery_attempt'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.4 on 2026-10-18 01:41
+
+from django.db import migrations, models
+
+
+USERNAME_PREFIX_INDEX = "intel_app_customuser_username_upper_like"
+
+
+def create_username_prefix_index(apps, schema_editor):
+    # Serves username__istartswith, which PostgreSQL runs as UPPER(username::text) LIKE 'PREFIX%'. The
+    # unique index on username uses the database collation and cannot answer LIKE outside the C locale.
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {USERNAME_PREFIX_INDEX} '
+            f'ON intel_app_customuser (UPPER(username::text) text_pattern_ops)'
+        )
+
+
+def drop_username_prefix_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX IF EXISTS {USERNAME_PREFIX_INDEX}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('intel_app', '0031_delivery_attempts'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['phone'], name='intel_app_c_phone_7db78d_idx'),
+        ),
+        migrations.RunPython(create_username_prefix_index, drop_username_prefix_index),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.4 on 2026-10-18 02:09
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('intel_app', '0032_user_autocomplete_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='paystackevent',
+            name='next_attempt_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
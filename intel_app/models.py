@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import models, transaction
+from django.utils import timezone
 from django.contrib.auth.models import AbstractUser
 
 
@@ -22,6 +23,12 @@ class CustomUser(AbstractUser):
     password1 = models.CharField(max_length=100, null=False, blank=False)
     password2 = models.CharField(max_length=100, null=False, blank=False)
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # Phone prefixes are searched as a range of numbers (see views.user_autocomplete).
+            models.Index(fields=['phone']),
+        ]
+
     def __str__(self):
         return self.username
 
@@ -45,101 +52,193 @@ class AdminInfo(models.Model):
     )
     ishare_source = models.CharField(max_length=250, null=True, blank=True, choices=ishare_choices,
                                      default="Value4Moni")
+    ishare_failover = models.BooleanField(
+        default=True,
+        help_text="Send iShare orders to the other provider while the preferred provider's circuit breaker is open. "
+                  "Untick to always use the iShare source above.",
+    )
     paystack_active = models.BooleanField(default=False)
 
 
-class IShareBundleTransaction(models.Model):
+class BundleOrderQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        from . import reporting
+
+        if not reporting.ROLLUP_FIELDS.intersection(kwargs):
+            return super().update(**kwargs)
+        # Status and amount changes move orders between sales rollup buckets, so capture the rows
+        # before and after and apply the difference (see intel_app/reporting.py). The rows after are
+        # the rows before with the new values, unless a value is an expression only the database knows.
+        with transaction.atomic(using=self.db):
+            before = reporting.snapshot(self.select_for_update(of=('self',)))
+            ids = [row[0] for row in before]
+            updated = self.model._base_manager.using(self.db).filter(id__in=ids).update(**kwargs)
+            after = reporting.updated_rows(before, self.model, kwargs)
+            if after is None:
+                after = reporting.snapshot(self.model._base_manager.using(self.db).filter(id__in=ids))
+            reporting.apply_changes(before, after)
+        return updated
+
+    def bulk_create(self, objs, *args, **kwargs):
+        from . import reporting
+
+        with transaction.atomic(using=self.db):
+            created = super().bulk_create(objs, *args, **kwargs)
+            reporting.apply_changes([], [reporting.row(order) for order in created if order.pk is not None])
+        return created
+
+
+class BundleOrder(models.Model):
+    networks = (
+        ("ishare", "AirtelTigo iShare"),
+        ("mtn", "MTN"),
+        ("bigtime", "AirtelTigo BigTime"),
+        ("voda", "Vodafone")
+    )
+    network = models.CharField(max_length=20, choices=networks)
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
     bundle_number = models.BigIntegerField(null=False, blank=False)
     offer = models.CharField(max_length=250, null=False, blank=False)
     amount = models.FloatField(null=False, blank=False, default=0.0)
     reference = models.CharField(max_length=20, null=False, blank=True)
     transaction_date = models.DateTimeField(auto_now_add=True)
-    transaction_status = models.CharField(max_length=100, null=False)
+    choices = (
+        ("Pending", "Pending"),
+        ("Processing", "Processing"),
+        ("Completed", "Completed"),
+        ("Failed", "Failed"),
+        ("Canceled and Refunded", "Canceled and Refunded")
+    )
+    transaction_status = models.CharField(max_length=100, choices=choices, default="Pending")
     description = models.CharField(max_length=500, null=True, blank=True)
+    provider = models.CharField(max_length=250, null=True, blank=True)
+    queued_at = models.DateTimeField(null=True, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    tier = models.CharField(max_length=20, null=True, blank=True)
+    volume_mb = models.FloatField(null=True, blank=True)
+    cost = models.FloatField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(null=True, blank=True)
+
+    objects = BundleOrderQuerySet.as_manager()
+
+    # Set on the per-network proxies below.
+    NETWORK = None
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-transaction_date']),
+            models.Index(fields=['network', 'user', '-transaction_date']),
+            models.Index(fields=['transaction_status', '-transaction_date']),
+            models.Index(fields=['network', 'transaction_status', '-transaction_date']),
+            models.Index(fields=['network', '-transaction_date']),
+            models.Index(fields=['-transaction_date']),
+            models.Index(fields=['reference']),
+        ]
+
+    def save(self, *args, **kwargs):
+        from . import reporting
+
+        if self.NETWORK:
+            self.network = self.NETWORK
+        with transaction.atomic(using=kwargs.get('using')):
+            before = []
+            if self.pk is not None:
+                before = reporting.snapshot(BundleOrder._base_manager.select_for_update().filter(pk=self.pk))
+            super().save(*args, **kwargs)
+            reporting.apply_changes(before, [reporting.row(self)])
 
     def __str__(self):
         return f"{self.user.username} - {self.bundle_number} - {self.reference}"
 
 
-class IshareBundlePrice(models.Model):
-    price = models.FloatField(null=False, blank=False)
-    bundle_volume = models.FloatField(null=False, blank=False)
+class DeliveryAttempt(models.Model):
+    order = models.ForeignKey(BundleOrder, on_delete=models.CASCADE, related_name='delivery_attempts')
+    number = models.PositiveIntegerField()
+    provider = models.CharField(max_length=250)
+    outcomes = (
+        ("Delivered", "Delivered"),
+        ("Rejected", "Rejected"),
+        ("Error", "Error"),
+        ("Unknown", "Unknown")
+    )
+    outcome = models.CharField(max_length=20, choices=outcomes)
+    status_code = models.PositiveIntegerField(null=True, blank=True)
+    response = models.JSONField(null=True, blank=True)
+    error = models.CharField(max_length=500, null=True, blank=True)
+    started_at = models.DateTimeField(default=timezone.now)
+    duration = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['order', 'number'], name='unique_delivery_attempt'),
+        ]
 
     def __str__(self):
-        if self.bundle_volume >= 1000:
-            return f"GHS{self.price} - {self.bundle_volume / 1000}GB"
-        return f"GHS{self.price} - {self.bundle_volume}MB"
+        return f"{self.order_id} #{self.number} - {self.outcome}"
 
 
-class AgentIshareBundlePrice(models.Model):
-    price = models.FloatField(null=False, blank=False)
-    bundle_volume = models.FloatField(null=False, blank=False)
+class NetworkOrderManager(models.Manager.from_queryset(BundleOrderQuerySet)):
+    def __init__(self, network):
+        super().__init__()
+        self.network = network
 
-    def __str__(self):
-        if self.bundle_volume >= 1000:
-            return f"GHS{self.price} - {self.bundle_volume / 1000}GB"
-        return f"GHS{self.price} - {self.bundle_volume}MB"
+    def get_queryset(self):
+        return super().get_queryset().filter(network=self.network)
 
+    def bulk_create(self, objs, *args, **kwargs):
+        # bulk_create skips save(), so tag the rows here as well.
+        objs = list(objs)
+        for obj in objs:
+            obj.network = self.network
+        return super().bulk_create(objs, *args, **kwargs)
 
-class SuperAgentIshareBundlePrice(models.Model):
-    price = models.FloatField(null=False, blank=False)
-    bundle_volume = models.FloatField(null=False, blank=False)
 
-    def __str__(self):
-        if self.bundle_volume >= 1000:
-            return f"GHS{self.price} - {self.bundle_volume / 1000}GB"
-        return f"GHS{self.price} - {self.bundle_volume}MB"
+class IShareBundleTransaction(BundleOrder):
+    NETWORK = "ishare"
+    objects = NetworkOrderManager(NETWORK)
 
-
-class AgentBigTimeBundlePrice(models.Model):
-    price = models.FloatField(null=False, blank=False)
-    bundle_volume = models.FloatField(null=False, blank=False)
-
-    def __str__(self):
-        if self.bundle_volume >= 1000:
-            return f"GHS{self.price} - {self.bundle_volume / 1000}GB"
-        return f"GHS{self.price} - {self.bundle_volume}MB"
+    class Meta:
+        proxy = True
 
 
-class SuperAgentBigTimeBundlePrice(models.Model):
+class BundlePrice(models.Model):
+    tiers = (
+        ("User", "User"),
+        ("Agent", "Agent"),
+        ("Super Agent", "Super Agent")
+    )
+    network = models.CharField(max_length=20, choices=BundleOrder.networks)
+    tier = models.CharField(max_length=20, choices=tiers, default="User")
+    volume_mb = models.FloatField(null=False, blank=False)
     price = models.FloatField(null=False, blank=False)
-    bundle_volume = models.FloatField(null=False, blank=False)
+    purchase_price = models.FloatField(null=True, blank=True)
+    effective_from = models.DateTimeField(default=timezone.now)
+    # A version with active unset withdraws the bundle from sale from effective_from on.
+    active = models.BooleanField(default=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['network', 'tier', 'volume_mb', 'effective_from'],
+                                    name='unique_bundle_price_version'),
+        ]
+        indexes = [
+            models.Index(fields=['network', 'tier', 'volume_mb', '-effective_from']),
+        ]
 
     def __str__(self):
-        if self.bundle_volume >= 1000:
-            return f"GHS{self.price} - {self.bundle_volume / 1000}GB"
-        return f"GHS{self.price} - {self.bundle_volume}MB"
+        if self.volume_mb >= 1000:
+            return f"GHS{self.price} - {self.volume_mb / 1000}GB"
+        return f"GHS{self.price} - {self.volume_mb}MB"
 
 
-class BigTimeBundlePrice(models.Model):
-    price = models.FloatField(null=False, blank=False)
-    bundle_volume = models.FloatField(null=False, blank=False)
+class BigTimeTransaction(BundleOrder):
+    NETWORK = "bigtime"
+    objects = NetworkOrderManager(NETWORK)
 
-    def __str__(self):
-        if self.bundle_volume >= 1000:
-            return f"GHS{self.price} - {self.bundle_volume / 1000}GB"
-        return f"GHS{self.price} - {self.bundle_volume}MB"
-
-
-class BigTimeTransaction(models.Model):
-    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
-    bundle_number = models.BigIntegerField(null=False, blank=False)
-    offer = models.CharField(max_length=250, null=False, blank=False)
-    amount = models.FloatField(null=False, blank=False, default=0.0)
-    reference = models.CharField(max_length=20, null=False, blank=True)
-    transaction_date = models.DateTimeField(auto_now_add=True)
-    choices = (
-        ("Pending", "Pending"),
-        ("Completed", "Completed"),
-        ("Processing", "Processing"),
-        ("Failed", "Failed")
-    )
-    transaction_status = models.CharField(max_length=100, choices=choices, default="Pending")
-    description = models.CharField(max_length=500, null=True, blank=True)
-
-    def __str__(self):
-        return f"{self.user.username} - {self.bundle_number} - {self.reference}"
+    class Meta:
+        proxy = True
 
 
 class AFARegistration(models.Model):
@@ -161,58 +260,24 @@ class AFARegistration(models.Model):
     transaction_status = models.CharField(max_length=100, choices=choices, default="Pending")
     transaction_date = models.DateTimeField(auto_now_add=True)
 
-    def __str__(self):
-        return f"{self.user.username} - {self.phone_number} - {self.gh_card_number}"
-
-
-class SuperAgentMTNBundlePrice(models.Model):
-    price = models.FloatField(null=False, blank=False)
-    bundle_volume = models.FloatField(null=False, blank=False)
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-transaction_date']),
+            models.Index(fields=['transaction_status', '-transaction_date']),
+            models.Index(fields=['-transaction_date']),
+            models.Index(fields=['reference']),
+        ]
 
     def __str__(self):
-        if self.bundle_volume >= 1000:
-            return f"GHS{self.price} - {self.bundle_volume / 1000}GB"
-        return f"GHS{self.price} - {self.bundle_volume}MB"
-
-
-class MTNTransaction(models.Model):
-    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
-    bundle_number = models.BigIntegerField(null=False, blank=False)
-    offer = models.CharField(max_length=250, null=False, blank=False)
-    amount = models.FloatField(null=False, blank=False, default=0.0)
-    reference = models.CharField(max_length=20, null=False, blank=True)
-    transaction_date = models.DateTimeField(auto_now_add=True)
-    choices = (
-        ("Pending", "Pending"),
-        ("Processing", "Processing"),
-        ("Completed", "Completed"),
-        ("Failed", "Failed")
-    )
-    transaction_status = models.CharField(max_length=100, choices=choices, default="Completed")
-    description = models.CharField(max_length=500, null=True, blank=True)
-
-    def __str__(self):
-        return f"{self.user.username} - {self.bundle_number} - {self.reference}"
-
-
-class MTNBundlePrice(models.Model):
-    price = models.FloatField(null=False, blank=False)
-    bundle_volume = models.FloatField(null=False, blank=False)
-
-    def __str__(self):
-        if self.bundle_volume >= 1000:
-            return f"GHS{self.price} - {self.bundle_volume / 1000}GB"
-        return f"GHS{self.price} - {self.bundle_volume}MB"
+        return f"{self.user.username} - {self.phone_number} - {self.gh_card_number}"
 
 
-class AgentMTNBundlePrice(models.Model):
-    price = models.FloatField(null=False, blank=False)
-    bundle_volume = models.FloatField(null=False, blank=False)
+class MTNTransaction(BundleOrder):
+    NETWORK = "mtn"
+    objects = NetworkOrderManager(NETWORK)
 
-    def __str__(self):
-        if self.bundle_volume >= 1000:
-            return f"GHS{self.price} - {self.bundle_volume / 1000}GB"
-        return f"GHS{self.price} - {self.bundle_volume}MB"
+    class Meta:
+        proxy = True
 
 
 class Payment(models.Model):
@@ -233,6 +298,11 @@ class Payment(models.Model):
     transaction_date = models.CharField(max_length=250, null=True, blank=True)
     payment_details = models.CharField(max_length=500, null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['reference']),
+        ]
+
     def __str__(self):
         return f"{self.user.username} - {self.reference}"
 
@@ -249,58 +319,23 @@ class TopUpRequest(models.Model):
     ]
     credited_at = models.DateTimeField(auto_now_add=True)
 
-
-class VodaBundlePrice(models.Model):
-    price = models.FloatField(null=False, blank=False)
-    bundle_volume = models.FloatField(null=False, blank=False)
-    purchase_price = models.FloatField(null=True, blank=True)
-
-    def __str__(self):
-        if self.bundle_volume >= 1000:
-            return f"GHS{self.price} - {self.bundle_volume / 1000}GB"
-        return f"GHS{self.price} - {self.bundle_volume}MB"
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['reference'], name='unique_topup_reference'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-date']),
+            models.Index(fields=['status', '-date']),
+            models.Index(fields=['-date']),
+        ]
 
 
-class AgentVodaBundlePrice(models.Model):
-    price = models.FloatField(null=False, blank=False)
-    bundle_volume = models.FloatField(null=False, blank=False)
-    purchase_price = models.FloatField(null=True, blank=True)
-
-    def __str__(self):
-        if self.bundle_volume >= 1000:
-            return f"GHS{self.price} - {self.bundle_volume / 1000}GB"
-        return f"GHS{self.price} - {self.bundle_volume}MB"
-
-
-class SuperAgentVodaBundlePrice(models.Model):
-    price = models.FloatField(null=False, blank=False)
-    bundle_volume = models.FloatField(null=False, blank=False)
-    purchase_price = models.FloatField(null=True, blank=True)
-
-    def __str__(self):
-        if self.bundle_volume >= 1000:
-            return f"GHS{self.price} - {self.bundle_volume / 1000}GB"
-        return f"GHS{self.price} - {self.bundle_volume}MB"
-
-
-class VodafoneTransaction(models.Model):
-    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
-    bundle_number = models.BigIntegerField(null=False, blank=False)
-    offer = models.CharField(max_length=250, null=False, blank=False)
-    amount = models.FloatField(null=False, blank=False, default=0.0)
-    reference = models.CharField(max_length=20, null=False, blank=True)
-    transaction_date = models.DateTimeField(auto_now_add=True)
-    choices = (
-        ("Pending", "Pending"),
-        ("Completed", "Completed"),
-        ("Processing", "Processing"),
-        ("Failed", "Failed")
-    )
-    transaction_status = models.CharField(max_length=100, choices=choices, default="Pending")
-    description = models.CharField(max_length=500, null=True, blank=True)
+class VodafoneTransaction(BundleOrder):
+    NETWORK = "voda"
+    objects = NetworkOrderManager(NETWORK)
 
-    def __str__(self):
-        return f"{self.user.username} - {self.bundle_number} - {self.reference}"
+    class Meta:
+        proxy = True
 
 
 class WalletTransaction(models.Model):
@@ -331,6 +366,146 @@ class WalletTransactionn(models.Model):
     new_balance = models.FloatField(null=False, blank=False)
     transaction_date = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-transaction_date']),
+        ]
+
     def __str__(self):
         return f"{self.user.username} - {self.transaction_type} - {self.transaction_amount}"
 
+
+
+class SMSOutbox(models.Model):
+    recipient = models.CharField(max_length=20, null=False, blank=False)
+    message = models.TextField(null=False, blank=False)
+    dedupe_key = models.CharField(max_length=250, null=True, blank=True, unique=True)
+    choices = (
+        ("Pending", "Pending"),
+        ("Sent", "Sent"),
+        ("Failed", "Failed")
+    )
+    status = models.CharField(max_length=20, choices=choices, default="Pending")
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.CharField(max_length=500, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.recipient} - {self.status}"
+
+
+class PaystackEvent(models.Model):
+    event = models.CharField(max_length=100, null=False, blank=False)
+    reference = models.CharField(max_length=250, null=False, blank=False)
+    payload = models.JSONField()
+    choices = (
+        ("Pending", "Pending"),
+        ("Processed", "Processed"),
+        ("Ignored", "Ignored"),
+        ("Failed", "Failed")
+    )
+    status = models.CharField(max_length=20, choices=choices, default="Pending")
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.CharField(max_length=500, null=True, blank=True)
+    received_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['event', 'reference'], name='unique_paystack_event'),
+        ]
+        indexes = [
+            models.Index(fields=['status', 'received_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.event} - {self.reference} - {self.status}"
+
+
+class SalesRollup(models.Model):
+    network = models.CharField(max_length=20, choices=BundleOrder.networks)
+    tier = models.CharField(max_length=20, blank=True)
+    status = models.CharField(max_length=100)
+    orders = models.IntegerField(default=0)
+    volume_mb = models.FloatField(default=0.0)
+    revenue = models.FloatField(default=0.0)
+    # Cost is only known for orders placed at a price with a purchase_price; costed_orders counts them.
+    cost = models.FloatField(default=0.0)
+    costed_orders = models.IntegerField(default=0)
+
+    class Meta:
+        abstract = True
+
+
+class HourlySales(SalesRollup):
+    bucket = models.DateTimeField()
+
+    class Meta:
+        verbose_name_plural = "hourly sales"
+        constraints = [
+            models.UniqueConstraint(fields=['bucket', 'network', 'tier', 'status'], name='unique_hourly_sales'),
+        ]
+
+    def __str__(self):
+        return f"{self.bucket:%Y-%m-%d %H:00} - {self.network} - {self.status}"
+
+
+class DailySales(SalesRollup):
+    bucket = models.DateField()
+
+    class Meta:
+        verbose_name_plural = "daily sales"
+        constraints = [
+            models.UniqueConstraint(fields=['bucket', 'network', 'tier', 'status'], name='unique_daily_sales'),
+        ]
+
+    def __str__(self):
+        return f"{self.bucket} - {self.network} - {self.status}"
+
+
+class ProviderHealth(models.Model):
+    """Circuit breaker state of an iShare provider, shared by every fulfillment worker."""
+    provider = models.CharField(max_length=250, unique=True, choices=AdminInfo.ishare_choices)
+    states = (
+        ("Closed", "Closed"),
+        ("Open", "Open"),
+        ("Half-open", "Half-open"),
+    )
+    state = models.CharField(max_length=20, choices=states, default="Closed")
+    changed_at = models.DateTimeField(default=timezone.now)
+    reason = models.CharField(max_length=500, null=True, blank=True)
+    calls = models.PositiveIntegerField(default=0)
+    error_rate = models.FloatField(default=0)
+    slow_rate = models.FloatField(default=0)
+    avg_latency = models.FloatField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = "provider health"
+
+    def __str__(self):
+        return f"{self.provider} - {self.state}"
+
+
+class ProviderStateChange(models.Model):
+    provider = models.CharField(max_length=250, choices=AdminInfo.ishare_choices)
+    from_state = models.CharField(max_length=20, choices=ProviderHealth.states)
+    to_state = models.CharField(max_length=20, choices=ProviderHealth.states)
+    reason = models.CharField(max_length=500, null=True, blank=True)
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['provider', '-changed_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.provider}: {self.from_state} -> {self.to_state}"
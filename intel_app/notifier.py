@@ -0,0 +1,107 @@
+import time
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import models, upstream
+
+# How long a claimed message is hidden from other workers while it is being sent.
+CLAIM_LEASE = timedelta(minutes=2)
+
+
+def normalize_number(number):
+    number = str(number).strip().replace(" ", "")
+    if number.startswith("+"):
+        number = number[1:]
+    if number.startswith("233"):
+        number = number[3:]
+    if not number.startswith("0"):
+        number = f"0{number}"
+    return number
+
+
+def send_sms(recipient, message, dedupe_key=None):
+    """Queue an SMS for the outbox worker. Messages sharing a dedupe_key are only queued once."""
+    if not recipient:
+        return
+    models.SMSOutbox.objects.bulk_create(
+        [models.SMSOutbox(recipient=normalize_number(recipient), message=message, dedupe_key=dedupe_key)],
+        ignore_conflicts=True,
+    )
+
+
+def send_many(messages):
+    """Queue (recipient, message, dedupe_key) SMSes with one insert, skipping already queued dedupe keys."""
+    models.SMSOutbox.objects.bulk_create(
+        [models.SMSOutbox(recipient=normalize_number(recipient), message=message, dedupe_key=dedupe_key)
+         for recipient, message, dedupe_key in messages if recipient],
+        ignore_conflicts=True,
+    )
+
+
+def deliver(sms):
+    response = upstream.get_client('arkesel').get("/sms/api", params={
+        "action": "send-sms",
+        "api_key": settings.ARKESEL_API_KEY,
+        "to": sms.recipient,
+        "from": settings.SMS_SENDER_ID,
+        "sms": sms.message,
+    })
+    try:
+        data = response.json()
+    except ValueError:
+        data = {}
+    if response.status_code != 200 or data.get("code") != "ok":
+        raise requests.RequestException(f"{response.status_code}: {response.text[:200]}")
+
+
+def claim_batch(limit):
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            models.SMSOutbox.objects.select_for_update(skip_locked=True)
+            .filter(status="Pending", next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'id')[:limit]
+        )
+        models.SMSOutbox.objects.filter(id__in=[sms.id for sms in batch]).update(
+            next_attempt_at=now + CLAIM_LEASE
+        )
+    return batch
+
+
+class RateLimiter:
+    def __init__(self, per_second):
+        self.interval = 1.0 / per_second if per_second else 0
+        self.next_slot = time.monotonic()
+
+    def wait(self):
+        now = time.monotonic()
+        if self.next_slot > now:
+            time.sleep(self.next_slot - now)
+        self.next_slot = max(now, self.next_slot) + self.interval
+
+
+def send_batch(batch, limiter):
+    sent = failed = 0
+    for sms in batch:
+        limiter.wait()
+        sms.attempts += 1
+        try:
+            deliver(sms)
+        except requests.RequestException as e:
+            sms.last_error = str(e)[:500]
+            if sms.attempts >= settings.SMS_MAX_ATTEMPTS:
+                sms.status = "Failed"
+            else:
+                backoff = settings.SMS_RETRY_BACKOFF * 2 ** (sms.attempts - 1)
+                sms.next_attempt_at = timezone.now() + timedelta(seconds=backoff)
+            failed += 1
+        else:
+            sms.status = "Sent"
+            sms.sent_at = timezone.now()
+            sent += 1
+        sms.save(update_fields=['status', 'attempts', 'next_attempt_at', 'last_error', 'sent_at'])
+    return sent, failed
@@ -0,0 +1,40 @@
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.http import HttpResponse
+
+VERSION_KEY = "page_cache:version"
+
+
+def invalidate():
+    """Drop every cached page in every process sharing the cache; the next anonymous hit renders it again."""
+    cache.set(VERSION_KEY, time.time_ns(), None)
+
+
+def anonymous_page(name):
+    """
+    Serve the view's response from the cache to anonymous GET requests for PAGE_CACHE_TTL seconds.
+
+    Signed-in users see their name and menu in the header, and a pending message is shown once, so those
+    requests are always rendered.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if (request.method != "GET" or request.user.is_authenticated or get_messages(request)
+                    or not settings.PAGE_CACHE_TTL):
+                return view(request, *args, **kwargs)
+            key = f"page:{name}:{cache.get(VERSION_KEY, 0)}"
+            cached = cache.get(key)
+            if cached is not None:
+                content, content_type = cached
+                return HttpResponse(content, content_type=content_type)
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200 and not response.streaming:
+                cache.set(key, (response.content, response['Content-Type']), settings.PAGE_CACHE_TTL)
+            return response
+        return wrapper
+    return decorator
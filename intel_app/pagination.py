@@ -0,0 +1,53 @@
+import base64
+import binascii
+
+from django.utils.dateparse import parse_datetime
+
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(date, pk):
+    return base64.urlsafe_b64encode(f"{date.isoformat()}|{pk}".encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        date, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        date = parse_datetime(date)
+        return (date, int(pk)) if date else None
+    except (binascii.Error, UnicodeError, ValueError):
+        return None
+
+
+def page_size(value, default=25):
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        return default
+    return min(max(size, 1), MAX_PAGE_SIZE)
+
+
+def keyset_page(queryset, cursor=None, size=25, date_field='transaction_date', descending=True):
+    """Return (rows, next_cursor) for the page after cursor, newest first unless descending is False.
+
+    Rows are ordered on (date_field, id) and the page starts strictly after the cursor's
+    position, so every page is an index range scan no matter how deep into the history it is.
+    Works for model and .values() querysets; next_cursor is None on the last page.
+    """
+    direction = '-' if descending else ''
+    queryset = queryset.order_by(f'{direction}{date_field}', f'{direction}id')
+    position = decode_cursor(cursor) if cursor else None
+    if position:
+        date, pk = position
+        if descending:
+            queryset = queryset.filter(**{f'{date_field}__lte': date}).exclude(**{date_field: date, 'id__gte': pk})
+        else:
+            queryset = queryset.filter(**{f'{date_field}__gte': date}).exclude(**{date_field: date, 'id__lte': pk})
+    rows = list(queryset[:size + 1])
+    if len(rows) <= size:
+        return rows, None
+    rows = rows[:size]
+    last = rows[-1]
+    if isinstance(last, dict):
+        return rows, encode_cursor(last[date_field], last['id'])
+    return rows, encode_cursor(getattr(last, date_field), last.id)
@@ -0,0 +1,129 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import models, notifier, wallet
+
+logger = logging.getLogger(__name__)
+
+
+def record_event(payload):
+    """Store a verified webhook event. Redeliveries of the same event hit the unique index and are dropped."""
+    data = payload.get('data') or {}
+    models.PaystackEvent.objects.bulk_create(
+        [models.PaystackEvent(event=payload.get('event'), reference=data.get('reference'), payload=payload)],
+        ignore_conflicts=True,
+    )
+
+
+def pending_events():
+    return models.PaystackEvent.objects.filter(status="Pending", next_attempt_at__lte=timezone.now())
+
+
+def _topup_credit(event):
+    """Return (user_id, amount) for a wallet top-up event, or a reason to ignore the event."""
+    if event.event != 'charge.success':
+        return None, "Not a charge"
+    data = event.payload.get('data') or {}
+    metadata = data.get('metadata') or {}
+    if metadata.get('channel') != 'topup':
+        return None, "Not a top-up transaction"
+    try:
+        user_id = int(metadata.get('user_id'))
+        paid_amount = float(data.get('amount')) / 100  # Convert from kobo/pesewas to GHS
+        real_amount = float(metadata.get('real_amount'))
+    except (TypeError, ValueError):
+        return None, "Missing user or amount"
+    if abs(paid_amount - real_amount) > 1.0:
+        return None, "Paid amount does not match the top-up amount"
+    return (user_id, real_amount), None
+
+
+def apply_events(events):
+    """Credit every top-up in events with one wallet update, then mark the events done."""
+    now = timezone.now()
+    ignored = {}
+    credits = {}
+    for event in events:
+        credit, reason = _topup_credit(event)
+        if credit:
+            credits[event.reference] = (event, credit)
+        else:
+            ignored[event.id] = reason
+
+    users = models.CustomUser.objects.in_bulk({user_id for _, (user_id, _) in credits.values()})
+    topups = models.TopUpRequest.objects.select_for_update().in_bulk(list(credits), field_name='reference')
+    to_update, to_create, to_credit = [], [], []
+    for reference, (event, (user_id, amount)) in credits.items():
+        topup = topups.get(reference)
+        if user_id not in users:
+            ignored[event.id] = "User not found"
+        elif topup and topup.status:
+            ignored[event.id] = "Already credited"
+        else:
+            if topup:
+                topup.amount, topup.status, topup.credited_at = amount, True, now
+                to_update.append(topup)
+            else:
+                to_create.append(models.TopUpRequest(
+                    user_id=user_id, reference=reference, amount=amount, status=True, credited_at=now
+                ))
+            to_credit.append((event, users[user_id], amount))
+
+    models.TopUpRequest.objects.bulk_update(to_update, ['amount', 'status', 'credited_at'])
+    models.TopUpRequest.objects.bulk_create(to_create)
+    wallet.credit_many([(user.id, amount, 'Wallet Topup (Paystack)') for _, user, amount in to_credit])
+    for event, user, amount in to_credit:
+        sms_message = f"Your wallet has been credited with GHS{amount}.\nReference: {event.reference}"
+        notifier.send_sms(user.phone, sms_message, dedupe_key=f"topup:{event.reference}")
+
+    models.PaystackEvent.objects.filter(id__in=[event.id for event, _, _ in to_credit]).update(
+        status="Processed", processed_at=now
+    )
+    for event in events:
+        if event.id in ignored:
+            event.status, event.last_error, event.processed_at = "Ignored", ignored[event.id], now
+    models.PaystackEvent.objects.bulk_update(
+        [event for event in events if event.id in ignored], ['status', 'last_error', 'processed_at']
+    )
+    return len(to_credit)
+
+
+def process_batch(limit):
+    """Apply up to limit pending events. Returns (events handled, top-ups credited, events failed)."""
+    with transaction.atomic():
+        events = list(pending_events().select_for_update(skip_locked=True).order_by('received_at', 'id')[:limit])
+        if not events:
+            return 0, 0, 0
+        try:
+            with transaction.atomic():
+                return len(events), apply_events(events), 0
+        except Exception:
+            logger.exception("Applying a batch of %d Paystack events failed; retrying them one at a time", len(events))
+
+    # Something in the batch failed; apply the events one at a time so a bad one cannot hold up the rest.
+    credited = failed = 0
+    for event in events:
+        with transaction.atomic():
+            event = pending_events().select_for_update(skip_locked=True).filter(id=event.id).first()
+            if event is None:
+                continue
+            try:
+                with transaction.atomic():
+                    credited += apply_events([event])
+            except Exception as e:
+                logger.exception("Paystack event %s (%s) failed", event.id, event.reference)
+                event.attempts += 1
+                event.last_error = str(e)[:500]
+                if event.attempts >= settings.PAYSTACK_EVENT_MAX_ATTEMPTS:
+                    event.status = "Failed"
+                else:
+                    # Back off so a short database or Paystack outage does not use up every attempt at once.
+                    backoff = settings.PAYSTACK_EVENT_RETRY_BACKOFF * 2 ** (event.attempts - 1)
+                    event.next_attempt_at = timezone.now() + timedelta(seconds=backoff)
+                event.save(update_fields=['attempts', 'last_error', 'status', 'next_attempt_at'])
+                failed += 1
+    return len(events), credited, failed
@@ -0,0 +1,43 @@
+import threading
+import time
+
+from django.core.cache import cache
+
+
+class ProcessCache:
+    """
+    Per-process copy of a value that is expensive to load and rarely changes.
+
+    The copy is reloaded when the version stamp stored in the Django cache changes (see
+    invalidate()) and at least every `ttl` seconds. The stamp only reaches other processes
+    through a shared cache backend (REDIS_URL in settings); with the per-process LocMemCache
+    fallback, invalidate() refreshes this process only and the others wait out the ttl.
+    """
+
+    def __init__(self, name, loader, ttl):
+        self.version_key = f"{name}:version"
+        self.loader = loader
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._value = None
+        self._version = None
+        self._loaded_at = None
+
+    def version(self):
+        return cache.get(self.version_key)
+
+    def get(self):
+        version = self.version()
+        loaded_at = self._loaded_at
+        if loaded_at is not None and version == self._version and time.monotonic() - loaded_at < self.ttl():
+            return self._value
+
+        value = self.loader()
+        with self._lock:
+            self._value, self._version, self._loaded_at = value, version, time.monotonic()
+        return value
+
+    def invalidate(self):
+        cache.set(self.version_key, time.time_ns(), None)
+        with self._lock:
+            self._loaded_at = None
@@ -0,0 +1,181 @@
+import re
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+import requests
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Min
+from django.utils import timezone
+
+from . import fulfillment, helper, metrics, models, notifier, routing, wallet
+
+UNRESOLVED = ("Pending", "Processing")
+
+# Provider status words, lower-cased. Anything else means the provider is still working on the order.
+DELIVERED = {"delivered", "successful", "success", "completed"}
+FAILED = {"failed", "reversed", "refunded", "rejected", "canceled", "cancelled"}
+NOT_FOUND = {"not found", "not_found", "notfound", "transaction not found", "transaction_not_found"}
+# A message saying the transaction or reference itself is unknown, e.g. "Transaction not found".
+NOT_FOUND_MESSAGE = re.compile(r"\b(transaction|reference)\b.*\b(not found|does not exist)\b", re.I)
+
+
+def stale_orders(now=None):
+    """iShare orders a provider has held in Processing for longer than RECONCILE_MIN_AGE seconds."""
+    cutoff = (now or timezone.now()) - timedelta(seconds=settings.RECONCILE_MIN_AGE)
+    return models.IShareBundleTransaction.objects.filter(
+        transaction_status="Processing", provider__in=routing.PROVIDERS, claimed_at__lt=cutoff
+    )
+
+
+def provider_status(order):
+    """
+    What the order's provider says became of it: "delivered", "failed", "missing" or "pending".
+
+    "missing" sends the order again, so it needs a body that says the transaction is unknown: a bare 404 is
+    as likely to be a wrong status path, and is treated as "pending" like any other unclear answer.
+    """
+    try:
+        if order.provider == "Gyasi":
+            response = helper.bestpay_transaction_status(order.reference)
+        else:
+            response = helper.value_for_moni_transaction_status(order.reference)
+    except requests.RequestException:
+        return "pending"
+    try:
+        data = response.json()
+    except ValueError:
+        return "pending"
+    if response.status_code not in (200, 404) or not isinstance(data, dict):
+        return "pending"
+    details = data.get("data") if isinstance(data.get("data"), dict) else {}
+    status = str(data.get("status") or details.get("status") or "").lower()
+    message = str(data.get("message") or details.get("message") or "")
+    if status in NOT_FOUND or NOT_FOUND_MESSAGE.search(message):
+        return "missing"
+    if response.status_code != 200:
+        return "pending"
+    if status in DELIVERED:
+        return "delivered"
+    if status in FAILED:
+        return "failed"
+    return "pending"
+
+
+def check(orders):
+    """Look up a batch of orders, each provider's share in parallel over its pooled connections."""
+    by_provider = {}
+    for order in orders:
+        by_provider.setdefault(order.provider, []).append(order)
+    statuses = {}
+    for provider, provider_orders in by_provider.items():
+        with ThreadPoolExecutor(max_workers=fulfillment.provider_concurrency(provider)) as executor:
+            statuses.update(zip((order.id for order in provider_orders),
+                                executor.map(provider_status, provider_orders)))
+    return statuses
+
+
+def _lock_processing(orders):
+    # Re-checked under lock: the fulfillment worker or staff may have resolved an order meanwhile.
+    return set(
+        models.IShareBundleTransaction.objects.select_for_update(of=('self',))
+        .filter(id__in=[order.id for order in orders], transaction_status="Processing")
+        .order_by('id').values_list('id', flat=True)
+    )
+
+
+def apply(orders, statuses):
+    """Move every order whose provider gave a final answer; returns {status: orders changed}."""
+    now = timezone.now()
+    by_status = {}
+    for order in orders:
+        by_status.setdefault(statuses[order.id], []).append(order)
+    missing = by_status.get("missing", [])
+    # An order the provider never saw can be sent again, unless it is out of attempts.
+    retry = [order for order in missing if order.attempts < settings.DELIVERY_MAX_ATTEMPTS]
+    failed = by_status.get("failed", []) + [order for order in missing if order not in retry]
+    changed = {}
+
+    with transaction.atomic():
+        ids = _lock_processing(by_status.get("delivered", []))
+        models.IShareBundleTransaction.objects.filter(id__in=ids).update(
+            transaction_status="Completed", completed_at=now, description="Delivery confirmed by the provider"
+        )
+        notifier.send_many([message for order in by_status.get("delivered", []) if order.id in ids
+                            for message in fulfillment.completion_messages(order)])
+        changed["delivered"] = len(ids)
+
+    with transaction.atomic():
+        ids = _lock_processing(failed)
+        models.IShareBundleTransaction.objects.filter(id__in=ids).update(
+            transaction_status="Canceled and Refunded", completed_at=now,
+            description="Reported failed or unknown by the provider"
+        )
+        wallet.credit_many([(order.user_id, order.amount, 'AT Bundle Refund') for order in failed if order.id in ids])
+        changed["failed"] = len(ids)
+
+    with transaction.atomic():
+        ids = _lock_processing(retry)
+        models.IShareBundleTransaction.objects.filter(id__in=ids).update(
+            transaction_status="Pending", claimed_at=None, next_attempt_at=now,
+            description="Not found at the provider; queued again"
+        )
+        changed["missing"] = len(ids)
+    return changed
+
+
+def reconcile(batch_size=100, progress=None):
+    """
+    Check every stale order against its provider, oldest first, batch_size orders at a time.
+
+    Returns {status: count} of the provider answers and {status: count} of the orders changed.
+    """
+    now = timezone.now()
+    answers, changed = {}, {}
+    last_id = 0
+    while True:
+        orders = list(stale_orders(now).filter(id__gt=last_id).select_related('user').order_by('id')[:batch_size])
+        if not orders:
+            break
+        last_id = orders[-1].id
+        statuses = check(orders)
+        for status in statuses.values():
+            answers[status] = answers.get(status, 0) + 1
+        for status, count in apply(orders, statuses).items():
+            changed[status] = changed.get(status, 0) + count
+        if progress:
+            progress(answers, changed)
+    return answers, changed
+
+
+def backlog():
+    """Count and oldest age of the unresolved orders of every network and status, zeros included."""
+    now = timezone.now()
+    rows = {
+        (row['network'], row['transaction_status']): row
+        for row in models.BundleOrder.objects.filter(transaction_status__in=UNRESOLVED)
+        .values('network', 'transaction_status').annotate(count=Count('id'), oldest=Min('transaction_date'))
+        .order_by()
+    }
+    stats = []
+    for network, _ in models.BundleOrder.networks:
+        for status in UNRESOLVED:
+            row = rows.get((network, status), {'count': 0, 'oldest': None})
+            stats.append({
+                'network': network,
+                'status': status,
+                'count': row['count'],
+                'oldest_seconds': (now - row['oldest']).total_seconds() if row['oldest'] else 0,
+            })
+    return stats
+
+
+def lag_metrics():
+    stats = backlog()
+    return (
+        metrics.render_gauges('orders_unresolved', "Orders still Pending or Processing.", ('network', 'status'),
+                              [((row['network'], row['status']), row['count']) for row in stats])
+        + metrics.render_gauges('orders_unresolved_oldest_seconds', "Age of the oldest Pending or Processing order.",
+                                ('network', 'status'), [((row['network'], row['status']), row['oldest_seconds'])
+                                                        for row in stats])
+    )
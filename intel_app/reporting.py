@@ -0,0 +1,141 @@
+import re
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from . import models
+
+# BundleOrder columns the sales rollups are computed from; "id" comes first in every snapshot row.
+COLUMNS = ('id', 'transaction_date', 'network', 'tier', 'transaction_status', 'volume_mb', 'amount', 'cost')
+ROLLUP_FIELDS = frozenset(COLUMNS[1:])
+COUNTERS = ('orders', 'volume_mb', 'revenue', 'cost', 'costed_orders')
+
+
+def snapshot(queryset):
+    return list(queryset.values_list(*COLUMNS))
+
+
+def row(order):
+    return tuple(getattr(order, column) for column in COLUMNS)
+
+
+def updated_rows(rows, model, values):
+    """The snapshot rows as an update(**values) leaves them, or None if a value is computed by the database."""
+    if any(hasattr(value, 'resolve_expression') for value in values.values()):
+        return None
+    changes = {}
+    for name, value in values.items():
+        if name in ROLLUP_FIELDS:
+            value = model._meta.get_field(name).to_python(value)
+            if name == 'transaction_date' and value is not None and timezone.is_naive(value):
+                value = timezone.make_aware(value)
+            changes[COLUMNS.index(name)] = value
+    return [tuple(changes.get(index, value) for index, value in enumerate(row)) for row in rows]
+
+
+def parse_volume(offer):
+    """Volume in MB of an order's offer text, e.g. "1000.0MB" or "2GB"."""
+    match = re.match(r'\s*([\d.]+)\s*(MB|GB)?', offer or '', re.I)
+    if not match:
+        return None
+    try:
+        volume = float(match.group(1))
+    except ValueError:
+        return None
+    return volume * 1000 if (match.group(2) or '').upper() == 'GB' else volume
+
+
+def _accumulate(totals, rows, sign):
+    for _, date, network, tier, status, volume, amount, cost in rows:
+        hour = date.replace(minute=0, second=0, microsecond=0)
+        day = timezone.localtime(date).date()
+        for model, bucket in ((models.HourlySales, hour), (models.DailySales, day)):
+            counters = totals.setdefault((model, bucket, network, tier or "", status), [0, 0.0, 0.0, 0.0, 0])
+            counters[0] += sign
+            counters[1] += sign * (volume or 0)
+            counters[2] += sign * (amount or 0)
+            if cost is not None:
+                counters[3] += sign * cost
+                counters[4] += sign
+
+
+def _write(totals):
+    totals = {key: counters for key, counters in totals.items() if any(counters)}
+    for model in (models.HourlySales, models.DailySales):
+        # Sorted, so concurrent transactions lock the rollup rows in the same order.
+        keys = sorted((key for key in totals if key[0] is model), key=lambda key: key[1:])
+        if not keys:
+            continue
+        # One upsert per table: missing bucket rows are created with the deltas and existing ones get
+        # SET x = x + delta, so concurrent writers never overwrite each other.
+        table = connection.ops.quote_name(model._meta.db_table)
+        bucket_field = model._meta.get_field('bucket')
+        columns = ('bucket', 'network', 'tier', 'status') + COUNTERS
+        params = []
+        for _, bucket, network, tier, status in keys:
+            params += [bucket_field.get_db_prep_value(bucket, connection), network, tier, status]
+            params += totals[model, bucket, network, tier, status]
+        placeholders = ", ".join(["(" + ", ".join(["%s"] * len(columns)) + ")"] * len(keys))
+        increments = ", ".join(f"{name} = {table}.{name} + excluded.{name}" for name in COUNTERS)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {table} ({', '.join(columns)}) VALUES {placeholders} "
+                f"ON CONFLICT (bucket, network, tier, status) DO UPDATE SET {increments}",
+                params,
+            )
+
+
+def apply_changes(before, after):
+    """Move the rollup counters from the snapshot rows in before to the rows in after."""
+    totals = {}
+    _accumulate(totals, before, -1)
+    _accumulate(totals, after, 1)
+    _write(totals)
+
+
+def rebuild(chunk_size=5000, progress=None):
+    """
+    Recompute both rollup tables from every order, reading orders in id-ordered chunks.
+
+    It runs in one transaction that keeps order writes out until it commits, so no incremental change is
+    lost or counted twice: on PostgreSQL the order table is locked in EXCLUSIVE mode (plain reads still go
+    through); elsewhere the rollups are deleted first, which takes the database's write lock before any
+    order is read. Checkouts and status updates wait for the whole rebuild.
+
+    Orders created before volumes were recorded get volume_mb filled in from their offer text on the way.
+    Returns the number of orders processed.
+    """
+    orders = models.BundleOrder._base_manager
+    totals = {}
+    last_id = processed = 0
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(f'LOCK TABLE {models.BundleOrder._meta.db_table} IN EXCLUSIVE MODE')
+        for model in (models.HourlySales, models.DailySales):
+            model.objects.all().delete()
+        while True:
+            chunk = list(orders.filter(id__gt=last_id).order_by('id').values_list(*COLUMNS, 'offer')[:chunk_size])
+            if not chunk:
+                break
+            rows, missing = [], []
+            for *columns, offer in chunk:
+                if columns[5] is None:
+                    columns[5] = parse_volume(offer)
+                    if columns[5] is not None:
+                        missing.append(models.BundleOrder(id=columns[0], volume_mb=columns[5]))
+                rows.append(tuple(columns))
+            orders.bulk_update(missing, ['volume_mb'])
+            _accumulate(totals, rows, 1)
+            last_id = chunk[-1][0]
+            processed += len(chunk)
+            if progress:
+                progress(processed, last_id)
+
+        for model in (models.HourlySales, models.DailySales):
+            model.objects.bulk_create(
+                [model(bucket=bucket, network=network, tier=tier, status=status, **dict(zip(COUNTERS, counters)))
+                 for (rollup, bucket, network, tier, status), counters in totals.items() if rollup is model],
+                batch_size=1000,
+            )
+    return processed
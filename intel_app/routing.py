@@ -0,0 +1,145 @@
+import threading
+import time
+from collections import deque
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from . import models, site_config
+
+PROVIDERS = tuple(provider for provider, _ in models.AdminInfo.ishare_choices)
+
+
+class Window:
+    """Outcomes of one provider's recent calls made by this process: (wall time, latency, ok)."""
+
+    def __init__(self):
+        self.calls = deque()
+
+    def add(self, at, latency, ok):
+        self.calls.append((at, latency, ok))
+
+    def stats(self, now, since, config):
+        """(calls, error rate, slow call rate, average latency) over the window, ignoring calls before since."""
+        while self.calls and self.calls[0][0] < now - config['window']:
+            self.calls.popleft()
+        calls = [call for call in self.calls if call[0] >= since]
+        if not calls:
+            return 0, 0.0, 0.0, 0.0
+        errors = sum(1 for _, _, ok in calls if not ok)
+        slow = sum(1 for _, latency, _ in calls if latency >= config['slow_call_seconds'])
+        return len(calls), errors / len(calls), slow / len(calls), sum(latency for _, latency, _ in calls) / len(calls)
+
+
+class Router:
+    """
+    Routes iShare orders to a healthy provider.
+
+    Every worker keeps its own rolling window of call outcomes; the breaker state lives in ProviderHealth so
+    that all workers route the same way. Closed sends orders as usual, Open sends none, and Half-open means
+    one trial order is on its way to decide between the two. AdminInfo.ishare_source is the preferred
+    provider, and with AdminInfo.ishare_failover off it is used whatever its breaker says.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._windows = {}
+        self._published = {}
+
+    def health(self):
+        rows = {row.provider: row for row in models.ProviderHealth.objects.filter(provider__in=PROVIDERS)}
+        for provider in PROVIDERS:
+            if provider not in rows:
+                rows[provider], _ = models.ProviderHealth.objects.get_or_create(provider=provider)
+        return rows
+
+    def choose(self):
+        """
+        Return (provider, limit) for the next batch of orders.
+
+        limit is None for a full batch, or 1 when the order is a trial for a provider coming out of Open.
+        Returns (None, 0) while every breaker is open, so the orders stay queued.
+        """
+        info = site_config.get_admin_info()
+        preferred = info.ishare_source or PROVIDERS[-1]
+        if not info.ishare_failover:
+            return preferred, None
+        health = self.health()
+        now = timezone.now()
+        cooldown = timedelta(seconds=settings.PROVIDER_BREAKER['cooldown'])
+        for provider in (preferred,) + tuple(other for other in PROVIDERS if other != preferred):
+            row = health[provider]
+            if row.state == "Closed":
+                return provider, None
+            if now - row.changed_at < cooldown:
+                continue
+            # A Half-open provider whose trial never reported back (say the worker died) gets another one.
+            reason = ("Cooldown over; sending a trial order" if row.state == "Open"
+                      else "No result from the last trial order; sending another")
+            if self._transition(row, "Half-open", reason):
+                return provider, 1
+        return None, 0
+
+    def record(self, provider, latency, ok, error=None):
+        """Report the outcome of one call to provider, opening or closing its breaker as needed."""
+        config = settings.PROVIDER_BREAKER
+        now = time.time()
+        row = models.ProviderHealth.objects.filter(provider=provider).first()
+        if row is None:
+            return
+        with self._lock:
+            window = self._windows.setdefault(provider, Window())
+            window.add(now, latency, ok)
+            # Calls from before the breaker last closed were already judged.
+            calls, error_rate, slow_rate, avg_latency = window.stats(now, row.changed_at.timestamp(), config)
+
+        changed = False
+        slow = latency >= config['slow_call_seconds']
+        if row.state == "Half-open":
+            if ok and not slow:
+                changed = self._transition(row, "Closed", f"Trial order succeeded in {latency:.1f}s")
+            else:
+                changed = self._transition(
+                    row, "Open", f"Trial order failed: {error}" if not ok else f"Trial order took {latency:.1f}s"
+                )
+        elif row.state == "Closed" and calls >= config['min_calls']:
+            if error_rate >= config['error_rate']:
+                changed = self._transition(row, "Open", f"{error_rate:.0%} of the last {calls} calls failed"
+                                           + (f", last error: {error}" if error else ""))
+            elif slow_rate >= config['slow_call_rate']:
+                changed = self._transition(
+                    row, "Open", f"{slow_rate:.0%} of the last {calls} calls took {config['slow_call_seconds']}s or more"
+                )
+        self._publish(provider, (calls, error_rate, slow_rate, avg_latency), force=changed)
+
+    def _transition(self, row, state, reason):
+        """Move row to state unless another worker changed it first; returns whether this call made the change."""
+        now = timezone.now()
+        reason = reason[:500]
+        with transaction.atomic():
+            changed = models.ProviderHealth.objects.filter(
+                pk=row.pk, state=row.state, changed_at=row.changed_at
+            ).update(state=state, changed_at=now, reason=reason, updated_at=now)
+            if changed:
+                models.ProviderStateChange.objects.create(
+                    provider=row.provider, from_state=row.state, to_state=state, reason=reason, changed_at=now
+                )
+        if changed:
+            row.state, row.changed_at, row.reason = state, now, reason
+        return bool(changed)
+
+    def _publish(self, provider, stats, force=False):
+        # The admin shows the window of whichever worker published last; good enough to see what the breaker sees.
+        now = time.monotonic()
+        if not force and now - self._published.get(provider, 0.0) < settings.PROVIDER_BREAKER['stats_interval']:
+            return
+        self._published[provider] = now
+        calls, error_rate, slow_rate, avg_latency = stats
+        models.ProviderHealth.objects.filter(provider=provider).update(
+            calls=calls, error_rate=error_rate, slow_rate=slow_rate, avg_latency=avg_latency, updated_at=timezone.now()
+        )
+
+
+router = Router()
@@ -0,0 +1,34 @@
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import catalog, middleware, models, reporting, site_config
+
+
+@receiver(connection_created)
+def time_queries(sender, connection, **kwargs):
+    # Installed on every connection rather than around each request, as async views run their queries
+    # on other threads with other connections. Outside a request the timings are dropped.
+    connection.execute_wrappers.append(middleware.time_query)
+
+
+@receiver([post_save, post_delete], sender=models.AdminInfo)
+def invalidate_admin_info(sender, **kwargs):
+    transaction.on_commit(site_config.invalidate)
+
+
+@receiver([post_save, post_delete], sender=models.BundlePrice)
+def invalidate_catalog(sender, **kwargs):
+    transaction.on_commit(catalog.invalidate)
+
+
+# Orders are deleted through the per-network proxies as well, and a signal is sent with the proxy as sender.
+# Listening to these models only keeps Django's fast delete path for every other model.
+@receiver(post_delete, sender=models.BundleOrder)
+@receiver(post_delete, sender=models.IShareBundleTransaction)
+@receiver(post_delete, sender=models.MTNTransaction)
+@receiver(post_delete, sender=models.BigTimeTransaction)
+@receiver(post_delete, sender=models.VodafoneTransaction)
+def remove_from_sales_rollups(sender, instance, **kwargs):
+    reporting.apply_changes([reporting.row(instance)], [])
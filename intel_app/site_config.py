@@ -0,0 +1,19 @@
+from django.conf import settings
+
+from . import models
+from .process_cache import ProcessCache
+
+_admin_info = ProcessCache(
+    'admin_info',
+    loader=lambda: models.AdminInfo.objects.filter().first(),
+    ttl=lambda: settings.ADMIN_INFO_CACHE_TTL,
+)
+
+
+def get_admin_info():
+    """Return the AdminInfo row without querying the database on every request."""
+    return _admin_info.get()
+
+
+def invalidate():
+    _admin_info.invalidate()
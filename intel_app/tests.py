@@ -1,3 +1,922 @@
-from django.test import TestCase
+import csv
+import hashlib
+import hmac
+import io
+import json
+import threading
+from datetime import date, timedelta
+from unittest import mock
 
-# Create your tests here.
+import requests
+from asgiref.sync import sync_to_async
+from decouple import config
+from django.conf import settings
+from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
+from django.db import DatabaseError, connection
+from django.db.migrations.executor import MigrationExecutor
+from django.db.models import Count, F, Sum
+from django.db.models.deletion import Collector
+from django.contrib.messages import get_messages
+from django.core.management import CommandError, call_command
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from openpyxl import load_workbook
+
+from . import (admin, catalog, exports, fulfillment, helper, models, notifier, payments, reconciliation, reporting,
+               routing, site_config, upstream, urls, views, wallet)
+
+FIXTURE_ROWS = 1000
+OTHER_USERS = 50
+
+
+def _paystack_signature(body):
+    return hmac.new(config("PAYSTACK_SECRET_KEY").encode('utf-8'), body, hashlib.sha512).hexdigest()
+
+
+def _webhook(test):
+    body = json.dumps({'event': 'charge.success', 'data': {'reference': 'WEBHOOK-REF', 'amount': 1000}}).encode()
+    return {'data': body, 'content_type': 'application/json', 'HTTP_X_PAYSTACK_SIGNATURE': _paystack_signature(body)}
+
+
+# (url name, method, args, user, request kwargs, maximum queries). args and request kwargs may be callables
+# taking the test case, for fixture ids. Logged-in requests include the session and user lookups.
+BUDGETS = [
+    ('home', 'get', (), None, {}, 0),
+    ('home', 'get', (), 'customer', {}, 2),
+    ('services', 'get', (), 'customer', {}, 2),
+    ('mtn', 'get', (), 'customer', {}, 2),
+    ('airtel-tigo', 'get', (), 'customer', {}, 2),
+    ('big_time', 'get', (), 'customer', {}, 2),
+    ('voda', 'get', (), 'customer', {}, 2),
+    ('afa', 'get', (), 'customer', {}, 2),
+    ('history', 'get', (), 'customer', {}, 2),
+    ('mtn-history', 'get', (), 'customer', {}, 2),
+    ('bt-history', 'get', (), 'customer', {}, 2),
+    ('voda-history', 'get', (), 'customer', {}, 2),
+    ('afa-history', 'get', (), 'customer', {}, 2),
+    ('history-data', 'get', ('mtn',), 'customer', {'data': {'length': 100}}, 3),
+    ('history-data', 'get', ('tigo',), 'customer', {'data': {'length': 100, 'search': '240000500'}}, 3),
+    ('history-data', 'get', ('afa',), 'customer', {'data': {'length': 100}}, 3),
+    ('verify_transaction', 'get', ('REF',), None, {}, 0),
+    ('mtn_admin', 'get', (), 'staff', {}, 2),
+    ('at_admin', 'get', (), 'staff', {}, 2),
+    ('bt_admin', 'get', (), 'staff', {}, 2),
+    ('afa_admin', 'get', (), 'staff', {}, 2),
+    ('voda_admin', 'get', (), 'staff', {}, 2),
+    ('staff-orders-data', 'get', ('mtn',), 'staff', {'data': {'length': 100}}, 3),
+    ('staff-orders-data', 'get', ('afa',), 'staff', {'data': {'length': 100, 'status': 'Pending'}}, 3),
+    ('mark_as_sent', 'get', lambda test: (test.orders['mtn'].pk,), 'staff', {}, 10),
+    ('at_mark_as_sent', 'get', lambda test: (test.orders['ishare'].pk,), 'staff', {}, 10),
+    ('bt_mark_as_sent', 'get', lambda test: (test.orders['bigtime'].pk,), 'staff', {}, 10),
+    ('voda_mark_as_sent', 'get', lambda test: (test.orders['voda'].pk,), 'staff', {}, 10),
+    ('afa_mark_as_sent', 'get', lambda test: (test.afa.pk,), 'staff', {}, 5),
+    ('afa_pay_with_wallet', 'post', (), 'customer', {'data': {
+        'phone': '0240000000', 'amount': '5', 'reference': 'AFA-REF', 'name': 'Ama', 'card': 'GHA-1',
+        'occupation': 'Trader', 'birth': '1990-01-01', 'locationz': 'Accra'}}, 9),
+    ('pay_with_wallet', 'post', (), 'customer', {'data': {'phone': '0270000000', 'amount': '10', 'reference': 'AT-REF'}}, 13),
+    ('mtn_pay_with_wallet', 'post', (), 'customer', {'data': {'phone': '0240000000', 'amount': '10', 'reference': 'MTN-REF'}}, 14),
+    ('big_time_pay_with_wallet', 'post', (), 'customer', {'data': {'phone': '0270000000', 'amount': '10', 'reference': 'BT-REF'}}, 14),
+    ('voda_pay_with_wallet', 'post', (), 'customer', {'data': {'phone': '0200000000', 'amount': '10', 'reference': 'VODA-REF'}}, 14),
+    ('credit_user', 'get', (), 'staff', {}, 2),
+    ('credit_user', 'post', (), 'staff', lambda test: {'data': {'user': test.customer.pk, 'amount': '20'}}, 8),
+    ('user-autocomplete', 'get', (), 'staff', {'data': {'term': 'user'}}, 3),
+    ('user-autocomplete', 'get', (), 'staff', {'data': {'term': '0250000', 'page': '2'}}, 3),
+    ('topup-info', 'get', (), 'customer', {}, 2),
+    ('topup-info', 'post', (), 'customer', {'data': {'amount': '20'}}, 3),
+    ('request_successful', 'get', ('REF',), 'customer', {}, 2),
+    ('topup_list', 'get', (), 'staff', {}, 3),
+    ('credit', 'get', lambda test: (test.topup.reference,), 'staff', {}, 11),
+    ('wallet_transactions', 'get', (), 'customer', {}, 3),
+    ('paystack_webhook', 'post', (), None, _webhook, 1),
+    ('metrics', 'get', (), 'staff', {}, 3),
+    ('login', 'get', (), None, {}, 0),
+    ('login', 'post', (), None, {'data': {'username': 'customer', 'pass': 'password'}}, 9),
+    ('signup', 'get', (), None, {}, 0),
+    ('signup', 'post', (), None, {'data': {
+        'first_name': 'Kofi', 'last_name': 'Mensah', 'username': 'kofi', 'email': 'kofi@example.com',
+        'phone': '0240000001', 'password1': 'a-long-password-1', 'password2': 'a-long-password-1'}}, 4),
+    ('logout', 'get', (), 'customer', {}, 4),
+]
+
+# Endpoints deliberately left out of the budgets, with the reason.
+UNBUDGETED = {
+    'delete': "deletes every user and everything they own; its cost is the size of the database by design",
+}
+
+
+class QueryBudgetTests(TestCase):
+    """
+    Every URL in intel_app/urls.py stays within a fixed number of queries against a realistically sized
+    database, so a change that adds a query or brings back a per-row lookup fails with the SQL it ran.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = models.CustomUser.objects.create_user(
+            username='customer', password='password', email='customer@example.com', phone=240000000, wallet=1000,
+        )
+        cls.staff = models.CustomUser.objects.create_user(
+            username='staff', password='password', email='staff@example.com', phone=240000001,
+            is_staff=True, is_superuser=True,
+        )
+        others = models.CustomUser.objects.bulk_create([
+            models.CustomUser(username=f'user{index}', email=f'user{index}@example.com', phone=250000000 + index)
+            for index in range(OTHER_USERS)
+        ])
+        models.AdminInfo.objects.create(name="Admin", phone_number=240000002, momo_number=240000003,
+                                        payment_channel="MTN Mobile Money", afa_price=5)
+        models.BundlePrice.objects.bulk_create([
+            models.BundlePrice(network=network, tier=tier, volume_mb=volume, price=volume / 100,
+                               purchase_price=volume / 110)
+            for network, _ in models.BundleOrder.networks
+            for tier, _ in models.BundlePrice.tiers
+            for volume in (500, 1000, 2000, 5000)
+        ])
+        cls.orders = {}
+        for model in (models.IShareBundleTransaction, models.MTNTransaction, models.BigTimeTransaction,
+                      models.VodafoneTransaction):
+            model.objects.bulk_create([
+                model(user=cls.customer, bundle_number=240000000 + index, offer="1000MB", amount=10,
+                      reference=f"{model.NETWORK[:2].upper()}{index:06d}")
+                for index in range(FIXTURE_ROWS)
+            ])
+            cls.orders[model.NETWORK] = model.objects.first()
+        models.AFARegistration.objects.bulk_create([
+            models.AFARegistration(user=cls.customer, phone_number=240000000 + index, gh_card_number="GHA-1",
+                                   name="Ama", amount=5, reference=f"AFA{index:06d}", date_of_birth=date(1990, 1, 1))
+            for index in range(FIXTURE_ROWS)
+        ])
+        cls.afa = models.AFARegistration.objects.first()
+        models.WalletTransactionn.objects.bulk_create([
+            models.WalletTransactionn(user=cls.customer, transaction_type="Debit", transaction_amount=10,
+                                      transaction_use="MTN Bundle Purchase", new_balance=1000 - index)
+            for index in range(FIXTURE_ROWS)
+        ])
+        models.TopUpRequest.objects.bulk_create([
+            models.TopUpRequest(user=others[index % OTHER_USERS], reference=f"TOPUP{index:06d}", amount=20)
+            for index in range(FIXTURE_ROWS)
+        ])
+        cls.topup = models.TopUpRequest.objects.first()
+
+    def setUp(self):
+        # Budgets are for warm processes: the price catalog and admin info are cached between requests.
+        site_config.invalidate()
+        catalog.invalidate()
+        site_config.get_admin_info()
+        catalog.get_catalog()
+
+    def assertQueryBudget(self, name, method, args, user, options, budget):
+        args = args(self) if callable(args) else args
+        options = options(self) if callable(options) else dict(options)
+        if user:
+            self.client.force_login(getattr(self, user))
+        url = reverse(name, args=args)
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, **options)
+        self.assertLess(response.status_code, 500, f"{method.upper()} {url} failed")
+        if len(queries) > budget:
+            statements = "\n".join(f"{number}. {query['sql']}" for number, query in enumerate(queries, 1))
+            self.fail(f"{method.upper()} {url} ran {len(queries)} queries, over its budget of {budget}:\n{statements}")
+
+    def test_query_budgets(self):
+        paystack = mock.AsyncMock(return_value=mock.Mock(json=lambda: {
+            'status': True, 'data': {'status': 'success', 'amount': 1000, 'reference': 'REF', 'paid_at': ''},
+        }))
+        # The purchase views run their transaction off-thread, on a connection outside this test's transaction.
+        with mock.patch.object(helper, 'averify_paystack_transaction', paystack), \
+                mock.patch.object(views, '_off_thread', sync_to_async):
+            for name, method, args, user, options, budget in BUDGETS:
+                with self.subTest(url=name, method=method, user=user):
+                    self.client.logout()
+                    self.assertQueryBudget(name, method, args, user, options, budget)
+
+    def test_every_url_has_a_budget(self):
+        names = {pattern.name for pattern in urls.urlpatterns if getattr(pattern, 'name', None)}
+        budgeted = {name for name, *_ in BUDGETS}
+        self.assertEqual(names - budgeted - set(UNBUDGETED), set())
+
+
+class TopUpTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = models.CustomUser.objects.create_user(
+            username='customer', password='password', email='customer@example.com', phone=240000000,
+        )
+        models.AdminInfo.objects.create(name="Admin", phone_number=240000002, payment_channel="MTN Mobile Money",
+                                        paystack_active=True)
+
+    def setUp(self):
+        site_config.invalidate()
+        self.client.force_login(self.customer)
+
+    def test_paystack_initialize_failure_shows_an_error(self):
+        bad_json = mock.Mock(json=mock.Mock(side_effect=ValueError("not JSON")))
+        failures = {
+            'connect timeout': mock.Mock(side_effect=requests.ConnectTimeout()),
+            'connection error': mock.Mock(side_effect=requests.ConnectionError()),
+            'deadline': mock.Mock(side_effect=upstream.DeadlineExceeded()),
+            'bad JSON': mock.Mock(return_value=bad_json),
+        }
+        for failure, initialize in failures.items():
+            with self.subTest(failure=failure), mock.patch.object(helper, 'initialize_paystack_transaction', initialize):
+                response = self.client.post(reverse('topup-info'), {'amount': '20'})
+                self.assertRedirects(response, reverse('topup-info'), fetch_redirect_response=False)
+                self.assertIn("error occurred while initializing payment",
+                              " ".join(str(message) for message in get_messages(response.wsgi_request)))
+        self.assertFalse(models.TopUpRequest.objects.exists())
+
+
+    def test_verify_transaction_uses_the_configured_key(self):
+        paystack = mock.Mock(get=mock.AsyncMock(return_value=_response(200, {'status': True, 'data': {
+            'status': 'success', 'amount': 2000, 'reference': 'REF', 'paid_at': '2026-01-01T00:00:00Z'}})))
+        with mock.patch.object(upstream, 'get_async_client', return_value=paystack):
+            response = self.client.get(reverse('verify_transaction', args=['REF']))
+        self.assertEqual(response.json(), {'status': 'success'})
+        self.assertEqual(paystack.get.call_args.kwargs['headers']['Authorization'],
+                         f'Bearer {config("PAYSTACK_SECRET_KEY")}')
+
+class ExportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = models.CustomUser.objects.create_user(
+            username='staff', password='password', email='staff@example.com', is_staff=True, is_superuser=True,
+        )
+        models.MTNTransaction.objects.bulk_create([
+            models.MTNTransaction(user=cls.staff, bundle_number=240000000 + index, offer="1500MB", amount=10.5,
+                                  reference=f"MT{index:06d}<&>")
+            for index in range(7)
+        ])
+
+    def export(self, action):
+        self.client.force_login(self.staff)
+        ids = models.MTNTransaction.objects.values_list('pk', flat=True)
+        # Several chunks, so rows from every keyset page must come out once and in order.
+        with mock.patch.object(exports, 'CHUNK_SIZE', 3):
+            response = self.client.post(reverse('admin:intel_app_mtntransaction_changelist'),
+                                        {'action': action, ACTION_CHECKBOX_NAME: list(ids)})
+            self.assertTrue(response.streaming)
+            self.assertFalse(response.is_async)
+            return self.rows(action, b"".join(response.streaming_content))
+
+    @staticmethod
+    def rows(action, content):
+        if action == 'stream_csv_export':
+            return list(csv.reader(io.StringIO(content.decode())))
+        return list(load_workbook(io.BytesIO(content)).active.iter_rows(values_only=True))
+
+    async def test_asgi_exports_are_async_iterators(self):
+        # A sync iterator would be read to the end before the first byte under ASGI.
+        await sync_to_async(self.async_client.force_login)(self.staff)
+        ids = await sync_to_async(list)(models.MTNTransaction.objects.values_list('pk', flat=True))
+        for action in ('stream_csv_export', 'stream_xlsx_export'):
+            with self.subTest(action=action), mock.patch.object(exports, 'CHUNK_SIZE', 3):
+                response = await self.async_client.post(reverse('admin:intel_app_mtntransaction_changelist'),
+                                                        {'action': action, ACTION_CHECKBOX_NAME: ids})
+                self.assertTrue(response.is_async)
+                content = b"".join([chunk async for chunk in response.streaming_content])
+                self.assertEqual(self.rows(action, content), await sync_to_async(self.export)(action))
+
+    def test_csv_export(self):
+        rows = self.export('stream_csv_export')
+        self.assertEqual(rows[0][:4], ['id', 'user__username', 'bundle_number', 'offer'])
+        self.assertEqual([row[5] for row in rows[1:]], [f"MT{index:06d}<&>" for index in range(7)])
+
+    def test_xlsx_export(self):
+        rows = self.export('stream_xlsx_export')
+        self.assertEqual(rows[0][:4], ('id', 'user__username', 'bundle_number', 'offer'))
+        self.assertEqual(len(rows), 8)
+        self.assertEqual(rows[1][1:6], ('staff', 240000000, '1.5', 10.5, 'MT000000<&>'))
+        self.assertEqual([row[5] for row in rows[1:]], [f"MT{index:06d}<&>" for index in range(7)])
+
+
+class SalesRollupTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = models.CustomUser.objects.create_user(username='customer', password='password')
+        cls.other = models.CustomUser.objects.create_user(username='other', password='password')
+        for model, user in ((models.MTNTransaction, cls.customer), (models.IShareBundleTransaction, cls.other),
+                            (models.VodafoneTransaction, cls.customer)):
+            for index in range(3):
+                model.objects.create(user=user, bundle_number=240000000 + index, offer="1000MB", amount=5 + index,
+                                     reference=f"{model.NETWORK}{index}", tier="User", volume_mb=1000, cost=4)
+
+    def assertRollupsMatchOrders(self):
+        orders = {
+            (row['network'], row['transaction_status']): (row['orders'], row['revenue'])
+            for row in models.BundleOrder.objects.values('network', 'transaction_status')
+            .annotate(orders=Count('id'), revenue=Sum('amount')).order_by()
+        }
+        for rollup in (models.HourlySales, models.DailySales):
+            totals = {
+                (row['network'], row['status']): (row['count'], row['total'])
+                for row in rollup.objects.values('network', 'status')
+                .annotate(count=Sum('orders'), total=Sum('revenue')).order_by() if row['count']
+            }
+            self.assertEqual(totals, orders, rollup.__name__)
+
+    def test_only_orders_lose_the_fast_delete_path(self):
+        collector = Collector(using='default')
+        for model in (models.WalletTransactionn, models.SMSOutbox, models.TopUpRequest, models.AFARegistration):
+            self.assertTrue(collector.can_fast_delete(model.objects.all()), model.__name__)
+
+    def test_deletes(self):
+        self.assertRollupsMatchOrders()
+        models.MTNTransaction.objects.filter(reference='mtn0').delete()
+        models.BundleOrder.objects.get(reference='voda1').delete()
+        self.assertRollupsMatchOrders()
+        self.other.delete()
+        self.assertFalse(models.BundleOrder.objects.filter(network='ishare').exists())
+        self.assertRollupsMatchOrders()
+
+    def test_status_updates(self):
+        order = models.MTNTransaction.objects.get(reference='mtn0')
+        order.transaction_status = 'Completed'
+        order.save()
+        self.assertRollupsMatchOrders()
+        models.BundleOrder.objects.filter(network__in=['mtn', 'voda']).update(transaction_status='Processing')
+        self.assertRollupsMatchOrders()
+        admin.refund_selected(models.VodafoneTransaction.objects.filter(reference__in=['voda0', 'voda1']), 'Refund')
+        self.assertRollupsMatchOrders()
+
+    def test_updates_read_the_orders_once(self):
+        orders = models.BundleOrder.objects.filter(network='mtn')
+        with CaptureQueriesContext(connection) as queries:
+            orders.update(transaction_status='Completed', amount='12.5')
+        self.assertEqual(sum('FROM "intel_app_bundleorder"' in query['sql'] for query in queries), 1)
+        self.assertRollupsMatchOrders()
+        # Values computed by the database are read back after the update.
+        orders.update(amount=F('amount') * 2)
+        self.assertRollupsMatchOrders()
+
+    def test_rebuild_matches_the_incremental_rollups(self):
+        models.MTNTransaction.objects.filter(reference='mtn1').update(transaction_status='Completed')
+        models.BundleOrder.objects.filter(reference='voda0').delete()
+        models.BundleOrder.objects.filter(reference='ishare2').update(volume_mb=None)
+        incremental = {model: list(model.objects.filter(orders__gt=0).order_by('bucket', 'network', 'status')
+                                   .values_list('bucket', 'network', 'tier', 'status', 'orders', 'revenue', 'cost'))
+                       for model in (models.HourlySales, models.DailySales)}
+        self.assertEqual(reporting.rebuild(chunk_size=2), 8)
+        for model, rows in incremental.items():
+            self.assertEqual(list(model.objects.order_by('bucket', 'network', 'status')
+                                  .values_list('bucket', 'network', 'tier', 'status', 'orders', 'revenue', 'cost')),
+                             rows)
+        self.assertEqual(models.BundleOrder.objects.get(reference='ishare2').volume_mb, 1000)
+        self.assertRollupsMatchOrders()
+
+
+def _response(status_code, body):
+    json_method = mock.Mock(side_effect=ValueError("not JSON")) if body is None else mock.Mock(return_value=body)
+    return mock.Mock(status_code=status_code, json=json_method, text="<html>" if body is None else json.dumps(body))
+
+
+class ReconciliationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = models.CustomUser.objects.create_user(username='customer', password='password', wallet=0)
+        cls.order = models.IShareBundleTransaction.objects.create(
+            user=cls.customer, bundle_number=270000000, offer="1000MB", amount=5, reference="STALE1",
+            transaction_status="Processing", provider="Value4Moni", claimed_at=timezone.now() - timedelta(hours=1),
+        )
+
+    def status(self, status_code, body):
+        with mock.patch.object(helper, 'value_for_moni_transaction_status', return_value=_response(status_code, body)):
+            return reconciliation.provider_status(self.order)
+
+    def test_provider_status(self):
+        answers = [
+            (404, None, "pending"),
+            (404, {'detail': "Not Found"}, "pending"),
+            (404, {'message': "Not Found"}, "pending"),
+            (404, {'status': "error", 'message': "Transaction not found"}, "missing"),
+            (200, {'status': "not_found"}, "missing"),
+            (200, {'data': {'status': "failed", 'message': "Reference does not exist"}}, "missing"),
+            (200, {'status': "Successful"}, "delivered"),
+            (200, {'data': {'status': "Failed"}}, "failed"),
+            (200, {'status': "Processing"}, "pending"),
+            (500, {'status': "not_found"}, "pending"),
+            (200, None, "pending"),
+        ]
+        for status_code, body, expected in answers:
+            with self.subTest(status_code=status_code, body=body):
+                self.assertEqual(self.status(status_code, body), expected)
+
+    def test_unexplained_404_leaves_the_order_processing(self):
+        with mock.patch.object(helper, 'value_for_moni_transaction_status', return_value=_response(404, None)):
+            answers, changed = reconciliation.reconcile()
+        self.assertEqual(answers, {'pending': 1})
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.transaction_status, "Processing")
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.wallet, 0)
+
+
+    def test_command_refuses_to_run_until_enabled(self):
+        status = mock.Mock(return_value=_response(200, {'status': "Failed"}))
+        with mock.patch.object(helper, 'value_for_moni_transaction_status', status):
+            with self.assertRaisesMessage(CommandError, "RECONCILE_ENABLED"):
+                call_command('reconcile_orders', '--once')
+            status.assert_not_called()
+            call_command('reconcile_orders', '--stats', stdout=io.StringIO())
+            with self.settings(RECONCILE_ENABLED=True):
+                call_command('reconcile_orders', '--once', stdout=io.StringIO())
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.transaction_status, "Canceled and Refunded")
+
+@mock.patch.object(fulfillment, 'close_old_connections', mock.Mock())
+class DeliveryTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = models.CustomUser.objects.create_user(username='customer', password='password', wallet=0,
+                                                             phone=240000000)
+        cls.order = models.IShareBundleTransaction.objects.create(
+            user=cls.customer, bundle_number=270000000, offer="1000MB", amount=5, reference="DELIVER1",
+            transaction_status="Processing", provider="Value4Moni", queued_at=timezone.now(),
+            claimed_at=timezone.now(),
+        )
+
+    def dispatch(self, status_code, body):
+        order = models.IShareBundleTransaction.objects.select_related('user').get(pk=self.order.pk)
+        with mock.patch.object(helper, 'value_for_moni_send_bundle', return_value=_response(status_code, body)):
+            return fulfillment.dispatch_order(order)
+
+    def refunds(self):
+        return models.WalletTransactionn.objects.filter(user=self.customer, transaction_use='AT Bundle Refund')
+
+    def test_rejection_is_refunded_without_a_retry(self):
+        for status_code, body in ((200, {'code': "400", 'message': "Invalid number"}), (400, {'error': "bad"})):
+            with self.subTest(status_code=status_code):
+                models.IShareBundleTransaction.objects.filter(pk=self.order.pk).update(
+                    transaction_status="Processing", attempts=0)
+                models.DeliveryAttempt.objects.all().delete()
+                self.refunds().delete()
+                self.assertIs(self.dispatch(status_code, body), False)
+                order = models.IShareBundleTransaction.objects.get(pk=self.order.pk)
+                self.assertEqual(order.transaction_status, "Canceled and Refunded")
+                self.assertEqual(order.attempts, 1)
+                self.assertEqual(self.refunds().count(), 1)
+
+    def test_server_errors_are_retried_then_refunded_once(self):
+        for attempt in range(1, settings.DELIVERY_MAX_ATTEMPTS):
+            self.assertEqual(self.dispatch(503, None), fulfillment.RETRY)
+            order = models.IShareBundleTransaction.objects.get(pk=self.order.pk)
+            self.assertEqual((order.transaction_status, order.attempts), ("Pending", attempt))
+            self.assertGreater(order.next_attempt_at, timezone.now())
+            self.assertFalse(self.refunds().exists())
+            # The worker claims it again once next_attempt_at has passed.
+            models.IShareBundleTransaction.objects.filter(pk=self.order.pk).update(
+                transaction_status="Processing", claimed_at=timezone.now())
+        self.assertIs(self.dispatch(503, None), False)
+        order = models.IShareBundleTransaction.objects.get(pk=self.order.pk)
+        self.assertEqual(order.transaction_status, "Canceled and Refunded")
+        self.assertEqual(order.delivery_attempts.count(), settings.DELIVERY_MAX_ATTEMPTS)
+        self.assertEqual(self.refunds().count(), 1)
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.wallet, 5)
+
+    def test_order_refunded_during_a_server_error_is_not_requeued(self):
+        order = models.IShareBundleTransaction.objects.select_related('user').get(pk=self.order.pk)
+
+        def refund_then_fail(*args):
+            admin.refund_selected(models.IShareBundleTransaction.objects.filter(pk=order.pk), 'Transaction Refund')
+            return _response(503, None)
+
+        with mock.patch.object(helper, 'value_for_moni_send_bundle', side_effect=refund_then_fail):
+            self.assertIsNone(fulfillment.dispatch_order(order))
+        order.refresh_from_db()
+        self.assertEqual(order.transaction_status, "Canceled and Refunded")
+        self.assertFalse(fulfillment.queued_orders().exists())
+
+    def test_answer_after_a_staff_refund_changes_nothing(self):
+        for status_code, body in ((200, {'code': "200"}), (400, {'error': "bad"})):
+            with self.subTest(status_code=status_code):
+                models.IShareBundleTransaction.objects.filter(pk=self.order.pk).update(
+                    transaction_status="Processing", attempts=0)
+                models.DeliveryAttempt.objects.all().delete()
+                models.WalletTransactionn.objects.all().delete()
+                order = models.IShareBundleTransaction.objects.select_related('user').get(pk=self.order.pk)
+
+                def refund_then_answer(*args):
+                    admin.refund_selected(models.IShareBundleTransaction.objects.filter(pk=order.pk),
+                                          'Transaction Refund')
+                    return _response(status_code, body)
+
+                with mock.patch.object(helper, 'value_for_moni_send_bundle', side_effect=refund_then_answer), \
+                        mock.patch.object(fulfillment.notifier, 'send_many') as send_many:
+                    self.assertIsNone(fulfillment.dispatch_order(order))
+                order.refresh_from_db()
+                self.assertEqual(order.transaction_status, "Canceled and Refunded")
+                self.assertEqual(models.WalletTransactionn.objects.filter(user=self.customer).count(), 1)
+                send_many.assert_not_called()
+
+    def test_connection_never_opened_is_retried(self):
+        error = requests.ConnectTimeout("connect timed out")
+        order = models.IShareBundleTransaction.objects.select_related('user').get(pk=self.order.pk)
+        with mock.patch.object(helper, 'value_for_moni_send_bundle', side_effect=error):
+            self.assertEqual(fulfillment.dispatch_order(order), fulfillment.RETRY)
+        self.assertFalse(self.refunds().exists())
+
+
+class PageCacheTests(TestCase):
+
+    def test_clear_page_cache_refuses_a_process_local_cache(self):
+        # It would only bump this process's LocMemCache and leave the web workers' pages cached.
+        with self.assertRaisesMessage(CommandError, "REDIS_URL is not set"):
+            call_command('clear_page_cache')
+
+
+class PaystackEventTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = models.CustomUser.objects.create_user(username='customer', password='password', wallet=0,
+                                                             phone=240000000)
+
+    def webhook(self, reference, amount=20):
+        body = json.dumps({'event': 'charge.success', 'data': {
+            'reference': reference, 'amount': int(amount * 101),
+            'metadata': {'channel': 'topup', 'user_id': self.customer.pk, 'real_amount': str(amount)},
+        }}).encode()
+        response = self.client.post(reverse('paystack_webhook'), body, content_type='application/json',
+                                    HTTP_X_PAYSTACK_SIGNATURE=_paystack_signature(body))
+        self.assertEqual(response.status_code, 200)
+
+    def credits(self):
+        return models.WalletTransactionn.objects.filter(user=self.customer, transaction_use='Wallet Topup (Paystack)')
+
+    def test_redelivered_webhook_credits_once(self):
+        self.webhook('TOPUP-1')
+        self.webhook('TOPUP-1')
+        self.assertEqual(payments.process_batch(10), (1, 1, 0))
+        self.webhook('TOPUP-1')
+        self.assertEqual(payments.process_batch(10), (0, 0, 0))
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.wallet, 20)
+        self.assertEqual(self.credits().count(), 1)
+        self.assertTrue(models.TopUpRequest.objects.get(reference='TOPUP-1').status)
+
+    def test_failed_event_is_logged_and_backed_off(self):
+        self.webhook('TOPUP-2')
+        with mock.patch.object(wallet, 'credit_many', side_effect=DatabaseError("connection lost")), \
+                self.assertLogs('intel_app.payments', 'ERROR') as logs:
+            self.assertEqual(payments.process_batch(10), (1, 0, 1))
+        self.assertIn("connection lost", "\n".join(logs.output))
+        event = models.PaystackEvent.objects.get(reference='TOPUP-2')
+        self.assertEqual((event.status, event.attempts), ("Pending", 1))
+        self.assertGreater(event.next_attempt_at, timezone.now())
+        # Not picked up again until its backoff has passed.
+        self.assertEqual(payments.process_batch(10), (0, 0, 0))
+        models.PaystackEvent.objects.filter(pk=event.pk).update(next_attempt_at=timezone.now())
+        self.assertEqual(payments.process_batch(10), (1, 1, 0))
+        self.assertEqual(self.credits().count(), 1)
+
+
+class WalletTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.customer = models.CustomUser.objects.create_user(username='customer', password='password', wallet=10)
+        cls.other = models.CustomUser.objects.create_user(username='other', password='password', wallet=0)
+
+    def test_insufficient_funds(self):
+        with self.assertRaises(wallet.InsufficientFunds):
+            wallet.debit(self.customer, 15, 'Bundle Purchase')
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.wallet, 10)
+        self.assertFalse(models.WalletTransactionn.objects.exists())
+
+        self.assertEqual(wallet.debit(self.customer, 10, 'Bundle Purchase'), 0)
+        self.assertEqual(list(models.WalletTransactionn.objects.values_list('transaction_type', 'new_balance')),
+                         [('Debit', 0)])
+
+    def test_refund_selected_totals_per_user(self):
+        orders = {}
+        for user, amounts in ((self.customer, (5, 7, 11)), (self.other, (3, 4))):
+            for index, amount in enumerate(amounts):
+                orders[user.username, index] = models.MTNTransaction.objects.create(
+                    user=user, bundle_number=240000000, offer="1000MB", amount=amount,
+                    reference=f"{user.username}{index}")
+        models.BundleOrder.objects.filter(pk=orders['customer', 2].pk).update(
+            transaction_status='Canceled and Refunded')
+
+        queryset = models.MTNTransaction.objects.all()
+        self.assertEqual(admin.refund_selected(queryset, 'Transaction Refund'), 4)
+        self.assertEqual(admin.refund_selected(queryset, 'Transaction Refund'), 0)
+
+        self.customer.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertEqual((self.customer.wallet, self.other.wallet), (22, 7))
+        ledger = models.WalletTransactionn.objects.filter(transaction_use='Transaction Refund')
+        self.assertEqual(sorted(ledger.filter(user=self.customer).values_list('transaction_amount', 'new_balance')),
+                         [(5, 15), (7, 22)])
+        self.assertEqual(sorted(ledger.filter(user=self.other).values_list('transaction_amount', 'new_balance')),
+                         [(3, 3), (4, 7)])
+        self.assertFalse(models.BundleOrder.objects.exclude(transaction_status='Canceled and Refunded').exists())
+
+
+class ConcurrentDebitTests(TransactionTestCase):
+
+    def test_concurrent_debits_never_overdraw(self):
+        customer = models.CustomUser.objects.create_user(username='customer', password='password', wallet=50)
+        start = threading.Barrier(8)
+        results = []
+
+        def buy():
+            start.wait()
+            try:
+                results.append(wallet.debit(models.CustomUser.objects.get(pk=customer.pk), 10, 'Bundle Purchase'))
+            except wallet.InsufficientFunds:
+                results.append(None)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=buy) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(balance for balance in results if balance is not None), [0, 10, 20, 30, 40])
+        self.assertEqual(results.count(None), 3)
+        customer.refresh_from_db()
+        self.assertEqual(customer.wallet, 0)
+        self.assertEqual(sorted(models.WalletTransactionn.objects.filter(user=customer)
+                                .values_list('new_balance', flat=True)), [0, 10, 20, 30, 40])
+
+
+class PurchaseViewTests(TransactionTestCase):
+
+    def setUp(self):
+        self.customer = models.CustomUser.objects.create_user(username='customer', password='password', wallet=15,
+                                                              phone=240000000)
+        models.AdminInfo.objects.create(name="Admin", phone_number=240000002, payment_channel="MTN Mobile Money")
+        models.BundlePrice.objects.create(network="ishare", tier="User", volume_mb=1000, price=10, purchase_price=9)
+        site_config.invalidate()
+        catalog.invalidate()
+
+    def buy(self, reference):
+        return self.client.post(reverse('pay_with_wallet'), {'phone': '0270000000', 'amount': '10',
+                                                             'reference': reference})
+
+    def test_purchase(self):
+        self.assertRedirects(self.buy('AT-1'), f"{reverse('login')}?next={reverse('pay_with_wallet')}",
+                             fetch_redirect_response=False)
+        self.client.force_login(self.customer)
+        self.assertEqual(self.buy('AT-1').json()['icon'], 'success')
+        self.assertIn("wallet balance is low", self.buy('AT-2').json()['status'])
+
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.wallet, 5)
+        order = models.IShareBundleTransaction.objects.get()
+        self.assertEqual((order.reference, order.amount, order.transaction_status), ('AT-1', 10, 'Pending'))
+        self.assertIsNotNone(order.queued_at)
+        self.assertEqual(models.WalletTransactionn.objects.filter(user=self.customer).count(), 1)
+
+
+class CatalogTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = models.CustomUser.objects.create_user(username='staff', password='password', is_staff=True,
+                                                          is_superuser=True)
+
+    def setUp(self):
+        self.now = timezone.now()
+        catalog.invalidate()
+
+    def price(self, volume, price, minutes, active=True):
+        return models.BundlePrice.objects.create(network="mtn", tier="User", volume_mb=volume, price=price,
+                                                 effective_from=self.now + timedelta(minutes=minutes), active=active)
+
+    def listed(self, current):
+        return [(offer.volume, offer.price) for offer in current.offers("mtn", "User")]
+
+    def test_superseded_prices_are_honoured_for_the_grace_period(self):
+        self.price(1000, 5, -60)
+        self.price(1000, 6, -1)
+        self.price(2000, 9, -60)
+        self.price(2000, 10, -30)
+        self.price(3000, 12, -60)
+        self.price(3000, 12, -1, active=False)
+        current = catalog.build_catalog()
+
+        self.assertEqual(self.listed(current), [(1000, 6), (2000, 10)])
+        # Replaced a minute ago, so a page rendered before the change can still buy at the old price.
+        self.assertEqual(current.get_offer("mtn", "User", 5).volume, 1000)
+        self.assertEqual(current.get_offer("mtn", "User", 12).volume, 3000)
+        self.assertIsNone(current.get_offer("mtn", "User", 9))
+        with mock.patch('django.utils.timezone.now',
+                        return_value=self.now + timedelta(seconds=settings.PRICE_GRACE_PERIOD)):
+            self.assertIsNone(current.get_offer("mtn", "User", 5))
+            self.assertIsNone(current.get_offer("mtn", "User", 12))
+
+    def test_scheduled_price_takes_effect_without_an_invalidation(self):
+        self.price(1000, 5, -60)
+        scheduled = self.price(1000, 7, 10)
+        current = catalog.get_catalog()
+        self.assertEqual(self.listed(current), [(1000, 5)])
+        self.assertEqual(current.next_change, scheduled.effective_from)
+
+        with mock.patch('django.utils.timezone.now', return_value=self.now + timedelta(minutes=11)):
+            current = catalog.get_catalog()
+            self.assertEqual(self.listed(current), [(1000, 7)])
+            self.assertIsNone(current.next_change)
+            self.assertEqual(current.get_offer("mtn", "User", 5).volume, 1000)
+
+    def test_admin_edits_only_the_version_in_effect(self):
+        old = self.price(1000, 5, -60)
+        current = self.price(1000, 6, -30)
+        self.client.force_login(self.staff)
+
+        response = self.client.post(reverse('admin:intel_app_bundleprice_change', args=[old.pk]), {
+            'price': '4', 'effective_from_0': f"{self.now:%Y-%m-%d}", 'effective_from_1': f"{self.now:%H:%M:%S}",
+            'active': 'on',
+        })
+        self.assertEqual(response.status_code, 403)
+
+        response = self.client.post(reverse('admin:intel_app_bundleprice_change', args=[current.pk]), {
+            'network': 'voda', 'volume_mb': '2000', 'price': '7', 'purchase_price': '6',
+            'effective_from_0': f"{current.effective_from:%Y-%m-%d}",
+            'effective_from_1': f"{current.effective_from:%H:%M:%S}", 'active': 'on',
+        })
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(list(models.BundlePrice.objects.order_by('effective_from').values_list(
+            'network', 'volume_mb', 'price')), [('mtn', 1000, 5), ('mtn', 1000, 6), ('mtn', 1000, 7)])
+        self.assertEqual(self.listed(catalog.get_catalog()), [(1000, 7)])
+
+
+class PriceMigrationTests(TransactionTestCase):
+    before = [('intel_app', '0027_bundle_order_proxies')]
+    after = [('intel_app', '0028_bundleprice')]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_prices_are_copied_and_restored(self):
+        apps = self.migrate(self.before)
+        mtn = apps.get_model('intel_app', 'MTNBundlePrice')
+        mtn.objects.create(bundle_volume=1000, price=5)
+        mtn.objects.create(bundle_volume=1000, price=6)
+        mtn.objects.create(bundle_volume=2000, price=9)
+        apps.get_model('intel_app', 'SuperAgentVodaBundlePrice').objects.create(bundle_volume=1000, price=4,
+                                                                               purchase_price=3)
+
+        apps = self.migrate(self.after)
+        prices = apps.get_model('intel_app', 'BundlePrice').objects
+        self.assertEqual(prices.count(), 4)
+        # Of two rows for one volume the later one is the version in effect.
+        self.assertEqual(prices.filter(network='mtn', volume_mb=1000).latest('effective_from').price, 6)
+        self.assertEqual(list(prices.filter(network='voda').values_list('tier', 'price', 'purchase_price')),
+                         [('Super Agent', 4, 3)])
+        prices.create(network='mtn', tier='User', volume_mb=2000, price=8)
+
+        apps = self.migrate(self.before)
+        self.assertEqual(sorted(apps.get_model('intel_app', 'MTNBundlePrice').objects.values_list(
+            'bundle_volume', 'price')), [(1000, 6), (2000, 8)])
+        self.assertEqual(list(apps.get_model('intel_app', 'SuperAgentVodaBundlePrice').objects.values_list(
+            'bundle_volume', 'price', 'purchase_price')), [(1000, 4, 3)])
+
+
+class RouterTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.info = models.AdminInfo.objects.create(name="Admin", phone_number=240000002,
+                                                   payment_channel="MTN Mobile Money", ishare_source="Value4Moni")
+
+    def setUp(self):
+        site_config.invalidate()
+        self.router = routing.Router()
+        self.health = self.router.health()
+
+    def state(self, provider):
+        return models.ProviderHealth.objects.get(provider=provider).state
+
+    def set_state(self, provider, state, seconds_ago=0):
+        models.ProviderHealth.objects.filter(provider=provider).update(
+            state=state, changed_at=timezone.now() - timedelta(seconds=seconds_ago))
+
+    def transitions(self, provider):
+        return list(models.ProviderStateChange.objects.filter(provider=provider).order_by('changed_at')
+                    .values_list('from_state', 'to_state'))
+
+    def test_opens_on_the_error_rate_once_there_are_enough_calls(self):
+        min_calls = settings.PROVIDER_BREAKER['min_calls']
+        for _ in range(min_calls - 1):
+            self.router.record("Value4Moni", 1, ok=False, error="HTTP 503")
+        self.assertEqual(self.state("Value4Moni"), "Closed")
+        self.router.record("Value4Moni", 1, ok=False, error="HTTP 503")
+        self.assertEqual(self.state("Value4Moni"), "Open")
+        self.assertEqual(self.transitions("Value4Moni"), [("Closed", "Open")])
+
+    def test_opens_on_the_slow_call_rate(self):
+        slow = settings.PROVIDER_BREAKER['slow_call_seconds']
+        for index in range(settings.PROVIDER_BREAKER['min_calls']):
+            self.router.record("Value4Moni", slow if index % 2 else 1, ok=True)
+        self.assertEqual(self.state("Value4Moni"), "Open")
+        self.assertIn(f"took {slow}s or more", models.ProviderHealth.objects.get(provider="Value4Moni").reason)
+
+    def test_sends_one_trial_order_after_the_cooldown(self):
+        cooldown = settings.PROVIDER_BREAKER['cooldown']
+        self.set_state("Value4Moni", "Open")
+        self.assertEqual(self.router.choose(), ("Gyasi", None))
+        self.set_state("Value4Moni", "Open", seconds_ago=cooldown)
+        self.assertEqual(self.router.choose(), ("Value4Moni", 1))
+        self.assertEqual(self.state("Value4Moni"), "Half-open")
+        # Only one trial is in flight; the next batch fails over.
+        self.assertEqual(self.router.choose(), ("Gyasi", None))
+
+    def test_trial_order_closes_or_reopens_the_breaker(self):
+        self.set_state("Value4Moni", "Half-open")
+        self.router.record("Value4Moni", 1, ok=True)
+        self.assertEqual(self.state("Value4Moni"), "Closed")
+        # Calls from before the breaker closed are not counted again.
+        self.router.record("Value4Moni", 1, ok=False, error="HTTP 503")
+        self.assertEqual(self.state("Value4Moni"), "Closed")
+
+        self.set_state("Gyasi", "Half-open")
+        self.router.record("Gyasi", 1, ok=False, error="HTTP 503")
+        self.assertEqual(self.state("Gyasi"), "Open")
+        self.assertEqual(self.transitions("Value4Moni"), [("Half-open", "Closed")])
+        self.assertEqual(self.transitions("Gyasi"), [("Half-open", "Open")])
+
+    def test_failover(self):
+        self.assertEqual(self.router.choose(), ("Value4Moni", None))
+        self.set_state("Value4Moni", "Open")
+        self.assertEqual(self.router.choose(), ("Gyasi", None))
+        self.set_state("Gyasi", "Open")
+        self.assertEqual(self.router.choose(), (None, 0))
+
+    def test_without_failover_the_preferred_provider_is_always_used(self):
+        models.AdminInfo.objects.filter(pk=self.info.pk).update(ishare_failover=False)
+        site_config.invalidate()
+        for state in ("Open", "Half-open", "Closed"):
+            self.set_state("Value4Moni", state)
+            self.assertEqual(self.router.choose(), ("Value4Moni", None))
+
+
+class SMSOutboxTests(TestCase):
+
+    def outbox(self):
+        return models.SMSOutbox.objects.order_by('id')
+
+    def test_dedupe_key_collapses_repeats(self):
+        notifier.send_sms("+233240000000", "Order placed", dedupe_key="order:1")
+        notifier.send_sms("0240000000", "Order placed again", dedupe_key="order:1")
+        notifier.send_many([("240000000", "Order placed", "order:1"), ("240000001", "Other order", "order:2"),
+                            (None, "No recipient", "order:3")])
+        notifier.send_sms("0240000000", "No key")
+        notifier.send_sms("0240000000", "No key")
+        self.assertEqual(list(self.outbox().values_list('recipient', 'message')), [
+            ("0240000000", "Order placed"), ("0240000001", "Other order"), ("0240000000", "No key"),
+            ("0240000000", "No key"),
+        ])
+
+    def test_claimed_messages_are_leased(self):
+        notifier.send_many([(240000000 + index, "Hello", None) for index in range(3)])
+        models.SMSOutbox.objects.filter(pk=self.outbox().last().pk).update(status="Sent")
+        self.assertEqual(len(notifier.claim_batch(10)), 2)
+        self.assertEqual(notifier.claim_batch(10), [])
+        # A worker that died mid-batch leaves its messages to be claimed again once the lease is over.
+        with mock.patch('django.utils.timezone.now', return_value=timezone.now() + notifier.CLAIM_LEASE):
+            self.assertEqual(len(notifier.claim_batch(10)), 2)
+
+    def test_failures_back_off_until_the_last_attempt(self):
+        notifier.send_sms("0240000000", "Hello")
+        limiter = notifier.RateLimiter(0)
+        with mock.patch.object(notifier, 'deliver', side_effect=requests.RequestException("503: busy")):
+            for attempt in range(1, settings.SMS_MAX_ATTEMPTS):
+                self.assertEqual(notifier.send_batch(list(self.outbox()), limiter), (0, 1))
+                sms = self.outbox().get()
+                self.assertEqual((sms.status, sms.attempts, sms.last_error), ("Pending", attempt, "503: busy"))
+                backoff = settings.SMS_RETRY_BACKOFF * 2 ** (attempt - 1)
+                self.assertAlmostEqual((sms.next_attempt_at - timezone.now()).total_seconds(), backoff, delta=5)
+            notifier.send_batch(list(self.outbox()), limiter)
+        self.assertEqual(self.outbox().get().status, "Failed")
+
+        notifier.send_sms("0240000001", "Hello")
+        arkesel = mock.Mock(get=mock.Mock(return_value=_response(200, {'code': "ok"})))
+        with mock.patch.object(upstream, 'get_client', return_value=arkesel):
+            self.assertEqual(notifier.send_batch(list(self.outbox().filter(status="Pending")), limiter), (1, 0))
+        sms = self.outbox().get(status="Sent")
+        self.assertIsNotNone(sms.sent_at)
+        self.assertEqual(arkesel.get.call_args.kwargs['params']['api_key'], settings.ARKESEL_API_KEY)
+
+    def test_rate_limiter_spaces_out_messages(self):
+        with mock.patch.object(notifier.time, 'monotonic', return_value=100.0), \
+                mock.patch.object(notifier.time, 'sleep') as sleep:
+            limiter = notifier.RateLimiter(10)
+            for _ in range(3):
+                limiter.wait()
+        self.assertEqual([round(call.args[0], 6) for call in sleep.call_args_list], [0.1, 0.2])
@@ -0,0 +1,167 @@
+import asyncio
+import threading
+import time
+import weakref
+
+import httpx
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+from . import metrics
+
+
+class DeadlineExceeded(requests.Timeout):
+    pass
+
+
+class ProviderClient:
+    """Keep-alive session for one upstream provider with timeouts and usage counters."""
+
+    def __init__(self, name, base_url, connect_timeout=3.05, read_timeout=20, deadline=30, pool_size=10):
+        self.name = name
+        self.base_url = base_url.rstrip('/')
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.deadline = deadline
+        self.adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session = requests.Session()
+        self.session.mount('https://', self.adapter)
+        self.session.mount('http://', self.adapter)
+        self._init_counters()
+
+    def _init_counters(self):
+        self._lock = threading.Lock()
+        self.counters = {
+            'requests': 0,
+            'errors': 0,
+            'timeouts': 0,
+            'latency_seconds_total': 0.0,
+            'latency_seconds_max': 0.0,
+        }
+
+    def _record(self, elapsed, error=False, timeout=False):
+        with self._lock:
+            self.counters['requests'] += 1
+            self.counters['errors'] += error
+            self.counters['timeouts'] += timeout
+            self.counters['latency_seconds_total'] += elapsed
+            self.counters['latency_seconds_max'] = max(self.counters['latency_seconds_max'], elapsed)
+        metrics.record_upstream(self.name, elapsed)
+
+    def request(self, method, path, deadline=None, **kwargs):
+        # requests only bounds each socket operation, so the body is read in chunks and the
+        # whole exchange is abandoned once the deadline budget is spent.
+        budget = self.deadline if deadline is None else deadline
+        start = time.monotonic()
+        expires = start + budget
+        timeout = (min(self.connect_timeout, budget), min(self.read_timeout, budget))
+        try:
+            response = self.session.request(method, f"{self.base_url}{path}", timeout=timeout, stream=True, **kwargs)
+            chunks = []
+            for chunk in response.iter_content(8192):
+                chunks.append(chunk)
+                if time.monotonic() > expires:
+                    response.close()
+                    raise DeadlineExceeded(f"{self.name} did not respond within {budget}s")
+            response._content = b''.join(chunks)
+        except requests.Timeout:
+            self._record(time.monotonic() - start, error=True, timeout=True)
+            raise
+        except requests.RequestException:
+            self._record(time.monotonic() - start, error=True)
+            raise
+        self._record(time.monotonic() - start, error=response.status_code >= 500)
+        return response
+
+    def get(self, path, **kwargs):
+        return self.request('GET', path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request('POST', path, **kwargs)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self.counters)
+        connections = requests_sent = 0
+        pools = self.adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools[key]
+            connections += pool.num_connections
+            requests_sent += pool.num_requests
+        stats['connections_opened'] = connections
+        stats['connections_reused'] = max(requests_sent - connections, 0)
+        return stats
+
+
+class AsyncProviderClient(ProviderClient):
+    """httpx counterpart of ProviderClient for async views, bound to the event loop it was created on."""
+
+    def __init__(self, name, base_url, connect_timeout=3.05, read_timeout=20, deadline=30, pool_size=10):
+        self.name = name
+        self.base_url = base_url.rstrip('/')
+        self.deadline = deadline
+        # Like the requests pool, pool_size only caps the idle connections kept; busy periods open more
+        # rather than making requests wait for a free connection.
+        self.client = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=None, max_keepalive_connections=pool_size),
+        )
+        self._init_counters()
+
+    async def request(self, method, path, deadline=None, **kwargs):
+        budget = self.deadline if deadline is None else deadline
+        start = time.monotonic()
+        try:
+            response = await asyncio.wait_for(self.client.request(method, path, **kwargs), budget)
+        except asyncio.TimeoutError:
+            self._record(time.monotonic() - start, error=True, timeout=True)
+            raise DeadlineExceeded(f"{self.name} did not respond within {budget}s")
+        except httpx.TimeoutException:
+            self._record(time.monotonic() - start, error=True, timeout=True)
+            raise
+        except httpx.HTTPError:
+            self._record(time.monotonic() - start, error=True)
+            raise
+        self._record(time.monotonic() - start, error=response.status_code >= 500)
+        return response
+
+    async def get(self, path, **kwargs):
+        return await self.request('GET', path, **kwargs)
+
+    async def post(self, path, **kwargs):
+        return await self.request('POST', path, **kwargs)
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters)
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+# httpx clients cannot be shared between event loops: uvicorn runs one per worker process, while async
+# views served over WSGI (or from tests) get a new loop per request.
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_client(name):
+    client = _clients.get(name)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(name)
+            if client is None:
+                client = _clients[name] = ProviderClient(name, **settings.UPSTREAM_PROVIDERS[name])
+    return client
+
+
+def get_async_client(name):
+    clients = _async_clients.setdefault(asyncio.get_running_loop(), {})
+    client = clients.get(name)
+    if client is None:
+        client = clients[name] = AsyncProviderClient(name, **settings.UPSTREAM_PROVIDERS[name])
+    return client
+
+
+def snapshot():
+    return {name: client.stats() for name, client in list(_clients.items())}
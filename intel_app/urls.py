@@ -16,12 +16,14 @@ urlpatterns = [
                   path('history/mtn', views.mtn_history, name="mtn-history"),
                   path('history/big_time', views.big_time_history, name="bt-history"),
                   path('history/afa', views.afa_history, name="afa-history"),
+                  path('history/<str:net>/data', views.history_data, name="history-data"),
                   path('verify_transaction/<str:reference>/', views.verify_transaction, name="verify_transaction"),
 
                   path('mtn_admin', views.admin_mtn_history, name='mtn_admin'),
                   path('at_admin', views.admin_at_history, name='at_admin'),
                   path('bt_admin', views.admin_bt_history, name='bt_admin'),
                   path('afa_admin', views.admin_afa_history, name='afa_admin'),
+                  path('staff/orders/<str:net>/data', views.staff_orders_data, name='staff-orders-data'),
 
                   path('services/afa/', views.afa_registration, name='afa'),
                   path('history/afa', views.afa_history, name="afa-history"),
@@ -40,6 +42,7 @@ urlpatterns = [
                   path('bt_mark_as_sent/<int:pk>', views.bt_mark_as_sent, name='bt_mark_as_sent'),
                   path('afa_mark_as_sent/<int:pk>', views.afa_mark_as_sent, name='afa_mark_as_sent'),
                   path('credit_user', views.credit_user, name='credit_user'),
+                  path('users/autocomplete', views.user_autocomplete, name='user-autocomplete'),
                   path('pay_with_wallet/', views.pay_with_wallet, name='pay_with_wallet'),
                   path('mtn_pay_with_wallet/', views.mtn_pay_with_wallet, name='mtn_pay_with_wallet'),
                   path('big_time_pay_with_wallet/', views.big_time_pay_with_wallet, name='big_time_pay_with_wallet'),
@@ -51,6 +54,7 @@ urlpatterns = [
 
                   path('wallet/transactions/', views.wallet_transactions, name='wallet_transactions'),
                   path('paystack_webhook', views.paystack_webhook, name='paystack_webhook'),
+                  path('metrics', views.metrics_endpoint, name='metrics'),
 
                   # path('hubtel_webhook', views.hubtel_webhook, name='hubtel_webhook'),
                   # path('import_thing', views.populate_custom_users_from_excel, name="import_users"),
@@ -1,191 +1,122 @@
+import functools
 import hashlib
 import hmac
 import json
-from datetime import datetime
+import re
+from datetime import datetime, time, timedelta
 
+from asgiref.sync import sync_to_async
 from decouple import config
-from django.db import transaction
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from django.db.models import Q
 from django.shortcuts import render, redirect
 from django.http import JsonResponse, HttpResponseRedirect, HttpResponse
+import httpx
 import requests
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.utils.formats import date_format
 from django.views.decorators.csrf import csrf_exempt
 
 from . import forms
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from . import helper, models
+from django.contrib.auth.views import redirect_to_login
+from . import (catalog, helper, metrics, models, notifier, page_cache, pagination, payments, reconciliation,
+               site_config, upstream, wallet)
 from .forms import UploadFileForm
 from .models import CustomUser
+from .templatetags.bundle_filters import format_bundle
 
 
 # Create your views here.
+def _offer_list_context(status):
+    # The rendered offer <select> is cached per network, tier and catalog version (see the bundle templates).
+    return {"tier": catalog.tier_for(status), "catalog_version": catalog.get_catalog().version,
+            "offer_cache_ttl": settings.OFFER_FRAGMENT_CACHE_TTL}
+
+
+def _off_thread(func):
+    """
+    Run func from an async view in a thread of its own. Django runs every sync view and thread-sensitive
+    call of a process on one shared thread, so a checkout there would wait behind all the others.
+    """
+    def run(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            # Request signals only tidy up the shared thread's connection, not this one's.
+            close_old_connections()
+
+    return sync_to_async(run, thread_sensitive=False)
+
+
+def _async_login_required(view):
+    """login_required for async views; the session and user are loaded off the event loop."""
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if not await _off_thread(lambda: request.user.is_authenticated)():
+            return redirect_to_login(request.get_full_path(), 'login')
+        return await view(request, *args, **kwargs)
+
+    return wrapper
+
+
+@page_cache.anonymous_page("home")
 def home(request):
     return render(request, "layouts/index.html")
 
 
+@page_cache.anonymous_page("services")
 def services(request):
     return render(request, "layouts/services.html")
 
 
-def pay_with_wallet(request):
+def _buy_ishare(request):
+    admin = site_config.get_admin_info().phone_number
+    user = request.user
+    phone_number = request.POST.get("phone")
+    amount = request.POST.get("amount")
+    reference = request.POST.get("reference")
+    offer = catalog.get_catalog().get_offer("ishare", user.status, amount)
+    if offer is None:
+        return JsonResponse({'status': 'This offer is no longer available. Refresh the page and try again.', 'icon': 'error'})
+    bundle = offer.volume
+
+    try:
+        with transaction.atomic():
+            wallet.debit(user, offer.price, 'AT Bundle Purchase')
+            models.IShareBundleTransaction.objects.create(
+                user=request.user,
+                bundle_number=phone_number,
+                offer=f"{bundle}MB",
+                amount=offer.price,
+                tier=offer.tier,
+                volume_mb=offer.volume,
+                cost=offer.purchase_price,
+                reference=reference,
+                transaction_status="Pending",
+                queued_at=timezone.now(),
+            )
+    except wallet.InsufficientFunds:
+        return JsonResponse(
+            {'status': f'Your wallet balance is low. Contact the admin to recharge. Admin Contact Info: 0{admin}'})
+    return JsonResponse({'status': 'Your transaction will be completed shortly', 'icon': 'success'})
+
+
+@_async_login_required
+async def pay_with_wallet(request):
     if request.method == "POST":
-        print("hello world")
-        admin = models.AdminInfo.objects.filter().first().phone_number
-        user = models.CustomUser.objects.get(id=request.user.id)
-        phone_number = request.POST.get("phone")
-        amount = request.POST.get("amount")
-        reference = request.POST.get("reference")
-        if user.wallet is None:
-            return JsonResponse(
-                {'status': f'Your wallet balance is low. Contact the admin to recharge. Admin Contact Info: 0{admin}'})
-        if float(user.wallet) == 0.0:
-            return JsonResponse(
-                {'status': f'Your wallet balance is low. Contact the admin to recharge.'})
-        if float(user.wallet) < float(amount):
-            return JsonResponse(
-                {
-                    'status': f'Your wallet balance is low. Contact the admin to recharge. Admin Contact Info: 0{admin}'})
-        if float(amount) > float(user.wallet):
-            return JsonResponse(
-                {
-                    'status': f'Your wallet balance is low. Contact the admin to recharge. Admin Contact Info: 0{admin}'})
-        print(phone_number)
-        print(amount)
-        print(reference)
-        if user.status == "User":
-            bundle = models.IshareBundlePrice.objects.get(price=float(amount)).bundle_volume
-        elif user.status == "Agent":
-            bundle = models.AgentIshareBundlePrice.objects.get(price=float(amount)).bundle_volume
-        elif user.status == "Super Agent":
-            bundle = models.SuperAgentIshareBundlePrice.objects.get(price=float(amount)).bundle_volume
-        print(bundle)
-        #
-        # sms_headers = {
-        #     'Authorization': 'Bearer 1135|1MWAlxV4XTkDlfpld1VC3oRviLhhhZIEOitMjimq',
-        #     'Content-Type': 'application/json'
-        # }
-
-        ishare_choice = models.AdminInfo.objects.filter().first().ishare_source
-        if ishare_choice == "Gyasi":
-            send_bundle_response = helper.send_bundle(request.user, phone_number, bundle, reference)
-            data = send_bundle_response.json()
-            print(data)
-            if send_bundle_response.status_code == 200:
-                if data["code"] == "0000":
-                    with transaction.atomic():
-                        new_transaction = models.IShareBundleTransaction.objects.create(
-                            user=request.user,
-                            bundle_number=phone_number,
-                            offer=f"{bundle}MB",
-                            amount=amount,
-                            reference=reference,
-                            transaction_status="Completed"
-                        )
-                        new_transaction.save()
-                        user.wallet -= float(amount)
-                        user.save()
-
-                        models.WalletTransactionn.objects.create(
-                            user=user,
-                            transaction_type='Debit',
-                            transaction_amount=amount,
-                            transaction_use='AT Bundle Purchase',
-                            new_balance=user.wallet,
-                        )
-
-                        receiver_message = f"Your bundle purchase has been completed successfully. {bundle}MB has been credited to you by {request.user.phone}.\nReference: {reference}\n"
-                        sms_message = f"Hello @{request.user.username}. Your bundle purchase has been completed successfully. {bundle}MB has been credited to {phone_number}.\nReference: {reference}\nCurrent Wallet Balance: {user.wallet}\nThank you for using DCS.\n\n"
-
-                    num_without_0 = phone_number[1:]
-                    print(num_without_0)
-
-                    response1 = requests.get(
-                        f"https://sms.arkesel.com/sms/api?action=send-sms&api_key=a0xkWVBoYlBJUnRzeHZuUGVCYk8&to=0{num_without_0}&from=DCS.COM&sms={receiver_message}")
-                    print(response1.text)
-
-                    response2 = requests.get(
-                        f"https://sms.arkesel.com/sms/api?action=send-sms&api_key=a0xkWVBoYlBJUnRzeHZuUGVCYk8&to=0{request.user.phone}&from=DCS.COM&sms={sms_message}")
-                    print(response2.text)
-
-                    return JsonResponse({'status': 'Transaction Completed Successfully', 'icon': 'success'})
-                else:
-                    new_transaction = models.IShareBundleTransaction.objects.create(
-                        user=request.user,
-                        bundle_number=phone_number,
-                        offer=f"{bundle}MB",
-                        reference=reference,
-                        transaction_status="Failed"
-                    )
-                    new_transaction.save()
-                    return JsonResponse({'status': 'Something went wrong', 'icon': 'error'})
-        elif ishare_choice == "Value4Moni":
-            send_bundle_response = helper.value_for_moni_send_bundle(request.user, phone_number, bundle, reference)
-            data = send_bundle_response.json()
-            print(data)
-            if send_bundle_response.status_code == 200:
-                if data['code'] == "200":
-                    with transaction.atomic():
-                        new_transaction = models.IShareBundleTransaction.objects.create(
-                            user=request.user,
-                            bundle_number=phone_number,
-                            offer=f"{bundle}MB",
-                            reference=reference,
-                            transaction_status="Completed"
-                        )
-                        new_transaction.save()
-                        user.wallet -= float(amount)
-                        user.save()
-
-                        models.WalletTransactionn.objects.create(
-                            user=user,
-                            transaction_type='Debit',
-                            transaction_amount=amount,
-                            transaction_use='AT Bundle Purchase',
-                            new_balance=user.wallet,
-                        )
-                    receiver_message = f"Your bundle purchase has been completed successfully. {bundle}MB has been credited to you by {request.user.phone}.\nReference: {reference}\n"
-                    sms_message = f"Hello @{request.user.username}. Your bundle purchase has been completed successfully. {bundle}MB has been credited to {phone_number}.\nReference: {reference}\nCurrent Wallet Balance: {user.wallet}\nThank you for using DCS.\n\n"
-
-                    num_without_0 = phone_number[1:]
-                    print(num_without_0)
-                    # receiver_body = {
-                    #     'recipient': f"233{num_without_0}",
-                    #     'sender_id': 'Data4All',
-                    #     'message': receiver_message
-                    # }
-
-                    response1 = requests.get(
-                        f"https://sms.arkesel.com/sms/api?action=send-sms&api_key=a0xkWVBoYlBJUnRzeHZuUGVCYk8&to=0{num_without_0}&from=DCS.COM&sms={receiver_message}")
-                    print(response1.text)
-
-                    # sms_body = {
-                    #     'recipient': f"233{request.user.phone}",
-                    #     'sender_id': 'Data4All',
-                    #     'message': sms_message
-                    # }
-
-                    response2 = requests.get(
-                        f"https://sms.arkesel.com/sms/api?action=send-sms&api_key=a0xkWVBoYlBJUnRzeHZuUGVCYk8&to=0{request.user.phone}&from=DCS.COM&sms={sms_message}")
-                    print(response2.text)
-
-                    return JsonResponse({'status': 'Transaction Completed Successfully', 'icon': 'success'})
-                else:
-                    new_transaction = models.IShareBundleTransaction.objects.create(
-                        user=request.user,
-                        bundle_number=phone_number,
-                        offer=f"{bundle}MB",
-                        reference=reference,
-                        transaction_status="Failed"
-                    )
-                    new_transaction.save()
-                    return JsonResponse({'status': 'Something went wrong', 'icon': 'error'})
+        return await _off_thread(_buy_ishare)(request)
     return redirect('airtel-tigo')
 
 
 @login_required(login_url='login')
 def airtel_tigo(request):
-    user = models.CustomUser.objects.get(id=request.user.id)
+    user = request.user
     status = user.status
     form = forms.IShareBundleForm(status)
     reference = helper.ref_generator()
@@ -315,145 +246,99 @@ def airtel_tigo(request):
     #     #     #
     #     #     # print(response.text)
     #     #     return JsonResponse({'status': 'Something went wrong', 'icon': 'error'})
-    user = models.CustomUser.objects.get(id=request.user.id)
-    context = {"form": form, "ref": reference, "email": user_email, "wallet": 0 if user.wallet is None else user.wallet}
+    context = {"form": form, "ref": reference, "email": user_email, "wallet": 0 if user.wallet is None else user.wallet,
+               **_offer_list_context(status)}
     return render(request, "layouts/services/at.html", context=context)
 
 
-def mtn_pay_with_wallet(request):
-    if request.method == "POST":
-        user = models.CustomUser.objects.get(id=request.user.id)
-        phone = user.phone
-        phone_number = request.POST.get("phone")
-        amount = request.POST.get("amount")
-        reference = request.POST.get("reference")
-        print(phone_number)
-        print(amount)
-        print(reference)
-        sms_headers = {
-            'Authorization': 'Bearer 1135|1MWAlxV4XTkDlfpld1VC3oRviLhhhZIEOitMjimq',
-            'Content-Type': 'application/json'
-        }
-
-        sms_url = 'https://webapp.usmsgh.com/api/sms/send'
-        admin = models.AdminInfo.objects.filter().first().phone_number
-        api_status = models.AdminInfo.objects.filter().first().mtn_api_status
-
-        if user.wallet is None:
-            return JsonResponse(
-                {'status': f'Your wallet balance is low. Contact the admin to recharge. Admin Contact Info: 0{admin}'})
-        if float(user.wallet) == 0.0:
-            return JsonResponse(
-                {'status': f'Your wallet balance is low. Contact the admin to recharge.'})
-        if float(user.wallet) < float(amount):
-            return JsonResponse(
-                {'status': f'Your wallet balance is low. Contact the admin to recharge. Admin Contact Info: 0{admin}'})
-        if float(amount) > float(user.wallet):
-            return JsonResponse(
-                {'status': f'Your wallet balance is low. Contact the admin to recharge. Admin Contact Info: 0{admin}'})
-        if user.status == "User":
-            bundle = models.MTNBundlePrice.objects.get(price=float(amount)).bundle_volume
-        elif user.status == "Agent":
-            bundle = models.AgentMTNBundlePrice.objects.get(price=float(amount)).bundle_volume
-        elif user.status == "Super Agent":
-            bundle = models.SuperAgentMTNBundlePrice.objects.get(price=float(amount)).bundle_volume
-        print(bundle)
-
-        print("used else")
-        sms_message = f"An order has been placed. {bundle}MB for {phone_number}.\nReference:{reference}"
+def _buy_mtn(request):
+    user = request.user
+    phone = user.phone
+    phone_number = request.POST.get("phone")
+    amount = request.POST.get("amount")
+    reference = request.POST.get("reference")
+    admin_info = site_config.get_admin_info()
+    admin = admin_info.phone_number
+    api_status = admin_info.mtn_api_status
+
+    offer = catalog.get_catalog().get_offer("mtn", user.status, amount)
+    if offer is None:
+        return JsonResponse({'status': 'This offer is no longer available. Refresh the page and try again.', 'icon': 'error'})
+    bundle = offer.volume
+
+    sms_message = f"An order has been placed. {bundle}MB for {phone_number}.\nReference:{reference}"
+    try:
         with transaction.atomic():
-            new_mtn_transaction = models.MTNTransaction.objects.create(
+            wallet.debit(user, offer.price, 'MTN Bundle Purchase')
+            models.MTNTransaction.objects.create(
                 user=request.user,
                 bundle_number=phone_number,
                 offer=f"{bundle}MB",
-                amount=amount,
+                amount=offer.price,
+                tier=offer.tier,
+                volume_mb=offer.volume,
+                cost=offer.purchase_price,
                 reference=reference,
                 transaction_status="Pending"
             )
-            new_mtn_transaction.save()
-            user.wallet -= float(amount)
-            user.save()
+    except wallet.InsufficientFunds:
+        return JsonResponse(
+            {'status': f'Your wallet balance is low. Contact the admin to recharge. Admin Contact Info: 0{admin}'})
 
-            models.WalletTransactionn.objects.create(
-                user=user,
-                transaction_type='Debit',
-                transaction_amount=amount,
-                transaction_use='MTN Bundle Purchase',
-                new_balance=user.wallet,
-            )
+    notifier.send_sms(admin, sms_message, dedupe_key=f"mtn-order:{reference}")
+    return JsonResponse({'status': "Your transaction will be completed shortly", 'icon': 'success'})
 
-        response1 = requests.get(
-            f"https://sms.arkesel.com/sms/api?action=send-sms&api_key=a0xkWVBoYlBJUnRzeHZuUGVCYk8&to=0{admin}&from=DCS.COM&sms={sms_message}")
-        print(response1.text)
-        return JsonResponse({'status': "Your transaction will be completed shortly", 'icon': 'success'})
+
+@_async_login_required
+async def mtn_pay_with_wallet(request):
+    if request.method == "POST":
+        return await _off_thread(_buy_mtn)(request)
     return redirect('mtn')
 
 
-@login_required(login_url='login')
-def big_time_pay_with_wallet(request):
-    if request.method == "POST":
-        user = models.CustomUser.objects.get(id=request.user.id)
-        admin = models.AdminInfo.objects.filter().first().phone_number
-        phone_number = request.POST.get("phone")
-        amount = request.POST.get("amount")
-        reference = request.POST.get("reference")
-        print(phone_number)
-        print(amount)
-        print(reference)
-        if user.wallet is None:
-            return JsonResponse(
-                {'status': f'Your wallet balance is low. Contact the admin to recharge.'})
-        if float(user.wallet) == 0.0:
-            return JsonResponse(
-                {'status': f'Your wallet balance is low. Contact the admin to recharge.'})
-        if float(user.wallet) < float(amount):
-            return JsonResponse(
-                {
-                    'status': f'Your wallet balance is low. Contact the admin to recharge.'})
-        if float(amount) > float(user.wallet):
-            return JsonResponse(
-                {
-                    'status': f'Your wallet balance is low. Contact the admin to recharge.'})
-        if user.status == "User":
-            bundle = models.BigTimeBundlePrice.objects.get(price=float(amount)).bundle_volume
-        elif user.status == "Agent":
-            bundle = models.AgentBigTimeBundlePrice.objects.get(price=float(amount)).bundle_volume
-        elif user.status == "Super Agent":
-            bundle = models.SuperAgentBigTimeBundlePrice.objects.get(price=float(amount)).bundle_volume
-        print(bundle)
+def _buy_big_time(request):
+    user = request.user
+    admin = site_config.get_admin_info().phone_number
+    phone_number = request.POST.get("phone")
+    amount = request.POST.get("amount")
+    reference = request.POST.get("reference")
+    offer = catalog.get_catalog().get_offer("bigtime", user.status, amount)
+    if offer is None:
+        return JsonResponse({'status': 'This offer is no longer available. Refresh the page and try again.', 'icon': 'error'})
+    bundle = offer.volume
 
+    try:
         with transaction.atomic():
-            new_mtn_transaction = models.BigTimeTransaction.objects.create(
+            wallet.debit(user, offer.price, 'Big Time Bundle Purchase')
+            models.BigTimeTransaction.objects.create(
                 user=request.user,
                 bundle_number=phone_number,
                 offer=f"{bundle}MB",
-                amount=amount,
+                amount=offer.price,
+                tier=offer.tier,
+                volume_mb=offer.volume,
+                cost=offer.purchase_price,
                 reference=reference,
             )
-            new_mtn_transaction.save()
-            user.wallet -= float(amount)
-            user.save()
+    except wallet.InsufficientFunds:
+        return JsonResponse({'status': f'Your wallet balance is low. Contact the admin to recharge.'})
 
-            models.WalletTransactionn.objects.create(
-                user=user,
-                transaction_type='Debit',
-                transaction_amount=amount,
-                transaction_use='Big Time Bundle Purchase',
-                new_balance=user.wallet,
-            )
+    sms_message = f"A Big Time order has been placed. {bundle}MB for {phone_number}.\nReference:{reference}"
 
-        sms_message = f"A Big Time order has been placed. {bundle}MB for {phone_number}.\nReference:{reference}"
+    notifier.send_sms(admin, sms_message, dedupe_key=f"bt-order:{reference}")
+    return JsonResponse({'status': "Your transaction will be completed shortly", 'icon': 'success'})
 
-        response1 = requests.get(
-            f"https://sms.arkesel.com/sms/api?action=send-sms&api_key=a0xkWVBoYlBJUnRzeHZuUGVCYk8&to=0{admin}&from=DCS.COM&sms={sms_message}")
-        print(response1.text)
-        return JsonResponse({'status': "Your transaction will be completed shortly", 'icon': 'success'})
+
+@_async_login_required
+async def big_time_pay_with_wallet(request):
+    if request.method == "POST":
+        return await _off_thread(_buy_big_time)(request)
     return redirect('big_time')
 
 
 @login_required(login_url='login')
 def mtn(request):
-    user = models.CustomUser.objects.get(id=request.user.id)
+    user = request.user
     phone = user.phone
     status = user.status
     form = forms.MTNForm(status=status)
@@ -461,18 +346,18 @@ def mtn(request):
     user_email = request.user.email
 
     context = {'form': form,
-               "ref": reference, "email": user_email, "wallet": 0 if user.wallet is None else user.wallet}
+               "ref": reference, "email": user_email, "wallet": 0 if user.wallet is None else user.wallet,
+               **_offer_list_context(status)}
     return render(request, "layouts/services/mtn.html", context=context)
 
 
 @login_required(login_url='login')
 def afa_registration(request):
-    user = models.CustomUser.objects.get(id=request.user.id)
+    user = request.user
     reference = helper.ref_generator()
     db_user_id = request.user.id
-    price = models.AdminInfo.objects.filter().first().afa_price
+    price = site_config.get_admin_info().afa_price
     user_email = request.user.email
-    print(price)
     # if request.method == "POST":
     #     form = forms.AFARegistrationForm(request.POST)
     #     if form.is_valid():
@@ -526,9 +411,10 @@ def afa_registration(request):
     return render(request, "layouts/services/afa.html", context=context)
 
 
+@login_required(login_url='login')
 def afa_registration_wallet(request):
     if request.method == "POST":
-        user = models.CustomUser.objects.get(id=request.user.id)
+        user = request.user
         phone_number = request.POST.get("phone")
         amount = request.POST.get("amount")
         reference = request.POST.get("reference")
@@ -537,54 +423,31 @@ def afa_registration_wallet(request):
         occupation = request.POST.get("occupation")
         date_of_birth = request.POST.get("birth")
         location = request.POST.get("locationz")
-        print(location)
-        price = models.AdminInfo.objects.filter().first().afa_price
-
-        if user.wallet is None:
-            return JsonResponse(
-                {'status': f'Your wallet balance is low. Contact the admin to recharge.'})
-        if float(user.wallet) == 0.0:
-            return JsonResponse(
-                {'status': f'Your wallet balance is low. Contact the admin to recharge.'})
-        if float(user.wallet) < float(amount):
-            return JsonResponse(
-                {
-                    'status': f'Your wallet balance is low. Contact the admin to recharge.'})
-        if float(amount) > float(user.wallet):
-            return JsonResponse(
-                {
-                    'status': f'Your wallet balance is low. Contact the admin to recharge.'})
-
-        with transaction.atomic():
-            new_registration = models.AFARegistration.objects.create(
-                user=user,
-                reference=reference,
-                name=name,
-                phone_number=phone_number,
-                gh_card_number=card_number,
-                occupation=occupation,
-                amount=amount,
-                date_of_birth=date_of_birth,
-                location=location
-            )
-            new_registration.save()
-            user.wallet -= float(price)
-            user.save()
+        price = site_config.get_admin_info().afa_price
 
-            models.WalletTransactionn.objects.create(
-                user=user,
-                transaction_type='Debit',
-                transaction_amount=price,
-                transaction_use='AFA Registration',
-                new_balance=user.wallet,
-            )
+        try:
+            with transaction.atomic():
+                wallet.debit(user, price, 'AFA Registration')
+                models.AFARegistration.objects.create(
+                    user=user,
+                    reference=reference,
+                    name=name,
+                    phone_number=phone_number,
+                    gh_card_number=card_number,
+                    occupation=occupation,
+                    amount=amount,
+                    date_of_birth=date_of_birth,
+                    location=location
+                )
+        except wallet.InsufficientFunds:
+            return JsonResponse({'status': f'Your wallet balance is low. Contact the admin to recharge.'})
         return JsonResponse({'status': "Your transaction will be completed shortly", 'icon': 'success'})
     return redirect('home')
 
 
 @login_required(login_url='login')
 def big_time(request):
-    user = models.CustomUser.objects.get(id=request.user.id)
+    user = request.user
     status = user.status
     form = forms.BigTimeBundleForm(status)
     reference = helper.ref_generator()
@@ -631,7 +494,6 @@ def big_time(request):
     #         checkoutUrl = data['data']['checkoutUrl']
     #
     #         return redirect(checkoutUrl)
-    user = models.CustomUser.objects.get(id=request.user.id)
     # phone_num = user.phone
     # mtn_dict = {}
     #
@@ -643,152 +505,224 @@ def big_time(request):
     #     mtn_dict[str(offer)] = offer.bundle_volume
     context = {'form': form,
                "ref": reference, "email": user_email, 'id': db_user_id,
-               "wallet": 0 if user.wallet is None else user.wallet}
+               "wallet": 0 if user.wallet is None else user.wallet,
+               **_offer_list_context(status)}
     return render(request, "layouts/services/big_time.html", context=context)
 
 
+# Rows for the history tables are loaded page by page from history_data.
+HISTORY_TABLES = {
+    "tigo": (models.IShareBundleTransaction, ['bundle_number', 'offer', 'reference', 'transaction_status'], 'bundle_number'),
+    "mtn": (models.MTNTransaction, ['bundle_number', 'offer', 'reference', 'transaction_status'], 'bundle_number'),
+    "bt": (models.BigTimeTransaction, ['bundle_number', 'offer', 'reference', 'transaction_status'], 'bundle_number'),
+    "voda": (models.VodafoneTransaction, ['bundle_number', 'offer', 'reference', 'transaction_status'], 'bundle_number'),
+    "afa": (models.AFARegistration, ['name', 'phone_number', 'reference', 'gh_card_number', 'occupation',
+                                     'date_of_birth', 'transaction_status'], 'phone_number'),
+}
+
+
 @login_required(login_url='login')
 def history(request):
-    user_transactions = models.IShareBundleTransaction.objects.filter(user=request.user).order_by(
-        'transaction_date').reverse()
     header = "AirtelTigo Transactions"
     net = "tigo"
-    context = {'txns': user_transactions, "header": header, "net": net}
+    context = {"header": header, "net": net}
     return render(request, "layouts/history.html", context=context)
 
 
 @login_required(login_url='login')
 def mtn_history(request):
-    user_transactions = models.MTNTransaction.objects.filter(user=request.user).order_by('transaction_date').reverse()
     header = "MTN Transactions"
     net = "mtn"
-    context = {'txns': user_transactions, "header": header, "net": net}
+    context = {"header": header, "net": net}
     return render(request, "layouts/history.html", context=context)
 
 
 @login_required(login_url='login')
 def big_time_history(request):
-    user_transactions = models.BigTimeTransaction.objects.filter(user=request.user).order_by(
-        'transaction_date').reverse()
     header = "Big Time Transactions"
     net = "bt"
-    context = {'txns': user_transactions, "header": header, "net": net}
+    context = {"header": header, "net": net}
     return render(request, "layouts/history.html", context=context)
 
 
 @login_required(login_url='login')
 def afa_history(request):
-    user_transactions = models.AFARegistration.objects.filter(user=request.user).order_by('transaction_date').reverse()
     header = "AFA Registrations"
     net = "afa"
-    context = {'txns': user_transactions, "header": header, "net": net}
+    context = {"header": header, "net": net}
     return render(request, "layouts/afa_history.html", context=context)
 
 
-def verify_transaction(request, reference):
+@login_required(login_url='login')
+def history_data(request, net):
+    if net not in HISTORY_TABLES:
+        return JsonResponse({'error': 'Unknown history'}, status=404)
+    model, fields, number_field = HISTORY_TABLES[net]
+    txns = model.objects.filter(user=request.user)
+
+    txns = _search_transactions(txns, request.GET.get("search", ""), number_field)
+    size = pagination.page_size(request.GET.get("length"))
+    rows, next_cursor = pagination.keyset_page(
+        txns.values('id', 'transaction_date', *fields), request.GET.get("cursor"), size
+    )
+    for row in rows:
+        _format_row(row)
+        del row['id']
+    return _table_page(request, rows, next_cursor)
+
+
+def _search_transactions(txns, search, number_field):
+    search = search.strip()
+    if not search:
+        return txns
+    query = Q(reference=search) | Q(reference=search.upper())
+    if search.isdigit():
+        query |= Q(**{number_field: int(search)})
+    return txns.filter(query)
+
+
+def _parse_day(value):
+    try:
+        return parse_date(value or "")
+    except ValueError:
+        return None
+
+
+def _format_row(row):
+    row['transaction_date'] = date_format(timezone.localtime(row['transaction_date']), 'DATETIME_FORMAT')
+    if 'date_of_birth' in row:
+        row['date_of_birth'] = date_format(row['date_of_birth'])
+
+
+def _table_page(request, rows, next_cursor):
+    # Tables are never counted; DataTables only needs to know whether there is a next page.
+    start = int(request.GET.get("start", "0")) if request.GET.get("start", "0").isdigit() else 0
+    total = start + len(rows) + (1 if next_cursor else 0)
+    return JsonResponse({
+        'draw': int(request.GET.get("draw", "0")) if request.GET.get("draw", "0").isdigit() else 0,
+        'recordsTotal': total,
+        'recordsFiltered': total,
+        'data': rows,
+        'next': next_cursor,
+    })
+
+
+async def verify_transaction(request, reference):
     if request.method == "GET":
-        response = helper.verify_paystack_transaction(reference)
-        data = response.json()
+        try:
+            data = (await helper.averify_paystack_transaction(reference)).json()
+        except (httpx.HTTPError, upstream.DeadlineExceeded, ValueError):
+            return JsonResponse({'status': 'error'})
         try:
             status = data["data"]["status"]
             amount = data["data"]["amount"]
             api_reference = data["data"]["reference"]
             date = data["data"]["paid_at"]
             real_amount = float(amount) / 100
-            print(status)
-            print(real_amount)
-            print(api_reference)
-            print(reference)
-            print(date)
         except:
             status = data["status"]
         return JsonResponse({'status': status})
 
 
+ORDER_STATUSES = ["Pending", "Processing", "Completed", "Failed", "Canceled and Refunded"]
+
+# Order tables behind the staff dashboards, with the view that marks an order as sent.
+STAFF_TABLES = {
+    "at": (models.IShareBundleTransaction, 'at_mark_as_sent'),
+    "mtn": (models.MTNTransaction, 'mark_as_sent'),
+    "bt": (models.BigTimeTransaction, 'bt_mark_as_sent'),
+    "voda": (models.VodafoneTransaction, 'voda_mark_as_sent'),
+    "afa": (models.AFARegistration, 'afa_mark_as_sent'),
+}
+ORDER_FIELDS = ['user__username', 'bundle_number', 'offer', 'reference', 'transaction_status']
+AFA_FIELDS = ['user__username', 'name', 'phone_number', 'reference', 'gh_card_number', 'occupation',
+              'date_of_birth', 'location', 'transaction_status']
+
+
 @login_required(login_url='login')
 def admin_at_history(request):
     if request.user.is_staff and request.user.is_superuser:
-        all_txns = models.IShareBundleTransaction.objects.filter().order_by('-transaction_date')
-        context = {'txns': all_txns}
+        context = {'net': "at", 'statuses': ORDER_STATUSES}
         return render(request, "layouts/services/at_admin.html", context=context)
 
 
 @login_required(login_url='login')
 def admin_mtn_history(request):
     if request.user.is_staff and request.user.is_superuser:
-        all_txns = models.MTNTransaction.objects.filter().order_by('-transaction_date')[:800]
-        context = {'txns': all_txns}
+        context = {'net': "mtn", 'statuses': ORDER_STATUSES}
         return render(request, "layouts/services/mtn_admin.html", context=context)
 
 
 @login_required(login_url='login')
 def admin_bt_history(request):
     if request.user.is_staff and request.user.is_superuser:
-        all_txns = models.BigTimeTransaction.objects.filter().order_by('-transaction_date')
-        context = {'txns': all_txns}
+        context = {'net': "bt", 'statuses': ORDER_STATUSES}
         return render(request, "layouts/services/bt_admin.html", context=context)
 
 
 @login_required(login_url='login')
 def admin_afa_history(request):
     if request.user.is_staff and request.user.is_superuser:
-        all_txns = models.AFARegistration.objects.filter().order_by('-transaction_date')
-        context = {'txns': all_txns}
+        context = {'net': "afa", 'statuses': ORDER_STATUSES}
         return render(request, "layouts/services/afa_admin.html", context=context)
 
 
+@login_required(login_url='login')
+def staff_orders_data(request, net):
+    if not (request.user.is_staff and request.user.is_superuser):
+        return JsonResponse({'error': 'Access Denied'}, status=403)
+    if net not in STAFF_TABLES:
+        return JsonResponse({'error': 'Unknown network'}, status=404)
+    model, mark_view = STAFF_TABLES[net]
+    fields, number_field = (AFA_FIELDS, 'phone_number') if net == "afa" else (ORDER_FIELDS, 'bundle_number')
+
+    txns = model.objects.all()
+    status = request.GET.get("status")
+    if status:
+        txns = txns.filter(transaction_status=status)
+    date_from = _parse_day(request.GET.get("date_from"))
+    if date_from:
+        txns = txns.filter(transaction_date__gte=timezone.make_aware(datetime.combine(date_from, time.min)))
+    date_to = _parse_day(request.GET.get("date_to"))
+    if date_to:
+        txns = txns.filter(transaction_date__lt=timezone.make_aware(datetime.combine(date_to + timedelta(days=1), time.min)))
+    txns = _search_transactions(txns, request.GET.get("search", ""), number_field)
+
+    # Joining the username in the same query avoids a user lookup per row.
+    rows, next_cursor = pagination.keyset_page(
+        txns.values('id', 'transaction_date', *fields),
+        request.GET.get("cursor"),
+        pagination.page_size(request.GET.get("length")),
+        descending=request.GET.get("order") != "oldest",
+    )
+    for row in rows:
+        _format_row(row)
+        row['user'] = row.pop('user__username')
+        if 'offer' in row:
+            row['offer'] = format_bundle(row['offer'])
+        row['action_url'] = reverse(mark_view, kwargs={'pk': row.pop('id')})
+    return _table_page(request, rows, next_cursor)
+
+
 @login_required(login_url='login')
 def mark_as_sent(request, pk):
     if request.user.is_staff and request.user.is_superuser:
-        txn = models.MTNTransaction.objects.filter(id=pk).first()
-        print(txn)
+        txn = models.MTNTransaction.objects.select_related('user').filter(id=pk).first()
         txn.transaction_status = "Completed"
         txn.save()
-        sms_headers = {
-            'Authorization': 'Bearer 1135|1MWAlxV4XTkDlfpld1VC3oRviLhhhZIEOitMjimq',
-            'Content-Type': 'application/json'
-        }
-
-        # sms_url = 'https://webapp.usmsgh.com/api/sms/send'
         sms_message = f"Your MTN transaction has been completed. {txn.bundle_number} has been credited with {txn.offer}.\nTransaction Reference: {txn.reference}"
-        #
-        # sms_body = {
-        #     'recipient': f"233{txn.bundle_number}",
-        #     'sender_id': 'Data4All',
-        #     'message': sms_message
-        # }
-        response1 = requests.get(
-            f"https://sms.arkesel.com/sms/api?action=send-sms&api_key=a0xkWVBoYlBJUnRzeHZuUGVCYk8&to=0{txn.user.phone}&from=DCS.COM&sms={sms_message}")
-        print(response1.text)
+        notifier.send_sms(txn.user.phone, sms_message, dedupe_key=f"order-sent:{txn.id}")
         return redirect('mtn_admin')
 
 
 @login_required(login_url='login')
 def at_mark_as_sent(request, pk):
     if request.user.is_staff and request.user.is_superuser:
-        txn = models.IShareBundleTransaction.objects.filter(id=pk).first()
-        print(txn)
+        txn = models.IShareBundleTransaction.objects.select_related('user').filter(id=pk).first()
         txn.transaction_status = "Completed"
         txn.save()
-        sms_headers = {
-            'Authorization': 'Bearer 1334|wroIm5YnQD6hlZzd8POtLDXxl4vQodCZNorATYGX',
-            'Content-Type': 'application/json'
-        }
-
-        sms_url = 'https://webapp.usmsgh.com/api/sms/send'
         sms_message = f"Your AT transaction has been completed. {txn.bundle_number} has been credited with {txn.offer}.\nTransaction Reference: {txn.reference}"
-
-        sms_body = {
-            'recipient': f"233{txn.user.phone}",
-            'sender_id': 'GH BAY',
-            'message': sms_message
-        }
-        try:
-            response = requests.request('POST', url=sms_url, params=sms_body, headers=sms_headers)
-            print(response.text)
-        except:
-            messages.success(request, f"Transaction Completed")
-            return redirect('at_admin')
+        notifier.send_sms(txn.user.phone, sms_message, dedupe_key=f"order-sent:{txn.id}")
         messages.success(request, f"Transaction Completed")
         return redirect('at_admin')
 
@@ -796,30 +730,11 @@ def at_mark_as_sent(request, pk):
 @login_required(login_url='login')
 def bt_mark_as_sent(request, pk):
     if request.user.is_staff and request.user.is_superuser:
-        txn = models.BigTimeTransaction.objects.filter(id=pk).first()
-        print(txn)
+        txn = models.BigTimeTransaction.objects.select_related('user').filter(id=pk).first()
         txn.transaction_status = "Completed"
         txn.save()
-        sms_headers = {
-            'Authorization': 'Bearer 1334|wroIm5YnQD6hlZzd8POtLDXxl4vQodCZNorATYGX',
-            'Content-Type': 'application/json'
-        }
-
-        sms_url = 'https://webapp.usmsgh.com/api/sms/send'
         sms_message = f"Your AT BIG TIME transaction has been completed. {txn.bundle_number} has been credited with {txn.offer}.\nTransaction Reference: {txn.reference}"
-
-        sms_body = {
-            'recipient': f"233{txn.user.phone}",
-            'sender_id': 'GH BAY',
-            'message': sms_message
-        }
-        try:
-            response1 = requests.get(
-                f"https://sms.arkesel.com/sms/api?action=send-sms&api_key=a0xkWVBoYlBJUnRzeHZuUGVCYk8&to=0{txn.user.phone}&from=DCS.COM&sms={sms_message}")
-            print(response1.text)
-        except:
-            messages.success(request, f"Transaction Completed")
-            return redirect('bt_admin')
+        notifier.send_sms(txn.user.phone, sms_message, dedupe_key=f"order-sent:{txn.id}")
         messages.success(request, f"Transaction Completed")
         return redirect('bt_admin')
 
@@ -827,26 +742,11 @@ def bt_mark_as_sent(request, pk):
 @login_required(login_url='login')
 def afa_mark_as_sent(request, pk):
     if request.user.is_staff and request.user.is_superuser:
-        txn = models.AFARegistration.objects.filter(id=pk).first()
-        print(txn)
+        txn = models.AFARegistration.objects.select_related('user').filter(id=pk).first()
         txn.transaction_status = "Completed"
         txn.save()
-        sms_headers = {
-            'Authorization': 'Bearer 1334|wroIm5YnQD6hlZzd8POtLDXxl4vQodCZNorATYGX',
-            'Content-Type': 'application/json'
-        }
-
-        sms_url = 'https://webapp.usmsgh.com/api/sms/send'
         sms_message = f"Your AFA Registration has been completed. {txn.phone_number} has been registered.\nTransaction Reference: {txn.reference}"
-
-        sms_body = {
-            'recipient': f"233{txn.user.phone}",
-            'sender_id': 'GH BAY',
-            'message': sms_message
-        }
-        response1 = requests.get(
-            f"https://sms.arkesel.com/sms/api?action=send-sms&api_key=a0xkWVBoYlBJUnRzeHZuUGVCYk8&to=0{txn.user.phone}&from=DCS.COM&sms={sms_message}")
-        print(response1.text)
+        notifier.send_sms(txn.user.phone, sms_message, dedupe_key=f"afa-sent:{txn.id}")
         messages.success(request, f"Transaction Completed")
         return redirect('afa_admin')
 
@@ -857,34 +757,12 @@ def credit_user(request):
         if request.method == "POST":
             form = forms.CreditUserForm(request.POST)
             if form.is_valid():
-                user = form.cleaned_data["user"]
+                user_needed = form.cleaned_data["user"]
                 amount = form.cleaned_data["amount"]
-                print(user)
-                print(amount)
-                user_needed = models.CustomUser.objects.get(username=user)
-                if user_needed.wallet is None:
-                    user_needed.wallet = float(amount)
-                else:
-                    user_needed.wallet += float(amount)
-                user_needed.save()
-                print(user_needed.username)
+                wallet.credit(user_needed, amount, 'Wallet Topup (Admin)')
                 messages.success(request, "Crediting Successful")
-                # sms_headers = {
-                #     'Authorization': 'Bearer 1135|1MWAlxV4XTkDlfpld1VC3oRviLhhhZIEOitMjimq',
-                #     'Content-Type': 'application/json'
-                # }
-                #
-                # sms_url = 'https://webapp.usmsgh.com/api/sms/send'
                 sms_message = f"Hello {user_needed},\nYour DCS wallet has been credit with GHS{amount}."
-
-                # sms_body = {
-                #     'recipient': f"233{user_needed.phone}",
-                #     'sender_id': 'Data4All',
-                #     'message': sms_message
-                # }
-                response1 = requests.get(
-                    f"https://sms.arkesel.com/sms/api?action=send-sms&api_key=a0xkWVBoYlBJUnRzeHZuUGVCYk8&to=0{user_needed.phone}&from=DCS.COM&sms={sms_message}")
-                print(response1.text)
+                notifier.send_sms(user_needed.phone, sms_message)
                 return redirect('credit_user')
         context = {'form': form}
         return render(request, "layouts/services/credit.html", context=context)
@@ -895,7 +773,7 @@ def credit_user(request):
 
 @login_required(login_url='login')
 def topup_info(request):
-    admin_info = models.AdminInfo.objects.first()
+    admin_info = site_config.get_admin_info()
     paystack_active = admin_info.paystack_active if admin_info else False
 
     if request.method == "POST":
@@ -908,12 +786,6 @@ def topup_info(request):
 
         if paystack_active:
             # Proceed with Paystack payment
-            paystack_secret_key = config("PAYSTACK_SECRET_KEY")
-            # paystack_public_key = settings.PAYSTACK_PUBLIC_KEY
-            headers = {
-                'Authorization': f'Bearer {paystack_secret_key}',
-                'Content-Type': 'application/json',
-            }
             data = {
                 'email': user.email,
                 'amount': amount_with_fee,
@@ -926,8 +798,10 @@ def topup_info(request):
                 },
                 'callback_url': request.build_absolute_uri(reverse('home')),  # Adjust callback URL as needed
             }
-            response = requests.post('https://api.paystack.co/transaction/initialize', headers=headers, json=data)
-            res_data = response.json()
+            try:
+                res_data = helper.initialize_paystack_transaction(data).json()
+            except (requests.RequestException, ValueError):
+                res_data = {}
             if res_data.get('status'):
                 authorization_url = res_data['data']['authorization_url']
                 # Create a TopUpRequest with status Pending
@@ -940,7 +814,7 @@ def topup_info(request):
                 return redirect(authorization_url)
             else:
                 messages.error(request, 'An error occurred while initializing payment. Please try again.')
-                return redirect('topup_info')
+                return redirect('topup-info')
         else:
             admin_phone = admin_info.phone_number if admin_info else 'ADMIN_PHONE_NUMBER'
             models.TopUpRequest.objects.create(
@@ -958,7 +832,7 @@ def topup_info(request):
 
 @login_required(login_url='login')
 def request_successful(request, reference):
-    admin = models.AdminInfo.objects.filter().first()
+    admin = site_config.get_admin_info()
     context = {
         "name": admin.name,
         "number": f"0{admin.momo_number}",
@@ -970,7 +844,7 @@ def request_successful(request, reference):
 
 def topup_list(request):
     if request.user.is_superuser:
-        topup_requests = models.TopUpRequest.objects.all().order_by('date').reverse()
+        topup_requests = models.TopUpRequest.objects.select_related('user').order_by('date').reverse()
         context = {
             'requests': topup_requests,
         }
@@ -983,36 +857,18 @@ def topup_list(request):
 @login_required(login_url='login')
 def credit_user_from_list(request, reference):
     if request.user.is_superuser:
-        crediting = models.TopUpRequest.objects.filter(reference=reference).first()
-        user = crediting.user
-        custom_user = models.CustomUser.objects.get(username=user.username)
+        crediting = models.TopUpRequest.objects.select_related('user').filter(reference=reference).first()
+        user = custom_user = crediting.user
         if crediting.status:
             return redirect('topup_list')
         amount = crediting.amount
-        print(user)
-        print(user.phone)
-        print(amount)
-        custom_user.wallet += amount
-        custom_user.save()
-        crediting.status = True
-        crediting.credited_at = datetime.now()
-        crediting.save()
-        # sms_headers = {
-        #     'Authorization': 'Bearer 1135|1MWAlxV4XTkDlfpld1VC3oRviLhhhZIEOitMjimq',
-        #     'Content-Type': 'application/json'
-        # }
-        #
-        # sms_url = 'https://webapp.usmsgh.com/api/sms/send'
+        with transaction.atomic():
+            if not models.TopUpRequest.objects.filter(id=crediting.id, status=False).update(
+                    status=True, credited_at=datetime.now()):
+                return redirect('topup_list')
+            wallet.credit(custom_user, amount, 'Wallet Topup (Admin)')
         sms_message = f"Hello,\nYour wallet has been topped up with GHS{amount}.\nReference: {reference}.\nThank you"
-        #
-        # sms_body = {
-        #     'recipient': f"233{custom_user.phone}",
-        #     'sender_id': 'Data4All',
-        #     'message': sms_message
-        # }
-        response1 = requests.get(
-            f"https://sms.arkesel.com/sms/api?action=send-sms&api_key=a0xkWVBoYlBJUnRzeHZuUGVCYk8&to=0{custom_user.phone}&from=DCS.COM&sms={sms_message}")
-        print(response1.text)
+        notifier.send_sms(custom_user.phone, sms_message, dedupe_key=f"topup:{reference}")
         messages.success(request, f"{user} has been credited with {amount}")
         return redirect('topup_list')
 
@@ -1289,7 +1145,7 @@ def delete_custom_users(request):
 
 @login_required(login_url='login')
 def voda(request):
-    user = models.CustomUser.objects.get(id=request.user.id)
+    user = request.user
     status = user.status
     form = forms.VodaBundleForm(status)
     reference = helper.ref_generator()
@@ -1322,7 +1178,6 @@ def voda(request):
         # )
         # new_mtn_transaction.save()
         # return JsonResponse({'status': "Your transaction will be completed shortly", 'icon': 'success'})
-    user = models.CustomUser.objects.get(id=request.user.id)
     # phone_num = user.phone
     # mtn_dict = {}
     #
@@ -1333,139 +1188,99 @@ def voda(request):
     # for offer in mtn_offer:
     #     mtn_dict[str(offer)] = offer.bundle_volume
     context = {'form': form,
-               "ref": reference, "email": user_email, "wallet": 0 if user.wallet is None else user.wallet, 'id': db_user_id}
+               "ref": reference, "email": user_email, "wallet": 0 if user.wallet is None else user.wallet, 'id': db_user_id,
+               **_offer_list_context(status)}
     return render(request, "layouts/services/voda.html", context=context)
 
 
-@login_required(login_url='login')
-def voda_pay_with_wallet(request):
-    if request.method == "POST":
-        admin = models.AdminInfo.objects.filter().first().phone_number
-        user = models.CustomUser.objects.get(id=request.user.id)
-        phone_number = request.POST.get("phone")
-        amount = request.POST.get("amount")
-        reference = request.POST.get("reference")
-        print(phone_number)
-        print(amount)
-        print(reference)
-        if user.wallet is None:
-            return JsonResponse(
-                {'status': f'Your wallet balance is low. Contact the admin to recharge.'})
-        elif user.wallet <= 0 or user.wallet < float(amount):
-            return JsonResponse(
-                {'status': f'Your wallet balance is low. Contact the admin to recharge.'})
-
-        if user.status == "User":
-            bundle = models.VodaBundlePrice.objects.get(price=float(amount)).bundle_volume
-        elif user.status == "Agent":
-            bundle = models.AgentVodaBundlePrice.objects.get(price=float(amount)).bundle_volume
-        elif user.status == "Super Agent":
-            bundle = models.SuperAgentVodaBundlePrice.objects.get(price=float(amount)).bundle_volume
-        else:
-            bundle = models.VodaBundlePrice.objects.get(price=float(amount)).bundle_volume
-
-        # url = "https://www.value4moni.com/api/v1/inititate_transaction"
-        #
-        # headers = {
-        #     'Content-Type': 'application/json',
-        # }
-        #
-        # # Create the payload for the POST request
-        # payload = {
-        #     "API_Key": config("MONI_API_KEY"),
-        #     "Receiver": str(phone_number),
-        #     "Volume": str(int(bundle)),
-        #     "Reference": reference,
-        #     "Package_Type": "Telecel"
-        # }
-        #
-        # # Convert the payload into JSON format
-        # json_payload = json.dumps(payload)
-        #
-        # # Make the POST request to the API
-        # response = requests.post(url, headers=headers, data=json_payload)
-        #
-        # print(response.json())
+def _buy_voda(request):
+    admin = site_config.get_admin_info().phone_number
+    user = request.user
+    phone_number = request.POST.get("phone")
+    amount = request.POST.get("amount")
+    reference = request.POST.get("reference")
+    offer = catalog.get_catalog().get_offer("voda", user.status, amount)
+    if offer is None:
+        return JsonResponse({'status': 'This offer is no longer available. Refresh the page and try again.', 'icon': 'error'})
+    bundle = offer.volume
+
+    # url = "https://www.value4moni.com/api/v1/inititate_transaction"
+    #
+    # headers = {
+    #     'Content-Type': 'application/json',
+    # }
+    #
+    # # Create the payload for the POST request
+    # payload = {
+    #     "API_Key": config("MONI_API_KEY"),
+    #     "Receiver": str(phone_number),
+    #     "Volume": str(int(bundle)),
+    #     "Reference": reference,
+    #     "Package_Type": "Telecel"
+    # }
+    #
+    # # Convert the payload into JSON format
+    # json_payload = json.dumps(payload)
+    #
+    # # Make the POST request to the API
+    # response = requests.post(url, headers=headers, data=json_payload)
+    #
+    # print(response.json())
 
-        # data = response.json()
-        # if response.status_code == 200:
-        #     if data['code'] == '200':
+    # data = response.json()
+    # if response.status_code == 200:
+    #     if data['code'] == '200':
+    try:
         with transaction.atomic():
-            new_mtn_transaction = models.VodafoneTransaction.objects.create(
+            wallet.debit(user, offer.price, 'Telecel Bundle Purchase')
+            models.VodafoneTransaction.objects.create(
                 user=request.user,
                 bundle_number=phone_number,
                 offer=f"{bundle}MB",
                 reference=reference,
-                amount=amount,
+                amount=offer.price,
+                tier=offer.tier,
+                volume_mb=offer.volume,
+                cost=offer.purchase_price,
                 transaction_status="Pending"
             )
-            new_mtn_transaction.save()
-            user.wallet -= float(amount)
-            user.save()
+    except wallet.InsufficientFunds:
+        return JsonResponse({'status': f'Your wallet balance is low. Contact the admin to recharge.'})
+    sms_message = f"TELECEL:\n {bundle}MB for {phone_number}."
+    notifier.send_sms("0549456515", sms_message, dedupe_key=f"voda-order:{reference}")
+    return JsonResponse({'status': "Transaction Completed Successfully", 'icon': 'success'})
 
-            models.WalletTransactionn.objects.create(
-                user=user,
-                transaction_type='Debit',
-                transaction_amount=amount,
-                transaction_use='Telecel Bundle Purchase',
-                new_balance=user.wallet,
-            )
-        sms_message = f"TELECEL:\n {bundle}MB for {phone_number}."
-
-        # sms_body = {
-        #     'recipient': f"233{user_needed.phone}",
-        #     'sender_id': 'Data4All',
-        #     'message': sms_message
-        # }
-        response1 = requests.get(
-            f"https://sms.arkesel.com/sms/api?action=send-sms&api_key=a0xkWVBoYlBJUnRzeHZuUGVCYk8&to=0549456515&from=DCS.COM&sms={sms_message}")
-        print(response1.text)
-        return JsonResponse({'status': "Transaction Completed Successfully", 'icon': 'success'})
 
+@_async_login_required
+async def voda_pay_with_wallet(request):
+    if request.method == "POST":
+        return await _off_thread(_buy_voda)(request)
     return redirect('voda')
 
 
 @login_required(login_url='login')
 def voda_history(request):
-    user_transactions = models.VodafoneTransaction.objects.filter(user=request.user).order_by(
-        'transaction_date').reverse()
     header = "Vodafone Transactions"
     net = "voda"
-    context = {'txns': user_transactions, "header": header, "net": net}
+    context = {"header": header, "net": net}
     return render(request, "layouts/history.html", context=context)
 
 
 @login_required(login_url='login')
 def admin_voda_history(request):
     if request.user.is_staff and request.user.is_superuser:
-        all_txns = models.VodafoneTransaction.objects.filter().order_by('-transaction_date')[:1000]
-        context = {'txns': all_txns}
+        context = {'net': "voda", 'statuses': ORDER_STATUSES}
         return render(request, "layouts/services/voda_admin.html", context=context)
 
 
 @login_required(login_url='login')
 def voda_mark_as_sent(request, pk):
     if request.user.is_staff and request.user.is_superuser:
-        txn = models.VodafoneTransaction.objects.filter(id=pk).first()
-        print(txn)
+        txn = models.VodafoneTransaction.objects.select_related('user').filter(id=pk).first()
         txn.transaction_status = "Completed"
         txn.save()
-        sms_headers = {
-            'Authorization': 'Bearer 1317|sCtbw8U97Nwg10hVbZLBPXiJ8AUby7dyozZMjJpU',
-            'Content-Type': 'application/json'
-        }
-
-        sms_url = 'https://webapp.usmsgh.com/api/sms/send'
         sms_message = f"Your Vodafone transaction has been completed. {txn.bundle_number} has been credited with {txn.offer}.\nTransaction Reference: {txn.reference}"
-
-        sms_body = {
-            'recipient': f"233{txn.user.phone}",
-            'sender_id': 'GH DATA',
-            'message': sms_message
-        }
-        response1 = requests.get(
-            f"https://sms.arkesel.com/sms/api?action=send-sms&api_key=a0xkWVBoYlBJUnRzeHZuUGVCYk8&to=0{txn.user.phone}&from=DCS.COM&sms={sms_message}")
-        print(response1.text)
+        notifier.send_sms(txn.user.phone, sms_message, dedupe_key=f"order-sent:{txn.id}")
         messages.success(request, f"Transaction Completed")
         return redirect('voda_admin')
 
@@ -1493,101 +1308,20 @@ def paystack_webhook(request):
     except json.JSONDecodeError:
         return HttpResponse(status=400)  # Bad Request
 
-    event = payload.get('event')
-    data = payload.get('data', {})
-
-    if event == 'charge.success':
-        metadata = data.get('metadata', {})
-        user_id = metadata.get('user_id')
-        reference = data.get('reference')
-        channel = metadata.get('channel')
-        real_amount = metadata.get('real_amount')
-
-        if channel != 'topup':
-            return HttpResponse(status=200)  # Not a top-up transaction
-
-        # Get the user
-        try:
-            user = models.CustomUser.objects.get(id=int(user_id))
-        except (models.CustomUser.DoesNotExist, ValueError):
-            return HttpResponse(status=200)  # User not found
-
-        # Get payment details
-        paid_amount_kobo = data.get('amount')
-        if not paid_amount_kobo or not reference:
-            return HttpResponse(status=400)  # Bad Request
-
-        # Convert amounts
-        paid_amount = float(paid_amount_kobo) / 100  # Convert from kobo/pesewas to GHS
-        real_amount = float(real_amount)
-
-        # Validate the amount
-        amount_difference = abs(paid_amount - real_amount)
-        if amount_difference > 1.0:
-            # Possible tampering detected
-            return HttpResponse(status=200)
-
-        # Check if this transaction has already been processed
-        if models.TopUpRequest.objects.filter(reference=reference, status=True, user=user).exists():
-            return HttpResponse(status=200)
-
-        with transaction.atomic():
-            # Update user's wallet
-            user.wallet = (user.wallet or 0) + real_amount
-            user.save()
-
-            # Update TopUpRequest
-            try:
-                topup_request = models.TopUpRequest.objects.get(reference=reference)
-                topup_request.amount = real_amount
-                topup_request.status = True
-                topup_request.credited_at = datetime.now()
-                topup_request.save()
-            except models.TopUpRequest.DoesNotExist:
-                # Create a new TopUpRequest if it doesn't exist
-                models.TopUpRequest.objects.create(
-                    user=user,
-                    reference=reference,
-                    amount=real_amount,
-                    status=True,
-                    credited_at=datetime.now(),
-                )
-
-            # Create WalletTransactionn
-            models.WalletTransactionn.objects.create(
-                user=user,
-                transaction_type='Credit',
-                transaction_amount=real_amount,
-                transaction_use='Wallet Topup (Paystack)',
-                new_balance=user.wallet,
-            )
+    if not isinstance(payload, dict) or not payload.get('event'):
+        return HttpResponse(status=400)  # Bad Request
+    if not (payload.get('data') or {}).get('reference'):
+        return HttpResponse(status=200)  # Nothing we can match to a payment
 
-            # Optionally, send SMS notification
-            sms_message = f"Your wallet has been credited with GHS{real_amount}.\nReference: {reference}"
-            # Send SMS logic here (uncomment and configure as needed)
-            # sms_headers = {
-            #     'Authorization': 'Bearer YOUR_SMS_API_KEY',
-            #     'Content-Type': 'application/json'
-            # }
-            # sms_url = 'https://sms.api.url/send'
-            # sms_body = {
-            #     'recipient': f"233{user.phone}",
-            #     'sender_id': 'YOUR_SENDER_ID',
-            #     'message': sms_message
-            # }
-            # response = requests.post(sms_url, headers=sms_headers, json=sms_body)
-
-        return HttpResponse(status=200)
-    else:
-        # For other events, return 200 OK
-        return HttpResponse(status=200)
+    # Credits are applied by the process_paystack_events worker.
+    payments.record_event(payload)
+    return HttpResponse(status=200)
 
 
 @login_required
 def wallet_transactions(request):
     user = request.user
     transactions = models.WalletTransactionn.objects.filter(user=user).order_by('-transaction_date')[:300]
-    print(transactions)
     wallet_balance = user.wallet
     context = {
         'transactions': transactions,
@@ -1596,5 +1330,67 @@ def wallet_transactions(request):
     return render(request, 'layouts/services/wallet_transactions.html', context)
 
 
+def _phone_range(term):
+    """The [low, high) range of stored phone numbers starting with what was typed, or None if it is not a number.
 
+    Phones are stored as 9-digit numbers without the leading 0 or 233, so a prefix is a range of numbers.
+    """
+    digits = re.sub(r"\D", "", term)
+    if digits.startswith("233") and len(digits) > 3:
+        digits = digits[3:]
+    digits = digits.lstrip("0")
+    if not digits or len(digits) > 9:
+        return None
+    scale = 10 ** (9 - len(digits))
+    return int(digits) * scale, (int(digits) + 1) * scale
 
+
+def _over_rate_limit(user_id):
+    window = settings.AUTOCOMPLETE_RATE_WINDOW
+    key = f"autocomplete-rate:{user_id}:{int(timezone.now().timestamp() // window)}"
+    cache.add(key, 0, window)
+    try:
+        # None when the cache backend is unreachable; the search is then not rate limited.
+        return (cache.incr(key) or 0) > settings.AUTOCOMPLETE_RATE_LIMIT
+    except ValueError:
+        # The counter expired between add and incr; this request starts the next window.
+        cache.set(key, 1, window)
+        return False
+
+
+def user_autocomplete(request):
+    """Select2 results for staff user pickers: users whose username or phone starts with `term`, a page at a time."""
+    if not request.user.is_staff:
+        return JsonResponse({'error': 'Access Denied'}, status=403)
+    if _over_rate_limit(request.user.id):
+        response = JsonResponse({'error': 'Too many requests'}, status=429)
+        response['Retry-After'] = str(settings.AUTOCOMPLETE_RATE_WINDOW)
+        return response
+
+    term = request.GET.get("term", "").strip()
+    if not term:
+        return JsonResponse({'results': [], 'pagination': {'more': False}})
+    query = Q(username__istartswith=term)
+    phones = _phone_range(term)
+    if phones:
+        query |= Q(phone__gte=phones[0], phone__lt=phones[1])
+    page = int(request.GET["page"]) if request.GET.get("page", "").isdigit() else 1
+    size = settings.AUTOCOMPLETE_PAGE_SIZE
+    start = (max(page, 1) - 1) * size
+    # One row past the page tells whether there is another one, without counting the matches.
+    users = list(models.CustomUser.objects.filter(query).order_by('username')
+                 .values_list('id', 'username', 'phone')[start:start + size + 1])
+    return JsonResponse({
+        'results': [{'id': user_id, 'text': f"{username} (0{phone})" if phone else username}
+                    for user_id, username, phone in users[:size]],
+        'pagination': {'more': len(users) > size},
+    })
+
+
+def metrics_endpoint(request):
+    token = settings.METRICS_TOKEN
+    scraper = bool(token) and hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {token}")
+    if not (scraper or request.user.is_staff):
+        return HttpResponse(status=403)
+    return HttpResponse(metrics.registry.render() + reconciliation.lag_metrics(),
+                        content_type="text/plain; version=0.0.4; charset=utf-8")
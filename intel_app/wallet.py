@@ -0,0 +1,113 @@
+from django.db import connection, transaction
+
+from . import models
+
+
+class InsufficientFunds(Exception):
+    pass
+
+
+def _update_balance(sql, params):
+    table = connection.ops.quote_name(models.CustomUser._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(sql.format(table=table), params)
+        row = cursor.fetchone()
+    return None if row is None else row[0]
+
+
+def debit(user, amount, use):
+    """Take amount from the user's wallet and record it in the ledger.
+
+    The balance check and the subtraction are one conditional UPDATE, so concurrent purchases
+    can never overdraw the wallet. Raises InsufficientFunds if the balance does not cover amount.
+    Returns the new balance, which is also set on user.wallet.
+    """
+    amount = float(amount)
+    if amount <= 0:
+        raise ValueError("Debit amount must be positive")
+    with transaction.atomic():
+        balance = _update_balance(
+            "UPDATE {table} SET wallet = wallet - %s WHERE id = %s AND wallet >= %s RETURNING wallet",
+            [amount, user.pk, amount],
+        )
+        if balance is None:
+            raise InsufficientFunds
+        models.WalletTransactionn.objects.create(
+            user=user,
+            transaction_type='Debit',
+            transaction_amount=amount,
+            transaction_use=use,
+            new_balance=balance,
+        )
+    user.wallet = balance
+    return balance
+
+
+def credit(user, amount, use):
+    """Add amount to the user's wallet and record it in the ledger. Returns the new balance."""
+    amount = float(amount)
+    if amount < 0:
+        raise ValueError("Credit amount must not be negative")
+    with transaction.atomic():
+        balance = _update_balance(
+            "UPDATE {table} SET wallet = COALESCE(wallet, 0) + %s WHERE id = %s RETURNING wallet",
+            [amount, user.pk],
+        )
+        if balance is None:
+            raise models.CustomUser.DoesNotExist
+        models.WalletTransactionn.objects.create(
+            user=user,
+            transaction_type='Credit',
+            transaction_amount=amount,
+            transaction_use=use,
+            new_balance=balance,
+        )
+    user.wallet = balance
+    return balance
+
+
+def credit_many(credits):
+    """Apply many (user_id, amount, use) credits with one UPDATE and one ledger insert.
+
+    Users are locked in id order first so concurrent batches cannot deadlock. Each ledger row gets
+    the balance the wallet had right after that credit. Returns {user_id: new_balance}.
+    """
+    credits = [(user_id, float(amount), use) for user_id, amount, use in credits]
+    if not credits:
+        return {}
+    if any(amount < 0 for _, amount, _ in credits):
+        raise ValueError("Credit amount must not be negative")
+    totals = {}
+    for user_id, amount, _ in credits:
+        totals[user_id] = totals.get(user_id, 0) + amount
+
+    table = connection.ops.quote_name(models.CustomUser._meta.db_table)
+    values = ", ".join(["(%s, %s)"] * len(totals))
+    params = [value for item in sorted(totals.items()) for value in item]
+    with transaction.atomic():
+        list(models.CustomUser.objects.select_for_update().filter(id__in=totals).order_by('id').values_list('id'))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {table} SET wallet = COALESCE(wallet, 0) + totals.column2 "
+                f"FROM (VALUES {values}) AS totals WHERE {table}.id = totals.column1 "
+                f"RETURNING {table}.id, {table}.wallet",
+                params,
+            )
+            balances = dict(cursor.fetchall())
+        missing = set(totals) - set(balances)
+        if missing:
+            raise models.CustomUser.DoesNotExist(f"Unknown users {sorted(missing)}")
+
+        running = {user_id: balances[user_id] - total for user_id, total in totals.items()}
+        ledger = []
+        for user_id, amount, use in credits:
+            running[user_id] += amount
+            ledger.append(models.WalletTransactionn(
+                user_id=user_id,
+                transaction_type='Credit',
+                transaction_amount=amount,
+                transaction_use=use,
+                new_balance=running[user_id],
+            ))
+        models.WalletTransactionn.objects.bulk_create(ledger)
+    return balances